@@ -10,6 +10,8 @@ from typing import Dict, Any, List
 from loguru import logger
 import json
 
+from database import fts_query
+
 
 class ClientScoring:
     """Scoring de calidad de PODs por cliente"""
@@ -23,14 +25,14 @@ class ClientScoring:
         """
         cursor = self.conn.cursor()
         
-        # Obtener PODs del cliente
+        # Obtener PODs del cliente (índice de texto completo, sin distinguir acentos)
         cursor.execute("""
             SELECT r.es_valido, COUNT(*) as count
             FROM gemini_analisis g
             JOIN resultados r ON g.pod_id = r.pod_id
-            WHERE g.cliente LIKE ?
+            WHERE g.pod_id IN (SELECT pod_id FROM busqueda_pods WHERE busqueda_pods MATCH ?)
             GROUP BY r.es_valido
-        """, (f'%{client_name}%',))
+        """, (fts_query(client_name, column='cliente') or '""',))
         
         results = cursor.fetchall()
         total = sum(row[1] for row in results)
@@ -62,10 +64,10 @@ class AnomalyDetector:
         # Obtener cantidades históricas
         cursor.execute("""
             SELECT cantidad FROM gemini_analisis
-            WHERE cliente LIKE ?
+            WHERE pod_id IN (SELECT pod_id FROM busqueda_pods WHERE busqueda_pods MATCH ?)
             AND cantidad != ''
             LIMIT 100
-        """, (f'%{client_name}%',))
+        """, (fts_query(client_name, column='cliente') or '""',))
         
         quantities = [float(row[0].split()[0]) for row in cursor.fetchall() if row[0] and row[0][0].isdigit()]
         
@@ -142,15 +144,16 @@ class PredictiveAnalytics:
         """
         cursor = self.conn.cursor()
         
-        # Obtener tendencia de últimas 4 semanas
+        # Obtener tendencia de últimas 4 semanas (agregados diarios)
         cursor.execute("""
             SELECT 
-                strftime('%W', fecha_analisis) as week,
-                COUNT(*) as total,
-                SUM(CASE WHEN es_valido = 0 THEN 1 ELSE 0 END) as invalid
-            FROM resultados
-            WHERE fecha_analisis >= date('now', '-28 days')
+                strftime('%W', fecha) as week,
+                SUM(total) as total,
+                SUM(total - validos) as invalid
+            FROM resumen_diario
+            WHERE fecha >= date('now', '-28 days')
             GROUP BY week
+            HAVING SUM(total) > 0
             ORDER BY week
         """)
         
@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+"""
+Clasificador en Cascada de Características Rápidas
+Primera etapa que resuelve los PODs obvios sin OCR ni detectores completos
+"""
+
+import os
+import sys
+import json
+import math
+import sqlite3
+import argparse
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+import cv2
+import numpy as np
+from loguru import logger
+
+
+# Orden fijo de las características del modelo
+FEATURE_NAMES = [
+    'blur_score',
+    'page_ink_density',
+    'zone_6_ink',
+    'zone_7_ink',
+    'zone_8_ink',
+    'ink_color_coverage',
+    'signature_zone_color',
+    'border_variance_min'
+]
+
+# Lado máximo de las miniaturas usadas para medir tinta
+_ANALYSIS_SIZE = 800
+
+
+def _downscale(image: np.ndarray, max_side: int = _ANALYSIS_SIZE) -> np.ndarray:
+    """Reduce la imagen para que las mediciones sean baratas"""
+    h, w = image.shape[:2]
+    scale = max_side / max(h, w)
+    if scale >= 1.0:
+        return image
+    return cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))),
+                      interpolation=cv2.INTER_AREA)
+
+
+def _ink_density(image: np.ndarray) -> float:
+    """Proporción de píxeles de tinta (umbral de Otsu)"""
+    if image is None or image.size == 0:
+        return 0.0
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+    _, binary = cv2.threshold(_downscale(gray), 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    return cv2.countNonZero(binary) / binary.size
+
+
+def _color_coverage(image: np.ndarray) -> float:
+    """Proporción de píxeles con tinta de color (plumas azules, sellos)"""
+    if image is None or image.size == 0 or len(image.shape) != 3:
+        return 0.0
+    hsv = cv2.cvtColor(_downscale(image), cv2.COLOR_BGR2HSV)
+    mask = cv2.inRange(hsv, (0, 80, 0), (179, 255, 220))
+    return cv2.countNonZero(mask) / mask.size
+
+
+def extract_cheap_features(page_data: Dict[str, Any],
+                           zones: Dict[str, np.ndarray]) -> Dict[str, float]:
+    """
+    Calcula características baratas de una página (milisegundos, sin OCR)
+
+    Args:
+        page_data: Datos de la página procesada
+        zones: Zonas de interés extraídas
+
+    Returns:
+        Diccionario {nombre_característica: valor}
+    """
+    processed = page_data['processed_image']
+
+    signature_zones = [zones[name] for name in ('zone_6', 'zone_7', 'zone_8')
+                       if name in zones and zones[name].size > 0]
+
+    gray = page_data.get('gray_image')
+    if gray is None:
+        gray = cv2.cvtColor(page_data['original_image'], cv2.COLOR_BGR2GRAY)
+    original_gray = cv2.cvtColor(page_data['original_image'], cv2.COLOR_BGR2GRAY)
+
+    # Varianza de bordes (documentos cortados tienen bordes uniformes)
+    border_size = 10
+    borders = [
+        original_gray[:border_size, :],
+        original_gray[-border_size:, :],
+        original_gray[:, :border_size],
+        original_gray[:, -border_size:]
+    ]
+
+    features = {
+        'blur_score': math.log1p(max(0.0, float(page_data['blur_score']))),
+        'page_ink_density': _ink_density(gray),
+        'zone_6_ink': _ink_density(zones.get('zone_6')),
+        'zone_7_ink': _ink_density(zones.get('zone_7')),
+        'zone_8_ink': _ink_density(zones.get('zone_8')),
+        'ink_color_coverage': _color_coverage(processed),
+        'signature_zone_color': (
+            float(np.mean([_color_coverage(z) for z in signature_zones]))
+            if signature_zones else 0.0
+        ),
+        'border_variance_min': math.log1p(min(float(np.var(b)) for b in borders)),
+    }
+
+    return features
+
+
+class CascadeClassifier:
+    """
+    Modelo ligero (Naive Bayes gaussiano) sobre características baratas
+
+    Solo acepta una clasificación cuando su probabilidad supera el corte
+    configurado para esa categoría; el resto se escala al PODClassifier completo.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        """
+        Inicializa el clasificador en cascada
+
+        Args:
+            config: Diccionario de configuración
+        """
+        cascade_config = config.get('cascade', {})
+        self.enabled = cascade_config.get('enabled', False)
+        self.collect_features = cascade_config.get('collect_features', True)
+        self.model_path = cascade_config.get('model_path', 'database/cascade_model.json')
+        self.min_training_samples = cascade_config.get('min_training_samples', 200)
+        self.fast_path = cascade_config.get('fast_path', {'SIN_ACUSE': 0.97, 'OK': 0.98})
+
+        self.model = None
+        if self.enabled:
+            self.model = self.load_model()
+            if self.model is None:
+                logger.warning("Cascada habilitada pero sin modelo entrenado - se usará el pipeline completo")
+
+        logger.info("Clasificador en cascada inicializado")
+
+    def load_model(self) -> Optional[Dict[str, Any]]:
+        """
+        Carga el modelo entrenado desde disco
+
+        Returns:
+            Modelo o None si no existe o no es compatible
+        """
+        if not os.path.exists(self.model_path):
+            return None
+
+        try:
+            with open(self.model_path, 'r', encoding='utf-8') as f:
+                model = json.load(f)
+            if model.get('feature_names') != FEATURE_NAMES:
+                logger.warning("Modelo de cascada con características distintas - ignorado")
+                return None
+            model['means'] = np.array(model['means'])
+            model['vars'] = np.array(model['vars'])
+            model['priors'] = np.array(model['priors'])
+            logger.info(f"Modelo de cascada cargado ({model['samples']} muestras)")
+            return model
+        except Exception as e:
+            logger.error(f"Error cargando modelo de cascada: {e}")
+            return None
+
+    def predict(self, features: Dict[str, float]) -> Dict[str, Any]:
+        """
+        Predice la clasificación y decide si la página puede resolverse rápido
+
+        Args:
+            features: Características de extract_cheap_features
+
+        Returns:
+            Diccionario con 'classification_code', 'probability',
+            'probabilities' y 'fast_path'
+        """
+        decision = {
+            'classification_code': None,
+            'probability': 0.0,
+            'probabilities': {},
+            'fast_path': False
+        }
+
+        if self.model is None:
+            return decision
+
+        x = np.array([features[name] for name in FEATURE_NAMES])
+        log_likelihood = -0.5 * np.sum(
+            np.log(2 * np.pi * self.model['vars']) +
+            (x - self.model['means']) ** 2 / self.model['vars'],
+            axis=1
+        )
+        log_posterior = log_likelihood + np.log(self.model['priors'])
+        log_posterior -= log_posterior.max()
+        probabilities = np.exp(log_posterior)
+        probabilities /= probabilities.sum()
+
+        best = int(np.argmax(probabilities))
+        code = self.model['classes'][best]
+
+        decision['classification_code'] = code
+        decision['probability'] = float(probabilities[best])
+        decision['probabilities'] = {
+            cls: round(float(p), 4) for cls, p in zip(self.model['classes'], probabilities)
+        }
+        cutoff = self.fast_path.get(code)
+        decision['fast_path'] = cutoff is not None and decision['probability'] >= cutoff
+
+        return decision
+
+    def train_from_database(self, db_path: str = "database/pods.db") -> Dict[str, Any]:
+        """
+        Entrena el modelo con las características y resultados guardados
+
+        Solo usa resultados del pipeline completo (no los resueltos por la
+        propia cascada) para no reforzar sus errores.
+
+        Args:
+            db_path: Ruta a la base de datos de PODs
+
+        Returns:
+            Resumen del entrenamiento
+        """
+        conn = sqlite3.connect(db_path)
+        try:
+            rows = conn.execute("""
+                SELECT c.caracteristicas, r.codigo_clasificacion
+                FROM caracteristicas_rapidas c
+                JOIN resultados r ON c.resultado_id = r.id
+                WHERE c.origen = 'pipeline'
+            """).fetchall()
+        finally:
+            conn.close()
+
+        samples = []
+        labels = []
+        for features_json, code in rows:
+            features = json.loads(features_json)
+            if all(name in features for name in FEATURE_NAMES):
+                samples.append([features[name] for name in FEATURE_NAMES])
+                labels.append(code)
+
+        if len(samples) < self.min_training_samples:
+            logger.warning(f"Muestras insuficientes para entrenar la cascada: "
+                           f"{len(samples)}/{self.min_training_samples}")
+            return {'trained': False, 'samples': len(samples)}
+
+        X = np.array(samples)
+        y = np.array(labels)
+        classes = sorted(set(labels))
+
+        # Suavizado de varianza para evitar divisiones por cero
+        epsilon = 1e-6 * X.var(axis=0).max() + 1e-9
+        means = np.array([X[y == cls].mean(axis=0) for cls in classes])
+        variances = np.array([X[y == cls].var(axis=0) + epsilon for cls in classes])
+        priors = np.array([(y == cls).mean() for cls in classes])
+
+        model = {
+            'version': 1,
+            'feature_names': FEATURE_NAMES,
+            'classes': classes,
+            'priors': priors.tolist(),
+            'means': means.tolist(),
+            'vars': variances.tolist(),
+            'samples': len(samples),
+            'trained_at': datetime.now().isoformat()
+        }
+
+        os.makedirs(os.path.dirname(self.model_path) or '.', exist_ok=True)
+        with open(self.model_path, 'w', encoding='utf-8') as f:
+            json.dump(model, f, indent=2)
+
+        model['means'] = means
+        model['vars'] = variances
+        model['priors'] = priors
+        self.model = model
+
+        # Precisión y cobertura del camino rápido sobre los datos de entrenamiento
+        fast_total = 0
+        fast_correct = 0
+        for features_row, label in zip(X, y):
+            decision = self.predict(dict(zip(FEATURE_NAMES, features_row)))
+            if decision['fast_path']:
+                fast_total += 1
+                fast_correct += decision['classification_code'] == label
+
+        summary = {
+            'trained': True,
+            'samples': len(samples),
+            'classes': {cls: int((y == cls).sum()) for cls in classes},
+            'fast_path_rate': round(fast_total / len(samples), 3),
+            'fast_path_accuracy': round(fast_correct / fast_total, 3) if fast_total else None
+        }
+        logger.info(f"Modelo de cascada entrenado: {summary}")
+        return summary
+
+
+def main():
+    """
+    Entrena el modelo de cascada desde la línea de comandos
+    """
+    sys.path.insert(0, os.path.dirname(__file__))
+    from utils import load_config
+
+    parser = argparse.ArgumentParser(description='Entrenamiento del clasificador en cascada')
+    parser.add_argument('--db', type=str, default='database/pods.db',
+                        help='Base de datos con resultados históricos')
+    parser.add_argument('--config', '-c', type=str, default='config/settings.yaml',
+                        help='Ruta al archivo de configuración')
+    args = parser.parse_args()
+
+    cascade = CascadeClassifier(load_config(args.config))
+    summary = cascade.train_from_database(args.db)
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,13 +4,19 @@ Clasificador de PODs
 Determina la categoría de cada documento POD según los criterios establecidos
 """
 
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple
 from loguru import logger
 
 from detectors.signature_detector import SignatureDetector
 from detectors.stamp_detector import StampDetector
 from detectors.legibility_analyzer import LegibilityAnalyzer
 from detectors.annotation_detector import AnnotationDetector
+from template_registry import TemplateRegistry
+from cascade_classifier import CascadeClassifier, extract_cheap_features
+from detector_scheduler import DetectorScheduler, DetectorTask
+from detectors.page_ocr import LazyPageOCR, text_from_ocr_data
+from detectors.ocr_cache import get_ocr_cache
+from gemini_budget import uncertainty_score
 
 # Importar sistema de notificaciones si está disponible
 try:
@@ -23,6 +29,7 @@ except ImportError:
 # Importar Gemini AI si está disponible
 try:
     from gemini_analyzer import GeminiPODAnalyzer, get_gemini_api_key_from_config
+    from gemini_payload import zone_regions, box_regions
     GEMINI_AVAILABLE = True
 except ImportError:
     GEMINI_AVAILABLE = False
@@ -57,6 +64,19 @@ class PODClassifier:
         self.legibility_analyzer = LegibilityAnalyzer(config)
         self.annotation_detector = AnnotationDetector(config)
         
+        # Registro de layouts de remisión conocidos
+        self.template_registry = TemplateRegistry(config)
+        
+        # Primera etapa de la cascada (características rápidas)
+        self.cascade_classifier = CascadeClassifier(config)
+        
+        # Planificador que ejecuta los detectores de cada página en paralelo
+        performance = config.get('performance', {})
+        self.detector_scheduler = DetectorScheduler(
+            max_workers=performance.get('detector_workers', 4),
+            parallel=performance.get('parallel_detectors', True)
+        )
+        
         # Inicializar sistema de notificaciones
         if NOTIFICATIONS_AVAILABLE:
             self.notification_system = NotificationSystem()
@@ -64,9 +84,15 @@ class PODClassifier:
             self.notification_system = None
         
         # Inicializar Gemini AI
+        self.gemini_consolidated = config.get('gemini', {}).get('consolidated_review', True)
+        # Con presupuesto diario las revisiones siempre pasan por la cola (ordenadas por incertidumbre)
+        gemini_config = config.get('gemini', {})
+        self.gemini_queue_enabled = (gemini_config.get('queue', {}).get('enabled', False) or
+                                     gemini_config.get('budget', {}).get('enabled', False))
+        self.gemini_priority_weights = gemini_config.get('budget', {}).get('weights')
         if GEMINI_AVAILABLE:
             api_key = get_gemini_api_key_from_config()
-            self.gemini_analyzer = GeminiPODAnalyzer(api_key)
+            self.gemini_analyzer = GeminiPODAnalyzer(api_key, config=config)
             if self.gemini_analyzer.enabled:
                 logger.info("Gemini AI activado como revisor inteligente")
             else:
@@ -104,30 +130,54 @@ class PODClassifier:
             'recommendations': []
         }
         
-        # PASO 1: Analizar legibilidad
-        legibility = self.legibility_analyzer.analyze_legibility(page_data)
+        # ETAPA RÁPIDA: Resolver PODs obvios sin OCR ni detectores completos
+        if self.cascade_classifier.collect_features or self.cascade_classifier.enabled:
+            features = extract_cheap_features(page_data, zones)
+            result['details']['cheap_features'] = features
+            
+            decision = self.cascade_classifier.predict(features)
+            if decision['fast_path']:
+                return self._fast_path_result(result, decision)
+            if decision['classification_code']:
+                result['details']['cascade'] = decision
+        
+        # PASO 0: Alinear con plantillas de remisión conocidas
+        detector_image = page_data['processed_image']
+        if self.template_registry.enabled:
+            template_match = self.template_registry.match(page_data['processed_image'])
+            page_data['template_match'] = template_match
+            if template_match:
+                result['details']['template'] = {
+                    'name': template_match['template'],
+                    'inliers': template_match['inliers']
+                }
+                if self.template_registry.mask_static:
+                    detector_image = self.template_registry.mask_static_regions(
+                        page_data['processed_image'], template_match
+                    )
+        
+        # PASOS 1-5: Legibilidad, completitud, firmas, sellos y anotaciones
+        detections, detector_timings = self._run_detectors(page_data, zones, detector_image)
+        
+        legibility = detections['legibility']
         result['details']['legibility'] = legibility
         
-        # PASO 2: Verificar si está completo
-        is_complete = self.legibility_analyzer.is_document_complete(page_data['original_image'])
+        is_complete = detections['is_complete']
         result['details']['is_complete'] = is_complete
         
-        # PASO 3: Detectar firmas
-        signatures = self.signature_detector.detect_signatures(
-            page_data['processed_image'], 
-            zones
-        )
+        signatures = detections['signatures']
         result['details']['signatures'] = signatures
         has_valid_signature = self.signature_detector.has_valid_signature(signatures)
         
-        # PASO 4: Detectar sellos
-        stamps = self.stamp_detector.detect_stamps(page_data['processed_image'])
+        stamps = detections['stamps']
         result['details']['stamps'] = stamps
         has_valid_stamp = self.stamp_detector.has_valid_stamp(stamps)
         
-        # PASO 5: Detectar anotaciones
-        annotations = self.annotation_detector.detect_annotations(page_data['processed_image'])
+        annotations = detections['annotations']
         result['details']['annotations'] = annotations
+        result['details']['detector_timings'] = detector_timings
+        if 'page_text' in detections:
+            result['details']['page_text'] = detections['page_text']
         
         # CLASIFICACIÓN SEGÚN PRIORIDAD
         
@@ -210,68 +260,249 @@ class PODClassifier:
         
         # ========== GEMINI AI COMO REVISOR INTELIGENTE ==========
         if self.gemini_analyzer:
-            try:
-                logger.info("Activando Gemini AI como revisor inteligente...")
-                image_path = page_data['source_file']
-                
-                # 1. Análisis de manuscritos críticos (si hay anotaciones o baja confianza)
-                if result['details']['annotations']['detected'] or result['confidence'] < 0.7:
-                    logger.info("Analizando manuscritos con Gemini...")
-                    manuscripts = self.gemini_analyzer.analyze_critical_annotations(image_path)
-                    result['details']['gemini_manuscripts'] = manuscripts
-                    
-                    # Si Gemini detecta reclamación NEGATIVA urgente
-                    if manuscripts.get('has_annotations') and manuscripts.get('sentiment') == 'negative':
-                        if manuscripts.get('urgency') == 'urgent':
-                            result['classification'] = self.classifications['CON_ANOTACIONES']
-                            result['classification_code'] = 'CON_ANOTACIONES'
-                            result['is_valid'] = False
-                            result['issues'].append(f"URGENTE - Reclamación detectada por Gemini: {manuscripts.get('transcription', '')}")
-                            logger.critical(f"Gemini detectó reclamación URGENTE en: {page_data['source_file']}")
-                
-                # 2. Validación de autenticidad de firma (si hay firma detectada)
-                if result['details']['signature']['detected']:
-                    logger.info("Validando autenticidad de firma con Gemini...")
-                    signature_auth = self.gemini_analyzer.validate_signature_authenticity(image_path)
-                    result['details']['gemini_signature'] = signature_auth
-                    
-                    # Si la firma NO es auténtica (es sello o digital)
-                    if not signature_auth.get('is_authentic') and signature_auth.get('signature_type') in ['stamp', 'digital']:
-                        logger.warning(f"Gemini detectó firma no auténtica: {signature_auth.get('signature_type')}")
-                        result['issues'].append(f"Firma detectada como {signature_auth.get('signature_type')} (no manuscrita)")
-                        # Reclasificar si era OK solo por la firma
-                        if result['classification_code'] == 'OK' and not result['details']['stamp']['detected']:
-                            result['classification'] = self.classifications['SIN_ACUSE']
-                            result['classification_code'] = 'SIN_ACUSE'
-                            result['is_valid'] = False
-                            logger.warning("Reclasificado a SIN_ACUSE por firma no auténtica")
-                
-                # 3. Extracción de campos clave (para datos estructurados)
-                logger.info("Extrayendo campos clave con Gemini...")
-                key_fields = self.gemini_analyzer.extract_key_fields(image_path)
-                result['details']['gemini_fields'] = key_fields
-                
-                # 4. Clasificación de Gemini (como segundo opinión)
-                logger.info("Obteniendo clasificación de Gemini...")
-                gemini_classification = self.gemini_analyzer.classify_pod(image_path)
-                result['details']['gemini_classification'] = gemini_classification
+            if self.gemini_queue_enabled:
+                # Se devuelve el veredicto OCR; la revisión la hace la cola en segundo plano
+                result['gemini_pending'] = self.gemini_review_context(result)
+                result['details']['gemini_status'] = 'pendiente'
+            else:
+                self.gemini_review(result, page_data)
+        
+        # Generar alertas con sistema de notificaciones
+        if self.notification_system:
+            self.notification_system.check_and_alert(result)
+        
+        return result
+    
+    def gemini_review_context(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Parte del resultado que necesita la revisión con Gemini en segundo plano
+        
+        Se guarda en la cola junto con la ruta y la página; el resto (imágenes,
+        características) se vuelve a obtener del archivo al revisar.
+        
+        Args:
+            result: Resultado de clasificación
+            
+        Returns:
+            Diccionario serializable con clasificación, detecciones mínimas y
+            prioridad (incertidumbre) de la revisión
+        """
+        details = result['details']
+        annotations = details['annotations']
+        return {
+            'priority': uncertainty_score(result, self.gemini_priority_weights),
+            'classification': result['classification'],
+            'classification_code': result['classification_code'],
+            'is_valid': result['is_valid'],
+            'confidence': result['confidence'],
+            'issues': list(result['issues']),
+            'details': {
+                'annotations': {
+                    'has_annotations': annotations['has_annotations'],
+                    'annotations': [{'bbox': a['bbox']} for a in annotations.get('annotations', [])]
+                },
+                'signatures': [{'confidence': s.get('confidence', 0)} for s in details['signatures']],
+                'stamps': [{'is_valid': s['is_valid']} for s in details['stamps']]
+            }
+        }
+    
+    def gemini_review(self, result: Dict[str, Any], page_data: Dict[str, Any],
+                      review: Dict[str, Any] = None) -> None:
+        """
+        Revisión con Gemini AI: manuscritos, autenticidad de firma, campos clave
+        y segunda opinión de clasificación
+        
+        Con gemini.consolidated_review (por defecto) las cuatro respuestas llegan
+        en una sola llamada; si no, se hacen las cuatro llamadas por separado.
+        Los resultados se guardan en details['gemini_*'] y pueden ajustar la
+        clasificación.
+        
+        Args:
+            result: Resultado de clasificación (se modifica)
+            page_data: Datos de la página
+            review: Revisión consolidada ya obtenida (p. ej. en un lote de
+                    GeminiPODAnalyzer.review_pods); si se omite, se pide aquí
+        """
+        details = result['details']
+        check_manuscripts = details['annotations']['has_annotations'] or result['confidence'] < 0.7
+        check_signature = bool(details['signatures'])
+        
+        try:
+            logger.info("Activando Gemini AI como revisor inteligente...")
+            # La página ya cargada (no el archivo original): se reduce y recodifica antes de enviarla
+            image = page_data.get('original_image')
+            if image is None:
+                image = page_data['source_file']
+            
+            if self.gemini_consolidated or review is not None:
+                if review is None:
+                    review = self.gemini_analyzer.review_pod(image)
+                if 'error' in review:
+                    raise RuntimeError(review['error'])
+                manuscripts = review['manuscripts']
+                signature_auth = review['signature']
+                key_fields = review['fields']
+                gemini_classification = review['classification']
+                details['gemini_consolidated'] = review['consolidated']
+            else:
+                # Las consultas puntuales envían solo sus regiones
+                annotation_boxes = [a['bbox'] for a in details['annotations'].get('annotations', [])]
+                annotation_regions = box_regions(annotation_boxes, page_data['processed_image'].shape) or None
+                signature_regions = zone_regions(self.config, ['zone_6', 'zone_7', 'zone_8']) or None
                 
-                # Detectar discrepancias entre Tesseract y Gemini
-                if 'classification_text' in gemini_classification:
-                    gemini_class_text = gemini_classification['classification_text'].upper()
-                    if ('OK' in gemini_class_text and result['classification_code'] != 'OK') or \
-                       ('SIN ACUSE' in gemini_class_text and result['classification_code'] == 'OK'):
-                        result['needs_review'] = True
-                        result['review_reason'] = 'Discrepancia entre clasificación OCR y Gemini AI'
-                        logger.warning(f"Discrepancia detectada: OCR={result['classification_code']}, Gemini sugiere revisión")
+                manuscripts = self.gemini_analyzer.analyze_critical_annotations(image, annotation_regions) if check_manuscripts else None
+                signature_auth = self.gemini_analyzer.validate_signature_authenticity(image, signature_regions) if check_signature else None
+                key_fields = self.gemini_analyzer.extract_key_fields(image)
+                gemini_classification = self.gemini_analyzer.classify_pod(image)
+            
+            # 1. Manuscritos críticos (si hay anotaciones o baja confianza)
+            if check_manuscripts and manuscripts is not None:
+                details['gemini_manuscripts'] = manuscripts
                 
-                logger.info("Análisis con Gemini completado exitosamente")
+                # Si Gemini detecta reclamación NEGATIVA urgente
+                if manuscripts.get('has_annotations') and manuscripts.get('sentiment') == 'negative':
+                    if manuscripts.get('urgency') == 'urgent':
+                        result['classification'] = self.classifications['CON_ANOTACIONES']
+                        result['classification_code'] = 'CON_ANOTACIONES'
+                        result['is_valid'] = False
+                        result['issues'].append(f"URGENTE - Reclamación detectada por Gemini: {manuscripts.get('transcription', '')}")
+                        logger.critical(f"Gemini detectó reclamación URGENTE en: {page_data['source_file']}")
+            
+            # 2. Autenticidad de firma (si hay firma detectada)
+            if check_signature and signature_auth is not None:
+                details['gemini_signature'] = signature_auth
                 
-            except Exception as e:
-                logger.error(f"Error en análisis de Gemini: {e}")
-                result['details']['gemini_error'] = str(e)
+                # Si la firma NO es auténtica (es sello o digital)
+                if not signature_auth.get('is_authentic') and signature_auth.get('signature_type') in ['stamp', 'digital']:
+                    logger.warning(f"Gemini detectó firma no auténtica: {signature_auth.get('signature_type')}")
+                    result['issues'].append(f"Firma detectada como {signature_auth.get('signature_type')} (no manuscrita)")
+                    # Reclasificar si era OK solo por la firma
+                    if result['classification_code'] == 'OK' and not self.stamp_detector.has_valid_stamp(details['stamps']):
+                        result['classification'] = self.classifications['SIN_ACUSE']
+                        result['classification_code'] = 'SIN_ACUSE'
+                        result['is_valid'] = False
+                        logger.warning("Reclasificado a SIN_ACUSE por firma no auténtica")
+            
+            # 3. Campos clave (datos estructurados)
+            details['gemini_fields'] = key_fields
+            
+            # 4. Clasificación de Gemini (como segunda opinión)
+            details['gemini_classification'] = gemini_classification
+            
+            # Detectar discrepancias entre Tesseract y Gemini
+            if 'classification_text' in gemini_classification:
+                gemini_class_text = gemini_classification['classification_text'].upper()
+                if ('OK' in gemini_class_text and result['classification_code'] != 'OK') or \
+                   ('SIN ACUSE' in gemini_class_text and result['classification_code'] == 'OK'):
+                    result['needs_review'] = True
+                    result['review_reason'] = 'Discrepancia entre clasificación OCR y Gemini AI'
+                    logger.warning(f"Discrepancia detectada: OCR={result['classification_code']}, Gemini sugiere revisión")
+            
+            logger.info("Análisis con Gemini completado exitosamente")
+            
+        except Exception as e:
+            logger.error(f"Error en análisis de Gemini: {e}")
+            details['gemini_error'] = str(e)
+    
+    def _run_detectors(self, page_data: Dict[str, Any], zones: Dict[str, Any],
+                       detector_image: Any) -> Tuple[Dict[str, Any], Dict[str, float]]:
+        """
+        Ejecuta los detectores de la página como un grafo de dependencias
+        
+        El OCR por palabra de la página se calcula a lo sumo una vez y lo
+        comparten la legibilidad y las anotaciones (solo si alguna lo pide);
+        sellos, firmas y completitud solo dependen de los planos de la imagen.
+        
+        Args:
+            page_data: Datos de la página procesada
+            zones: Zonas de interés extraídas
+            detector_image: Imagen para sellos/anotaciones (puede tener regiones enmascaradas)
+            
+        Returns:
+            Tupla (resultados de cada detector, segundos de cada detector). Si el
+            OCR de página se llegó a calcular, los resultados incluyen además
+            'page_text' con el texto completo de la página
+        """
+        tasks = [
+            DetectorTask('is_complete', self.legibility_analyzer.is_document_complete,
+                         ['original_image']),
+            DetectorTask('signatures', self.signature_detector.detect_signatures,
+                         ['image', 'zones']),
+            DetectorTask('stamps', self.stamp_detector.detect_stamps,
+                         ['detector_image']),
+            DetectorTask('legibility', self.legibility_analyzer.analyze_legibility,
+                         ['page_data', 'page_ocr']),
+            DetectorTask('annotations', self.annotation_detector.detect_annotations,
+                         ['detector_image', 'page_ocr']),
+        ]
+        
+        page_ocr = LazyPageOCR(page_data['processed_image'], self.config,
+                               required=self.annotation_detector.exclude_printed_text)
+        inputs = {
+            'page_data': page_data,
+            'image': page_data['processed_image'],
+            'original_image': page_data['original_image'],
+            'detector_image': detector_image,
+            'zones': zones,
+            # OCR de página perezoso: solo se ejecuta si algún detector lo necesita
+            'page_ocr': page_ocr
+        }
+        
+        detections, timings = self.detector_scheduler.run(tasks, inputs)
+        
+        # Texto completo para el índice de búsqueda (sin OCR adicional)
+        if page_ocr.ready:
+            detections['page_text'] = text_from_ocr_data(page_ocr.get())
+        return detections, timings
+    
+    def _fast_path_result(self, result: Dict[str, Any],
+                          decision: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Completa el resultado de una página resuelta por la cascada
+        
+        Args:
+            result: Resultado parcial de classify_document
+            decision: Decisión de CascadeClassifier.predict
+            
+        Returns:
+            Resultado con la misma estructura que el pipeline completo
+        """
+        code = decision['classification_code']
+        
+        result['classification'] = self.classifications[code]
+        result['classification_code'] = code
+        result['is_valid'] = code == 'OK'
+        result['confidence'] = decision['probability']
+        result['details'].update({
+            'cascade': decision,
+            'legibility': {
+                'is_legible': True,
+                'text_quality': 0.0,
+                'fields_detected': [],
+                'fields_missing': [],
+                'ocr_confidence': 0.0,
+                'text': '',
+                'issues': []
+            },
+            'is_complete': True,
+            'signatures': [],
+            'stamps': [],
+            'annotations': {
+                'has_annotations': False,
+                'annotation_count': 0,
+                'annotations': [],
+                'sentiment': 'neutral',
+                'text_content': []
+            }
+        })
+        result['issues'].append(
+            f"Clasificación rápida por cascada (probabilidad {decision['probability']:.1%})"
+        )
+        if code == 'SIN_ACUSE':
+            result['recommendations'].append("Solicitar documento con firma o sello del cliente")
+        
+        logger.info(f"Clasificado por cascada como {code}: {result['source_file']}")
         
-        # Generar alertas con sistema de notificaciones
         if self.notification_system:
             self.notification_system.check_and_alert(result)
         
@@ -329,5 +560,11 @@ class PODClassifier:
             for issue, count in issue_counts.most_common(10)
         ]
         
+        # Aprovechamiento de las cachés de OCR y Gemini en esta ejecución
+        summary['ocr_cache'] = get_ocr_cache(self.config).stats()
+        if self.gemini_analyzer:
+            summary['gemini_cache'] = self.gemini_analyzer.cache_stats()
+            summary['gemini_payload'] = self.gemini_analyzer.payload_stats()
+        
         return summary
 
@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+Servicio Residente de Validación de PODs
+Precarga el sistema una vez y atiende trabajos por un socket Unix con procesos
+hijos precargados (prefork); los modelos se comparten copy-on-write
+"""
+
+import os
+import sys
+import json
+import time
+import errno
+import signal
+import socket
+from typing import Dict, Any, Optional
+from loguru import logger
+
+from model_registry import get_model_registry
+from detectors.ocr_cache import reopen_ocr_caches
+
+try:
+    from database import PODDatabase
+    DATABASE_AVAILABLE = True
+except ImportError:
+    DATABASE_AVAILABLE = False
+
+DEFAULT_SOCKET_PATH = 'database/pod_daemon.sock'
+
+# El servicio requiere fork() y sockets Unix
+DAEMON_SUPPORTED = hasattr(os, 'fork') and hasattr(socket, 'AF_UNIX')
+
+
+def _json_default(value: Any) -> Any:
+    """Convierte tipos de numpy (y otros no serializables) a tipos de Python"""
+    if hasattr(value, 'item'):
+        return value.item()
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return str(value)
+
+
+def send_message(conn: socket.socket, message: Dict[str, Any]) -> None:
+    """
+    Envía un mensaje JSON terminado en salto de línea
+
+    Args:
+        conn: Socket conectado
+        message: Mensaje serializable
+    """
+    data = json.dumps(message, ensure_ascii=False, default=_json_default) + '\n'
+    conn.sendall(data.encode('utf-8'))
+
+
+def receive_message(conn: socket.socket) -> Optional[Dict[str, Any]]:
+    """
+    Lee un mensaje JSON terminado en salto de línea
+
+    Args:
+        conn: Socket conectado
+
+    Returns:
+        Mensaje decodificado o None si la conexión se cerró
+    """
+    chunks = []
+    while True:
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        if chunk.endswith(b'\n'):
+            break
+    if not chunks:
+        return None
+    return json.loads(b''.join(chunks).decode('utf-8'))
+
+
+class PODDaemon:
+    """
+    Servicio residente con procesos hijos precargados
+
+    El proceso padre carga la configuración, los detectores y (opcionalmente)
+    los modelos de OCR, abre el socket y se bifurca en N hijos que aceptan
+    conexiones del mismo socket. El padre solo supervisa: reinicia hijos que
+    terminan y los recicla tras max_jobs_per_worker trabajos.
+
+    Protocolo: una línea JSON por solicitud y una por respuesta.
+    - {"command": "process", "file": "...", "save_annotated": true}
+    - {"command": "ping"}
+    - {"command": "stats"}
+    """
+
+    def __init__(self, system, socket_path: str = None, workers: int = None):
+        """
+        Prepara el servicio sobre un sistema ya inicializado
+
+        Args:
+            system: PODValidationSystem precargado
+            socket_path: Ruta del socket Unix (por defecto, la de la configuración)
+            workers: Número de procesos hijos (por defecto, el de la configuración)
+        """
+        if not DAEMON_SUPPORTED:
+            raise RuntimeError("El modo servicio requiere fork() y sockets Unix (no disponible en Windows)")
+
+        self.system = system
+
+        daemon_config = self.system.config.get('daemon', {})
+        self.socket_path = socket_path or daemon_config.get('socket_path', DEFAULT_SOCKET_PATH)
+        self.num_workers = workers or daemon_config.get('workers', 2)
+        self.max_jobs_per_worker = daemon_config.get('max_jobs_per_worker', 500)
+
+        # Los modelos cargados aquí se comparten con los hijos (copy-on-write)
+        if daemon_config.get('preload_models', False):
+            status = get_model_registry().warmup()
+            logger.info(f"Modelos precargados: {status}")
+
+        self.children: Dict[int, int] = {}
+        self.listener: Optional[socket.socket] = None
+        self._running = False
+        self._started_at = time.time()
+
+    def serve_forever(self) -> None:
+        """
+        Abre el socket, crea los hijos y los supervisa hasta recibir SIGTERM/SIGINT
+        """
+        self._open_socket()
+
+        # Las conexiones SQLite y el hilo escritor no deben cruzar fork(): cada hijo abre los suyos
+        if self.system.db is not None:
+            self.system.db.close()
+
+        self._running = True
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+
+        for slot in range(self.num_workers):
+            self._spawn_worker(slot)
+
+        logger.info(f"Servicio escuchando en {self.socket_path} con {self.num_workers} procesos")
+
+        try:
+            while self._running:
+                try:
+                    pid, status = os.wait()
+                except ChildProcessError:
+                    break
+                except InterruptedError:
+                    continue
+
+                slot = self.children.pop(pid, None)
+                if slot is not None and self._running:
+                    code = os.waitstatus_to_exitcode(status)
+                    if code != 0:
+                        logger.warning(f"Proceso {pid} terminó con código {code}; se reinicia")
+                    self._spawn_worker(slot)
+        finally:
+            self._shutdown()
+
+    def _open_socket(self) -> None:
+        """Crea el socket Unix (reemplaza uno huérfano de una ejecución anterior)"""
+        os.makedirs(os.path.dirname(self.socket_path) or '.', exist_ok=True)
+
+        if os.path.exists(self.socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+                probe.close()
+                raise RuntimeError(f"Ya hay un servicio escuchando en {self.socket_path}")
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.unlink(self.socket_path)
+
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.socket_path)
+        self.listener.listen(64)
+
+    def _spawn_worker(self, slot: int) -> None:
+        """Crea un proceso hijo que atiende conexiones"""
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._worker_loop(slot)
+            except Exception as e:
+                logger.error(f"Error en proceso hijo {slot}: {e}")
+                code = 1
+            finally:
+                os._exit(code)
+
+        self.children[pid] = slot
+
+    def _worker_loop(self, slot: int) -> None:
+        """Bucle de un proceso hijo: aceptar, procesar, responder"""
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+        if self.system.db is not None and DATABASE_AVAILABLE:
+            self.system.db = PODDatabase(self.system.db.db_path, self.system.db.config)
+        reopen_ocr_caches()
+        gemini_analyzer = self.system.classifier.gemini_analyzer
+        if gemini_analyzer is not None and gemini_analyzer.cache is not None:
+            gemini_analyzer.cache.reopen()
+        # Cada hijo atiende también la cola de Gemini (los trabajos se toman de forma atómica)
+        self.system.start_gemini_queue()
+
+        logger.info(f"Proceso {slot} listo (PID {os.getpid()})")
+        jobs = 0
+
+        while jobs < self.max_jobs_per_worker:
+            try:
+                conn, _ = self.listener.accept()
+            except InterruptedError:
+                continue
+
+            with conn:
+                try:
+                    request = receive_message(conn)
+                    if request is None:
+                        continue
+                    response = self._handle_request(request, slot, jobs)
+                except Exception as e:
+                    logger.error(f"Error atendiendo solicitud: {e}")
+                    response = {'ok': False, 'error': str(e)}
+
+                try:
+                    send_message(conn, response)
+                except OSError as e:
+                    if e.errno != errno.EPIPE:
+                        raise
+
+            jobs += 1
+
+        self.system.stop_gemini_queue(drain=False)
+        logger.info(f"Proceso {slot} reciclado tras {jobs} trabajos")
+
+    def _handle_request(self, request: Dict[str, Any], slot: int, jobs: int) -> Dict[str, Any]:
+        """
+        Ejecuta una solicitud
+
+        Args:
+            request: Solicitud decodificada
+            slot: Número de proceso hijo
+            jobs: Trabajos atendidos por este hijo
+
+        Returns:
+            Respuesta {'ok': bool, ...}
+        """
+        command = request.get('command')
+
+        if command == 'ping':
+            return {'ok': True, 'pid': os.getpid()}
+
+        if command == 'stats':
+            return {
+                'ok': True,
+                'pid': os.getpid(),
+                'worker': slot,
+                'jobs': jobs,
+                'uptime_seconds': round(time.time() - self._started_at, 1),
+                'models': get_model_registry().stats(),
+                'gemini_queue': self.system.gemini_queue.summary() if self.system.gemini_queue else None
+            }
+
+        if command == 'process':
+            file_path = request.get('file')
+            if not file_path or not os.path.exists(file_path):
+                return {'ok': False, 'error': f"Archivo no encontrado: {file_path}"}
+
+            start = time.perf_counter()
+            result = self.system.process_single_file(
+                file_path, save_annotated=request.get('save_annotated', True)
+            )
+            if result is None:
+                return {'ok': False, 'error': f"No se pudo procesar el documento: {file_path}"}
+
+            return {
+                'ok': True,
+                'result': result,
+                'seconds': round(time.perf_counter() - start, 3),
+                'pid': os.getpid()
+            }
+
+        return {'ok': False, 'error': f"Comando desconocido: {command}"}
+
+    def _handle_stop(self, signum, frame) -> None:
+        """Detiene la supervisión (SIGTERM/SIGINT)"""
+        self._running = False
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _shutdown(self) -> None:
+        """Espera a los hijos y elimina el socket"""
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+        self.children.clear()
+
+        if self.listener is not None:
+            self.listener.close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        logger.info("Servicio detenido")
+
+
+def run_daemon(system, socket_path: str = None, workers: int = None) -> None:
+    """
+    Inicia el servicio en primer plano
+
+    Args:
+        system: PODValidationSystem precargado
+        socket_path: Ruta del socket Unix
+        workers: Número de procesos hijos
+    """
+    if not DAEMON_SUPPORTED:
+        logger.error("El modo servicio requiere fork() y sockets Unix (no disponible en Windows)")
+        sys.exit(1)
+
+    PODDaemon(system, socket_path, workers).serve_forever()
@@ -6,43 +6,282 @@ Almacena y gestiona historial completo de validaciones
 
 import sqlite3
 import os
+import re
+import time
+import queue
+import argparse
+import threading
+from concurrent.futures import Future
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Callable
 from loguru import logger
 import json
 
 
+def _json_default(value: Any) -> Any:
+    """Convierte tipos de numpy (y otros no serializables) a tipos de Python"""
+    if hasattr(value, 'item'):
+        return value.item()
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return str(value)
+
+
+GEMINI_ANALYSIS_INSERT = """
+    INSERT INTO gemini_analisis (
+        pod_id, manuscritos_detectados, manuscritos_texto, 
+        manuscritos_sentimiento, manuscritos_urgencia,
+        firma_autentica, firma_tipo, firma_confianza,
+        factura, cliente, pedido, fecha_entrega,
+        productos, cantidad, direccion,
+        clasificacion_gemini, necesita_revision, razon_revision,
+        fecha_analisis
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+GEMINI_QUEUE_INSERT = """
+    INSERT INTO cola_gemini (pod_id, resultado_id, ruta_archivo, pagina, estado, prioridad,
+                             contexto, fecha_creacion, fecha_actualizacion)
+    VALUES (?, ?, ?, ?, 'pendiente', ?, ?, ?, ?)
+"""
+
+SEARCH_INDEX_INSERT = """
+    INSERT INTO busqueda_pods (rowid, pod_id, pagina, archivo, texto, anotaciones, cliente, transcripcion)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+ROLLUP_UPSERT = """
+    INSERT INTO resumen_diario (fecha, codigo_clasificacion, cliente, fuente, total, validos, suma_confianza)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(fecha, codigo_clasificacion, cliente, fuente) DO UPDATE SET
+        total = total + excluded.total,
+        validos = validos + excluded.validos,
+        suma_confianza = suma_confianza + excluded.suma_confianza
+"""
+
+SENTIMENT_ROLLUP_UPSERT = """
+    INSERT INTO resumen_sentimiento_diario (fecha, cliente, fuente, sentimiento, analisis)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(fecha, cliente, fuente, sentimiento) DO UPDATE SET
+        analisis = analisis + excluded.analisis
+"""
+
+# Columnas por las que se puede agrupar resumen_diario
+ROLLUP_DIMENSIONS = ('fecha', 'codigo_clasificacion', 'cliente', 'fuente')
+
+
+def fts_query(text: str, column: str = None, prefix: bool = True) -> str:
+    """
+    Convierte texto libre en una consulta FTS5 para busqueda_pods
+
+    Cada palabra va entre comillas (los operadores y signos del usuario no se
+    interpretan) y todas deben aparecer; la última se busca como prefijo, así
+    'dañ' encuentra 'dañado'. Mayúsculas y acentos los ignora el tokenizador.
+
+    Args:
+        text: Texto buscado
+        column: Limitar la búsqueda a una columna (p. ej. 'cliente')
+        prefix: Buscar la última palabra como prefijo
+
+    Returns:
+        Consulta para MATCH ('' si el texto no tiene palabras)
+    """
+    terms = [f'"{word}"' for word in re.findall(r'\w+', text or '')]
+    if not terms:
+        return ''
+    if prefix:
+        terms[-1] += '*'
+    query = ' '.join(terms)
+    return f"{column} : ({query})" if column else query
+
+
+class SQLiteConnectionManager:
+    """
+    Conexiones SQLite para varios hilos: un escritor y muchos lectores
+
+    Cada hilo lee con su propia conexión (abierta al primer uso, de solo
+    lectura), así que la GUI, la interfaz web, las analíticas y los hilos de la
+    cola de Gemini consultan en paralelo; con WAL ninguna lectura espera a una
+    escritura. Todas las escrituras pasan por una cola que atiende un único
+    hilo con la única conexión de escritura: cada una es una transacción
+    BEGIN IMMEDIATE ... COMMIT y nunca compiten entre sí por el bloqueo.
+    """
+
+    def __init__(self, db_path: str, config: Dict[str, Any] = None):
+        """
+        Args:
+            db_path: Ruta al archivo de base de datos
+            config: Sección 'database' de la configuración (wal, synchronous, cache_size_mb)
+        """
+        self.db_path = db_path
+        self.config = config or {}
+
+        self._local = threading.local()
+        self._readers: Dict[threading.Thread, sqlite3.Connection] = {}
+        self._readers_lock = threading.Lock()
+
+        self._writes: queue.Queue = queue.Queue()
+        self._closed = False
+        self._writer = threading.Thread(target=self._writer_loop, daemon=True, name='pod-db-writer')
+        self._writer_ready = Future()
+        self._writer.start()
+        self._writer_ready.result()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Abre una conexión con las filas como sqlite3.Row"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA cache_size={-1024 * int(self.config.get('cache_size_mb', 20))}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def _apply_write_pragmas(self, conn: sqlite3.Connection) -> None:
+        """
+        Ajusta la conexión de escritura para escrituras frecuentes
+
+        Con WAL los lectores no bloquean al escritor y cada commit solo añade
+        al registro; synchronous=NORMAL sincroniza en los checkpoints en lugar
+        de en cada commit (una caída de energía puede perder la última
+        transacción, nunca corromper la base).
+        """
+        if self.config.get('wal', True):
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.config.get('synchronous', 'NORMAL')}")
+
+    def reader(self) -> sqlite3.Connection:
+        """
+        Conexión de lectura del hilo actual (se abre al primer uso)
+
+        Returns:
+            Conexión con PRAGMA query_only activo
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            return conn
+        if self._closed:
+            raise RuntimeError(f"Base de datos cerrada: {self.db_path}")
+
+        conn = self._connect()
+        conn.execute("PRAGMA query_only=ON")
+        with self._readers_lock:
+            # Los hilos que terminaron (p. ej. las ejecuciones de Streamlit) dejan su conexión
+            for thread in [thread for thread in self._readers if not thread.is_alive()]:
+                self._readers.pop(thread).close()
+            self._readers[threading.current_thread()] = conn
+        self._local.conn = conn
+        return conn
+
+    def write(self, operation: Callable[[sqlite3.Cursor], Any]) -> Any:
+        """
+        Ejecuta una escritura en el hilo escritor y espera su resultado
+
+        Args:
+            operation: Función que recibe el cursor de la transacción (sin
+                       confirmarla); si lanza una excepción se revierte todo
+
+        Returns:
+            Lo que devuelva la función (sus excepciones se propagan)
+        """
+        if threading.current_thread() is self._writer:
+            return operation(self._writer_conn.cursor())
+        if self._closed:
+            raise RuntimeError(f"Base de datos cerrada: {self.db_path}")
+
+        future = Future()
+        self._writes.put((operation, future))
+        return future.result()
+
+    def _writer_loop(self) -> None:
+        """Atiende la cola de escrituras con la única conexión de escritura"""
+        try:
+            self._writer_conn = self._connect()
+            self._apply_write_pragmas(self._writer_conn)
+        except Exception as e:
+            self._writer_ready.set_exception(e)
+            return
+        self._writer_ready.set_result(True)
+
+        while True:
+            item = self._writes.get()
+            if item is None:
+                break
+            operation, future = item
+            cursor = self._writer_conn.cursor()
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                result = operation(cursor)
+                self._writer_conn.commit()
+            except BaseException as e:
+                self._writer_conn.rollback()
+                future.set_exception(e)
+                continue
+            future.set_result(result)
+
+        self._writer_conn.close()
+
+    def close(self) -> None:
+        """Termina las escrituras en cola y cierra todas las conexiones"""
+        if self._closed:
+            return
+        self._closed = True
+        self._writes.put(None)
+        self._writer.join()
+        with self._readers_lock:
+            for conn in self._readers.values():
+                conn.close()
+            self._readers.clear()
+
+
 class PODDatabase:
     """
     Gestor de base de datos SQLite para PODs
+    
+    Se puede usar desde varios hilos a la vez: las consultas usan la conexión
+    de lectura de cada hilo y las escrituras se encolan al hilo escritor
+    (SQLiteConnectionManager).
     """
     
-    def __init__(self, db_path: str = "database/pods.db"):
+    def __init__(self, db_path: str = "database/pods.db", config: Dict[str, Any] = None):
         """
         Inicializa la conexión a la base de datos
         
         Args:
             db_path: Ruta al archivo de base de datos
+            config: Sección 'database' de la configuración (wal, synchronous,
+                    cache_size_mb, batch_size, flush_interval_ms)
         """
         self.db_path = db_path
+        self.config = config or {}
         
         # Crear directorio si no existe
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
         
-        # Conectar a la base de datos
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row
+        # Conexiones por hilo para leer y un hilo escritor
+        self.connections = SQLiteConnectionManager(db_path, self.config)
         
         # Crear tablas si no existen
         self._create_tables()
         
         logger.info(f"Base de datos inicializada: {db_path}")
     
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """
+        Conexión de lectura del hilo actual (la usan ExecutiveReportGenerator y
+        las clases de advanced_analytics); para escribir, usar los métodos
+        """
+        return self.connections.reader()
+    
     def _create_tables(self):
         """
         Crea las tablas necesarias en la base de datos
         """
-        cursor = self.conn.cursor()
+        self.connections.write(self._create_tables_in)
+        logger.info("Tablas de base de datos creadas/verificadas")
+    
+    @staticmethod
+    def _create_tables_in(cursor: sqlite3.Cursor) -> None:
+        """Crea las tablas e índices dentro de la transacción del hilo escritor"""
         
         # Tabla de PODs
         cursor.execute("""
@@ -133,14 +372,127 @@ class PODDatabase:
             )
         """)
         
+        # Tabla de características rápidas (entrenamiento del clasificador en cascada)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS caracteristicas_rapidas (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                pod_id INTEGER NOT NULL,
+                resultado_id INTEGER NOT NULL,
+                caracteristicas TEXT NOT NULL,
+                origen TEXT NOT NULL,
+                fecha TEXT NOT NULL,
+                FOREIGN KEY (pod_id) REFERENCES pods(id),
+                FOREIGN KEY (resultado_id) REFERENCES resultados(id)
+            )
+        """)
+        
+        # Cola persistente de revisiones con Gemini AI (procesada en segundo plano)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS cola_gemini (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                pod_id INTEGER NOT NULL,
+                resultado_id INTEGER NOT NULL,
+                ruta_archivo TEXT NOT NULL,
+                pagina INTEGER NOT NULL DEFAULT 1,
+                estado TEXT NOT NULL DEFAULT 'pendiente',
+                prioridad REAL NOT NULL DEFAULT 0,
+                intentos INTEGER NOT NULL DEFAULT 0,
+                contexto TEXT NOT NULL,
+                resultado TEXT,
+                ultimo_error TEXT,
+                fecha_creacion TEXT NOT NULL,
+                fecha_actualizacion TEXT NOT NULL,
+                FOREIGN KEY (pod_id) REFERENCES pods(id),
+                FOREIGN KEY (resultado_id) REFERENCES resultados(id)
+            )
+        """)
+        
+        # Bases creadas antes de la priorización: agregar la columna
+        cursor.execute("PRAGMA table_info(cola_gemini)")
+        if 'prioridad' not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute("ALTER TABLE cola_gemini ADD COLUMN prioridad REAL NOT NULL DEFAULT 0")
+        
+        # Consumo diario de la API de Gemini (presupuesto)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS presupuesto_gemini (
+                fecha TEXT PRIMARY KEY,
+                llamadas INTEGER NOT NULL DEFAULT 0,
+                costo REAL NOT NULL DEFAULT 0,
+                revisiones INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        
+        # Índice de texto completo: nombre, texto OCR de la página, anotaciones,
+        # cliente y transcripción de manuscritos (una fila por resultado, rowid = resultados.id)
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'busqueda_pods'")
+        search_index_exists = cursor.fetchone() is not None
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS busqueda_pods USING fts5(
+                pod_id UNINDEXED,
+                pagina UNINDEXED,
+                archivo,
+                texto,
+                anotaciones,
+                cliente,
+                transcripcion,
+                tokenize = 'unicode61 remove_diacritics 2'
+            )
+        """)
+        
+        # Bases anteriores al índice: indexar los clientes y transcripciones ya
+        # guardados (el texto OCR no se almacenaba)
+        if not search_index_exists:
+            cursor.execute("""
+                INSERT INTO busqueda_pods (rowid, pod_id, pagina, archivo, texto, anotaciones, cliente, transcripcion)
+                SELECT r.id, r.pod_id, 1, p.nombre_archivo, '', '',
+                       COALESCE(g.cliente, ''), COALESCE(g.manuscritos_texto, '')
+                FROM resultados r
+                JOIN pods p ON p.id = r.pod_id
+                LEFT JOIN gemini_analisis g
+                    ON g.id = (SELECT MAX(id) FROM gemini_analisis WHERE pod_id = r.pod_id)
+            """)
+        
+        # Agregados diarios para reportes y tableros (se actualizan en cada
+        # escritura; rebuild_rollups los recalcula desde el detalle)
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'resumen_diario'")
+        rollups_exist = cursor.fetchone() is not None
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS resumen_diario (
+                fecha TEXT NOT NULL,
+                codigo_clasificacion TEXT NOT NULL,
+                cliente TEXT NOT NULL DEFAULT '',
+                fuente TEXT NOT NULL DEFAULT '',
+                total INTEGER NOT NULL DEFAULT 0,
+                validos INTEGER NOT NULL DEFAULT 0,
+                suma_confianza REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (fecha, codigo_clasificacion, cliente, fuente)
+            ) WITHOUT ROWID
+        """)
+        
+        # Sentimiento de los manuscritos por día de análisis de Gemini
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS resumen_sentimiento_diario (
+                fecha TEXT NOT NULL,
+                cliente TEXT NOT NULL DEFAULT '',
+                fuente TEXT NOT NULL DEFAULT '',
+                sentimiento TEXT NOT NULL,
+                analisis INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (fecha, cliente, fuente, sentimiento)
+            ) WITHOUT ROWID
+        """)
+        
+        # Bases anteriores a los agregados: calcularlos desde el historial
+        if not rollups_exist:
+            PODDatabase._rebuild_rollups(cursor)
+        
         # Índices para búsquedas rápidas
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_pod_nombre ON pods(nombre_archivo)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_clasificacion ON resultados(codigo_clasificacion)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_fecha_proceso ON pods(fecha_procesamiento)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_alertas_prioridad ON alertas(prioridad)")
-        
-        self.conn.commit()
-        logger.info("Tablas de base de datos creadas/verificadas")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_alertas_prioridad_fecha ON alertas(prioridad, fecha)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cola_gemini_estado ON cola_gemini(estado, prioridad DESC, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cola_gemini_pod ON cola_gemini(pod_id)")
     
     def save_pod_result(self, result: Dict[str, Any]) -> int:
         """
@@ -150,61 +502,68 @@ class PODDatabase:
             result: Diccionario con resultado de clasificación
             
         Returns:
-            ID del POD guardado
+            ID del POD guardado (-1 si falla)
         """
-        cursor = self.conn.cursor()
+        return self.save_pod_results([result])[0]
+    
+    def save_pod_results(self, results: List[Dict[str, Any]]) -> List[int]:
+        """
+        Guarda varios resultados en una sola transacción
         
-        try:
-            # Extraer información del archivo
-            nombre_archivo = os.path.basename(result['source_file'])
-            
-            # Verificar si ya existe
-            cursor.execute("SELECT id FROM pods WHERE nombre_archivo = ?", (nombre_archivo,))
-            existing = cursor.fetchone()
-            
-            if existing:
-                pod_id = existing[0]
-                logger.debug(f"POD ya existe en BD: {nombre_archivo} (ID: {pod_id})")
-            else:
-                # Insertar POD
-                doc_info = result.get('document_info', {})
-                cursor.execute("""
-                    INSERT INTO pods (nombre_archivo, ruta_original, tamaño_mb, formato, 
-                                    fecha_procesamiento, fuente)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (
-                    nombre_archivo,
-                    result['source_file'],
-                    doc_info.get('size_mb', 0),
-                    doc_info.get('extension', ''),
-                    datetime.now().isoformat(),
-                    'cloud' if 'Temp' in result['source_file'] else 'local'
-                ))
-                pod_id = cursor.lastrowid
-                logger.info(f"Nuevo POD guardado en BD: {nombre_archivo} (ID: {pod_id})")
-            
-            # Guardar resultado de clasificación
-            cursor.execute("""
-                INSERT INTO resultados (pod_id, clasificacion, codigo_clasificacion, 
-                                      es_valido, confianza, fecha_analisis)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (
-                pod_id,
-                result['classification'],
-                result['classification_code'],
-                result['is_valid'],
-                result['confidence'],
-                datetime.now().isoformat()
-            ))
+        Cada tabla se escribe con un executemany; con un lote de N resultados
+        hay una sola sincronización a disco en lugar de N. Si el lote falla
+        (p. ej. un resultado malformado), se reintenta resultado por resultado
+        para que uno malo no descarte a los demás.
+        
+        Args:
+            results: Resultados de clasificación
             
-            # Guardar detecciones
+        Returns:
+            IDs de los PODs en el mismo orden (-1 en los que no se pudieron guardar)
+        """
+        if not results:
+            return []
+        
+        try:
+            pod_ids = self.connections.write(lambda cursor: self._write_pod_results(cursor, results))
+        except Exception as e:
+            if len(results) == 1:
+                logger.error(f"Error guardando en BD: {e}")
+                return [-1]
+            logger.warning(f"Lote de {len(results)} resultados falló ({e}) - guardando uno por uno")
+            return [self.save_pod_results([result])[0] for result in results]
+        
+        logger.debug(f"{len(results)} resultado(s) guardados en BD")
+        return pod_ids
+    
+    def _write_pod_results(self, cursor: sqlite3.Cursor, results: List[Dict[str, Any]]) -> List[int]:
+        """
+        Escribe un lote de resultados dentro de la transacción del hilo escritor
+        
+        Returns:
+            IDs de los PODs en el mismo orden
+        """
+        now = datetime.now().isoformat()
+        
+        # PODs: reutilizar los existentes, insertar los nuevos
+        pod_ids = self._upsert_pods(cursor, results, now)
+        
+        # Resultados de clasificación
+        resultado_ids = self._insert_many(cursor, 'resultados', """
+            INSERT INTO resultados (pod_id, clasificacion, codigo_clasificacion, 
+                                  es_valido, confianza, fecha_analisis)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [
+            (pod_id, result['classification'], result['classification_code'],
+             result['is_valid'], result['confidence'], now)
+            for pod_id, result in zip(pod_ids, results)
+        ])
+        
+        # Detecciones
+        detection_rows = []
+        for pod_id, result in zip(pod_ids, results):
             details = result.get('details', {})
-            cursor.execute("""
-                INSERT INTO detecciones (pod_id, num_firmas, num_sellos, num_anotaciones,
-                                       sentimiento, campos_detectados, confianza_ocr,
-                                       es_borroso, es_completo)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
+            detection_rows.append((
                 pod_id,
                 len(details.get('signatures', [])),
                 len(details.get('stamps', [])),
@@ -215,53 +574,569 @@ class PODDatabase:
                 details.get('is_blurry', False),
                 details.get('is_complete', True)
             ))
+        cursor.executemany("""
+            INSERT INTO detecciones (pod_id, num_firmas, num_sellos, num_anotaciones,
+                                   sentimiento, campos_detectados, confianza_ocr,
+                                   es_borroso, es_completo)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, detection_rows)
+        
+        # Características rápidas (para entrenar la cascada)
+        cursor.executemany("""
+            INSERT INTO caracteristicas_rapidas (pod_id, resultado_id, caracteristicas,
+                                                origen, fecha)
+            VALUES (?, ?, ?, ?, ?)
+        """, [
+            (pod_id, resultado_id, json.dumps(result['details']['cheap_features']),
+             'cascada' if result['details'].get('cascade', {}).get('fast_path') else 'pipeline', now)
+            for pod_id, resultado_id, result in zip(pod_ids, resultado_ids, results)
+            if 'cheap_features' in result.get('details', {})
+        ])
+        
+        # Análisis de Gemini AI (si existe)
+        gemini_rows = [self._gemini_analysis_row(pod_id, result, now)
+                       for pod_id, result in zip(pod_ids, results)]
+        cursor.executemany(GEMINI_ANALYSIS_INSERT, [row for row in gemini_rows if row is not None])
+        
+        # Revisiones con Gemini encoladas (modo en segundo plano)
+        cursor.executemany(GEMINI_QUEUE_INSERT, [
+            self._gemini_queue_row(pod_id, resultado_id, result, now)
+            for pod_id, resultado_id, result in zip(pod_ids, resultado_ids, results)
+            if result.get('gemini_pending')
+        ])
+        
+        # Índice de texto completo
+        search_rows = [self._search_index_row(pod_id, resultado_id, result)
+                       for pod_id, resultado_id, result in zip(pod_ids, resultado_ids, results)]
+        cursor.executemany(SEARCH_INDEX_INSERT, search_rows)
+        
+        # Agregados diarios (un UPSERT por combinación del lote)
+        sources = self._pod_sources(cursor, set(pod_ids))
+        rollup = {}
+        sentiment_rollup = {}
+        for pod_id, result, search_row, gemini_row in zip(pod_ids, results, search_rows, gemini_rows):
+            key = (now[:10], result['classification_code'], search_row[6], sources[pod_id])
+            total, valid, confidence = rollup.get(key, (0, 0, 0.0))
+            rollup[key] = (total + 1, valid + int(bool(result['is_valid'])), confidence + result['confidence'])
+            if gemini_row is not None:
+                sentiment_key = (now[:10], search_row[6], sources[pod_id], gemini_row[3])
+                sentiment_rollup[sentiment_key] = sentiment_rollup.get(sentiment_key, 0) + 1
+        cursor.executemany(ROLLUP_UPSERT, [key + values for key, values in rollup.items()])
+        cursor.executemany(SENTIMENT_ROLLUP_UPSERT, [key + (count,) for key, count in sentiment_rollup.items()])
+        
+        return pod_ids
+    
+    def _upsert_pods(self, cursor: sqlite3.Cursor, results: List[Dict[str, Any]], now: str) -> List[int]:
+        """
+        IDs de los PODs de un lote, insertando los que no existen
+        
+        Args:
+            cursor: Cursor de la transacción en curso
+            results: Resultados del lote
+            now: Fecha de procesamiento
+            
+        Returns:
+            ID del POD de cada resultado
+        """
+        names = [os.path.basename(result['source_file']) for result in results]
+        ids = self._pod_ids_by_name(cursor, set(names))
+        
+        new_rows = {}
+        for name, result in zip(names, results):
+            if name in ids or name in new_rows:
+                continue
+            doc_info = result.get('document_info', {})
+            new_rows[name] = (
+                name,
+                result['source_file'],
+                doc_info.get('size_mb', 0),
+                doc_info.get('extension', ''),
+                now,
+                'cloud' if 'Temp' in result['source_file'] else 'local'
+            )
+        
+        if new_rows:
+            cursor.executemany("""
+                INSERT INTO pods (nombre_archivo, ruta_original, tamaño_mb, formato, 
+                                fecha_procesamiento, fuente)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, list(new_rows.values()))
+            ids.update(self._pod_ids_by_name(cursor, set(new_rows)))
+            logger.info(f"{len(new_rows)} POD(s) nuevo(s) guardado(s) en BD")
+        
+        return [ids[name] for name in names]
+    
+    @staticmethod
+    def _pod_ids_by_name(cursor: sqlite3.Cursor, names: set) -> Dict[str, int]:
+        """IDs de PODs por nombre de archivo (consultas de hasta 500 nombres)"""
+        names = list(names)
+        ids = {}
+        for start in range(0, len(names), 500):
+            chunk = names[start:start + 500]
+            cursor.execute(
+                f"SELECT id, nombre_archivo FROM pods WHERE nombre_archivo IN ({','.join('?' * len(chunk))})",
+                chunk
+            )
+            ids.update({row[1]: row[0] for row in cursor.fetchall()})
+        return ids
+    
+    @staticmethod
+    def _pod_sources(cursor: sqlite3.Cursor, pod_ids: set) -> Dict[int, str]:
+        """Fuente (local/cloud) de cada POD (consultas de hasta 500 IDs)"""
+        pod_ids = list(pod_ids)
+        sources = {}
+        for start in range(0, len(pod_ids), 500):
+            chunk = pod_ids[start:start + 500]
+            cursor.execute(
+                f"SELECT id, fuente FROM pods WHERE id IN ({','.join('?' * len(chunk))})",
+                chunk
+            )
+            sources.update({row[0]: row[1] or '' for row in cursor.fetchall()})
+        return sources
+    
+    @staticmethod
+    def _insert_many(cursor: sqlite3.Cursor, table: str, sql: str, rows: List[tuple]) -> List[int]:
+        """
+        executemany que devuelve los IDs asignados
+        
+        Con AUTOINCREMENT y la transacción de escritura tomada (BEGIN IMMEDIATE)
+        los IDs de un mismo executemany son consecutivos y terminan en el valor
+        de sqlite_sequence.
+        """
+        cursor.executemany(sql, rows)
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,))
+        last_id = cursor.fetchone()[0]
+        return list(range(last_id - len(rows) + 1, last_id + 1))
+    
+    @staticmethod
+    def _gemini_analysis_row(pod_id: int, result: Dict[str, Any], now: str) -> Optional[tuple]:
+        """
+        Fila de gemini_analisis de un resultado (None si no tiene análisis de Gemini)
+        """
+        details = result.get('details', {})
+        if not ('gemini_manuscripts' in details or 'gemini_signature' in details or 'gemini_fields' in details):
+            return None
+        
+        gemini_manuscripts = details.get('gemini_manuscripts') or {}
+        gemini_signature = details.get('gemini_signature') or {}
+        gemini_fields = (details.get('gemini_fields') or {}).get('fields', {})
+        
+        return (
+            pod_id,
+            gemini_manuscripts.get('has_annotations', False),
+            gemini_manuscripts.get('transcription', ''),
+            gemini_manuscripts.get('sentiment', 'neutral'),
+            gemini_manuscripts.get('urgency', 'normal'),
+            gemini_signature.get('is_authentic', False),
+            gemini_signature.get('signature_type', 'unknown'),
+            gemini_signature.get('confidence', 'low'),
+            gemini_fields.get('invoice_number', ''),
+            gemini_fields.get('client_name', ''),
+            gemini_fields.get('order_number', ''),
+            gemini_fields.get('delivery_date', ''),
+            gemini_fields.get('products', ''),
+            gemini_fields.get('quantity', ''),
+            gemini_fields.get('address', ''),
+            details.get('gemini_classification', {}).get('classification_text', ''),
+            result.get('needs_review', False),
+            result.get('review_reason', ''),
+            now
+        )
+    
+    @staticmethod
+    def _search_index_row(pod_id: int, resultado_id: int, result: Dict[str, Any]) -> tuple:
+        """
+        Fila de busqueda_pods de un resultado
+        
+        El texto indexado es el OCR de página completa cuando el clasificador
+        lo calculó ('page_text'). Si no, es el texto de legibilidad, que en
+        modo plantilla o por regiones cubre solo las cajas o regiones leídas.
+        
+        Returns:
+            Tupla de valores para SEARCH_INDEX_INSERT
+        """
+        details = result.get('details', {})
+        gemini_fields = (details.get('gemini_fields') or {}).get('fields', {})
+        return (
+            resultado_id,
+            pod_id,
+            result.get('page_number', 1),
+            os.path.basename(result['source_file']),
+            details.get('page_text') or details.get('legibility', {}).get('text', ''),
+            '\n'.join(details.get('annotations', {}).get('text_content', [])),
+            gemini_fields.get('client_name', '') or '',
+            (details.get('gemini_manuscripts') or {}).get('transcription', '') or ''
+        )
+    
+    def _insert_gemini_analysis(self, cursor: sqlite3.Cursor, pod_id: int,
+                                result: Dict[str, Any], resultado_id: Optional[int]) -> bool:
+        """
+        Inserta el análisis de Gemini de un resultado (sin confirmar la transacción),
+        actualiza el cliente y la transcripción en el índice de texto completo y
+        cuenta el sentimiento en resumen_sentimiento_diario
+        
+        Args:
+            cursor: Cursor de la transacción en curso
+            pod_id: ID del POD
+            result: Resultado con details['gemini_*']
+            resultado_id: Resultado revisado
             
-            # Guardar análisis de Gemini AI (si existe)
-            if 'gemini_manuscripts' in details or 'gemini_signature' in details or 'gemini_fields' in details:
-                gemini_manuscripts = details.get('gemini_manuscripts', {})
-                gemini_signature = details.get('gemini_signature', {})
-                gemini_fields = details.get('gemini_fields', {}).get('fields', {})
-                
+        Returns:
+            True si había análisis de Gemini que guardar
+        """
+        now = datetime.now().isoformat()
+        row = self._gemini_analysis_row(pod_id, result, now)
+        if row is None:
+            return False
+        
+        cursor.execute(GEMINI_ANALYSIS_INSERT, row)
+        
+        client, transcription = row[9] or '', row[2] or ''
+        cursor.execute("UPDATE busqueda_pods SET cliente = ?, transcripcion = ? WHERE rowid = ?",
+                       (client, transcription, resultado_id))
+        
+        source = self._pod_sources(cursor, {pod_id}).get(pod_id, '')
+        cursor.execute(SENTIMENT_ROLLUP_UPSERT, (now[:10], client, source, row[3], 1))
+        logger.info(f"Análisis Gemini guardado en BD para POD ID: {pod_id}")
+        return True
+    
+    def save_gemini_analysis(self, pod_id: int, result: Dict[str, Any]) -> bool:
+        """
+        Guarda el análisis de Gemini de un POD ya registrado
+        
+        Args:
+            pod_id: ID del POD
+            result: Resultado con details['gemini_*'], needs_review y review_reason
+            
+        Returns:
+            True si se guardó un análisis
+        """
+        def write(cursor: sqlite3.Cursor) -> bool:
+            cursor.execute("SELECT MAX(id) FROM resultados WHERE pod_id = ?", (pod_id,))
+            resultado_id = cursor.fetchone()[0]
+            before = self._rollup_key(cursor, resultado_id)
+            saved = self._insert_gemini_analysis(cursor, pod_id, result, resultado_id)
+            self._move_rollup(cursor, before, self._rollup_key(cursor, resultado_id))
+            return saved
+        
+        try:
+            return self.connections.write(write)
+        except Exception as e:
+            logger.error(f"Error guardando análisis Gemini en BD: {e}")
+            return False
+    
+    @staticmethod
+    def _rollup_key(cursor: sqlite3.Cursor, resultado_id: Optional[int]) -> Optional[tuple]:
+        """
+        Aporte actual de un resultado a resumen_diario
+        
+        Returns:
+            Tupla (fecha, código, cliente, fuente, válido, confianza) o None si no existe
+        """
+        cursor.execute("""
+            SELECT substr(r.fecha_analisis, 1, 10), r.codigo_clasificacion, COALESCE(b.cliente, ''),
+                   COALESCE(p.fuente, ''), r.es_valido, r.confianza
+            FROM resultados r
+            JOIN pods p ON p.id = r.pod_id
+            LEFT JOIN busqueda_pods b ON b.rowid = r.id
+            WHERE r.id = ?
+        """, (resultado_id,))
+        row = cursor.fetchone()
+        return tuple(row) if row else None
+    
+    @staticmethod
+    def _move_rollup(cursor: sqlite3.Cursor, before: Optional[tuple], after: Optional[tuple]) -> None:
+        """
+        Pasa el aporte de un resultado modificado (reclasificado o con cliente
+        nuevo) de su combinación anterior de resumen_diario a la nueva
+        """
+        if before == after:
+            return
+        rows = []
+        if before is not None:
+            rows.append(before[:4] + (-1, -int(bool(before[4])), -before[5]))
+        if after is not None:
+            rows.append(after[:4] + (1, int(bool(after[4])), after[5]))
+        cursor.executemany(ROLLUP_UPSERT, rows)
+    
+    @staticmethod
+    def _gemini_queue_row(pod_id: int, resultado_id: int, result: Dict[str, Any], now: str) -> tuple:
+        """
+        Fila de cola_gemini para un resultado con el contexto en 'gemini_pending'
+        
+        Args:
+            pod_id: ID del POD
+            resultado_id: ID del resultado que la revisión puede corregir
+            result: Resultado con el contexto de la revisión en 'gemini_pending'
+            now: Fecha de creación
+            
+        Returns:
+            Tupla de valores para GEMINI_QUEUE_INSERT
+        """
+        return (
+            pod_id,
+            resultado_id,
+            result['source_file'],
+            result.get('page_number', 1),
+            result['gemini_pending'].get('priority', 0.0),
+            json.dumps(result['gemini_pending'], default=_json_default),
+            now,
+            now
+        )
+    
+    def claim_gemini_jobs(self, limit: int = 1, budget: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """
+        Toma los trabajos pendientes de mayor prioridad y los marca como 'procesando'
+        
+        La transacción es inmediata, de modo que varios procesos con su propia
+        conexión no toman el mismo trabajo. Con presupuesto, solo se toman los
+        trabajos que caben en el consumo restante del día, que se descuenta en
+        la misma transacción: una solicitud por cada jobs_per_request trabajos
+        (revisión por lotes), no una por trabajo.
+        
+        Args:
+            limit: Máximo de trabajos a tomar
+            budget: Límites del día ('fecha', 'max_calls', 'max_cost',
+                    'calls_per_request', 'cost_per_request', 'jobs_per_request';
+                    0 = sin límite) o None
+            
+        Returns:
+            Lista de trabajos (con 'contexto' ya decodificado)
+        """
+        try:
+            jobs = self.connections.write(lambda cursor: self._claim_gemini_jobs(cursor, limit, budget))
+        except Exception as e:
+            logger.error(f"Error tomando trabajos de la cola Gemini: {e}")
+            return []
+        
+        for job in jobs:
+            job['intentos'] += 1
+            job['contexto'] = json.loads(job['contexto'])
+        return jobs
+    
+    @staticmethod
+    def _claim_gemini_jobs(cursor: sqlite3.Cursor, limit: int, budget: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Toma los trabajos dentro de la transacción del hilo escritor (ver claim_gemini_jobs)"""
+        if budget:
+            cursor.execute("SELECT llamadas, costo FROM presupuesto_gemini WHERE fecha = ?",
+                           (budget['fecha'],))
+            row = cursor.fetchone()
+            used_calls, used_cost = (row[0], row[1]) if row else (0, 0.0)
+            per_request = budget['jobs_per_request']
+            if budget['max_calls']:
+                requests = (budget['max_calls'] - used_calls) // budget['calls_per_request']
+                limit = min(limit, requests * per_request)
+            if budget['max_cost'] and budget['cost_per_request']:
+                requests = int(round(budget['max_cost'] - used_cost, 9) // budget['cost_per_request'])
+                limit = min(limit, requests * per_request)
+            if limit <= 0:
+                return []
+        
+        cursor.execute("""
+            SELECT * FROM cola_gemini
+            WHERE estado = 'pendiente'
+            ORDER BY prioridad DESC, id
+            LIMIT ?
+        """, (limit,))
+        jobs = [dict(row) for row in cursor.fetchall()]
+        
+        now = datetime.now().isoformat()
+        cursor.executemany("""
+            UPDATE cola_gemini
+            SET estado = 'procesando', intentos = intentos + 1, fecha_actualizacion = ?
+            WHERE id = ?
+        """, [(now, job['id']) for job in jobs])
+        
+        if budget and jobs:
+            requests = -(-len(jobs) // budget['jobs_per_request'])
+            cursor.execute("""
+                INSERT INTO presupuesto_gemini (fecha, llamadas, costo, revisiones)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(fecha) DO UPDATE SET
+                    llamadas = llamadas + excluded.llamadas,
+                    costo = costo + excluded.costo,
+                    revisiones = revisiones + excluded.revisiones
+            """, (
+                budget['fecha'],
+                requests * budget['calls_per_request'],
+                requests * budget['cost_per_request'],
+                len(jobs)
+            ))
+        return jobs
+    
+    def record_gemini_budget_calls(self, fecha: str, calls: int, cost: float) -> None:
+        """
+        Suma al consumo del día llamadas no descontadas al tomar los trabajos
+        (p. ej. las revisiones individuales de respaldo de un lote)
+        
+        Args:
+            fecha: Día en formato YYYY-MM-DD
+            calls: Llamadas adicionales
+            cost: Costo adicional
+        """
+        def write(cursor: sqlite3.Cursor) -> None:
+            cursor.execute("""
+                INSERT INTO presupuesto_gemini (fecha, llamadas, costo)
+                VALUES (?, ?, ?)
+                ON CONFLICT(fecha) DO UPDATE SET
+                    llamadas = llamadas + excluded.llamadas,
+                    costo = costo + excluded.costo
+            """, (fecha, calls, cost))
+        
+        try:
+            self.connections.write(write)
+        except Exception as e:
+            logger.error(f"Error registrando consumo de Gemini: {e}")
+    
+    def complete_gemini_job(self, job: Dict[str, Any], result: Dict[str, Any]) -> None:
+        """
+        Cierra un trabajo: guarda el análisis de Gemini y, si la revisión cambió
+        la clasificación, corrige el resultado
+        
+        Args:
+            job: Trabajo tomado con claim_gemini_jobs
+            result: Resultado revisado por Gemini
+        """
+        def write(cursor: sqlite3.Cursor) -> None:
+            before = self._rollup_key(cursor, job['resultado_id'])
+            self._insert_gemini_analysis(cursor, job['pod_id'], result, job['resultado_id'])
+            
+            if result['classification_code'] != job['contexto']['classification_code']:
                 cursor.execute("""
-                    INSERT INTO gemini_analisis (
-                        pod_id, manuscritos_detectados, manuscritos_texto, 
-                        manuscritos_sentimiento, manuscritos_urgencia,
-                        firma_autentica, firma_tipo, firma_confianza,
-                        factura, cliente, pedido, fecha_entrega,
-                        productos, cantidad, direccion,
-                        clasificacion_gemini, necesita_revision, razon_revision,
-                        fecha_analisis
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    UPDATE resultados
+                    SET clasificacion = ?, codigo_clasificacion = ?, es_valido = ?
+                    WHERE id = ?
                 """, (
-                    pod_id,
-                    gemini_manuscripts.get('has_annotations', False),
-                    gemini_manuscripts.get('transcription', ''),
-                    gemini_manuscripts.get('sentiment', 'neutral'),
-                    gemini_manuscripts.get('urgency', 'normal'),
-                    gemini_signature.get('is_authentic', False),
-                    gemini_signature.get('signature_type', 'unknown'),
-                    gemini_signature.get('confidence', 'low'),
-                    gemini_fields.get('invoice_number', ''),
-                    gemini_fields.get('client_name', ''),
-                    gemini_fields.get('order_number', ''),
-                    gemini_fields.get('delivery_date', ''),
-                    gemini_fields.get('products', ''),
-                    gemini_fields.get('quantity', ''),
-                    gemini_fields.get('address', ''),
-                    details.get('gemini_classification', {}).get('classification_text', ''),
-                    result.get('needs_review', False),
-                    result.get('review_reason', ''),
-                    datetime.now().isoformat()
+                    result['classification'],
+                    result['classification_code'],
+                    result['is_valid'],
+                    job['resultado_id']
                 ))
-                logger.info(f"Análisis Gemini guardado en BD para POD ID: {pod_id}")
+                logger.info(f"Resultado {job['resultado_id']} reclasificado por Gemini a "
+                            f"{result['classification_code']}")
             
-            self.conn.commit()
-            return pod_id
+            review = {key: value for key, value in result['details'].items() if key.startswith('gemini_')}
+            review.update({
+                'classification': result['classification'],
+                'classification_code': result['classification_code'],
+                'is_valid': result['is_valid'],
+                'issues': result.get('issues', []),
+                'needs_review': result.get('needs_review', False),
+                'review_reason': result.get('review_reason', '')
+            })
+            cursor.execute("""
+                UPDATE cola_gemini
+                SET estado = 'completado', resultado = ?, ultimo_error = NULL, fecha_actualizacion = ?
+                WHERE id = ?
+            """, (json.dumps(review, default=_json_default), datetime.now().isoformat(), job['id']))
             
+            self._move_rollup(cursor, before, self._rollup_key(cursor, job['resultado_id']))
+        
+        try:
+            self.connections.write(write)
         except Exception as e:
-            self.conn.rollback()
-            logger.error(f"Error guardando en BD: {e}")
-            return -1
+            logger.error(f"Error cerrando trabajo {job['id']} de la cola Gemini: {e}")
+            raise
+    
+    def fail_gemini_job(self, job: Dict[str, Any], error: str, max_attempts: int = 3) -> None:
+        """
+        Registra un fallo: el trabajo vuelve a 'pendiente' hasta agotar los intentos
+        
+        Args:
+            job: Trabajo tomado con claim_gemini_jobs
+            error: Descripción del error
+            max_attempts: Intentos antes de marcarlo como 'error'
+        """
+        estado = 'error' if job['intentos'] >= max_attempts else 'pendiente'
+        self.connections.write(lambda cursor: cursor.execute("""
+            UPDATE cola_gemini
+            SET estado = ?, ultimo_error = ?, fecha_actualizacion = ?
+            WHERE id = ?
+        """, (estado, error, datetime.now().isoformat(), job['id'])))
+    
+    def requeue_stale_gemini_jobs(self, older_than_seconds: float = 600) -> int:
+        """
+        Devuelve a 'pendiente' los trabajos que quedaron en 'procesando' (p. ej.
+        porque el proceso terminó a mitad de la revisión)
+        
+        Args:
+            older_than_seconds: Antigüedad mínima de la última actualización
+            
+        Returns:
+            Número de trabajos reencolados
+        """
+        cutoff = datetime.fromtimestamp(datetime.now().timestamp() - older_than_seconds).isoformat()
+        return self.connections.write(lambda cursor: cursor.execute("""
+            UPDATE cola_gemini
+            SET estado = 'pendiente', fecha_actualizacion = ?
+            WHERE estado = 'procesando' AND fecha_actualizacion < ?
+        """, (datetime.now().isoformat(), cutoff)).rowcount)
+    
+    def get_gemini_budget_usage(self, fecha: str) -> Dict[str, Any]:
+        """
+        Consumo de Gemini de un día y prioridad de lo revisado frente a lo diferido
+        
+        Args:
+            fecha: Día en formato YYYY-MM-DD
+            
+        Returns:
+            Diccionario con 'llamadas', 'costo', 'revisiones', 'diferidos',
+            'prioridad_revisados' y 'prioridad_diferidos'
+        """
+        conn = self.conn
+        cursor = conn.execute("SELECT llamadas, costo, revisiones FROM presupuesto_gemini WHERE fecha = ?",
+                              (fecha,))
+        row = cursor.fetchone()
+        usage = dict(row) if row else {'llamadas': 0, 'costo': 0.0, 'revisiones': 0}
+        
+        cursor = conn.execute("""
+            SELECT AVG(prioridad) FROM cola_gemini
+            WHERE estado IN ('procesando', 'completado', 'error') AND fecha_actualizacion LIKE ?
+        """, (f"{fecha}%",))
+        usage['prioridad_revisados'] = cursor.fetchone()[0]
+        
+        cursor = conn.execute("SELECT COUNT(*), AVG(prioridad) FROM cola_gemini WHERE estado = 'pendiente'")
+        usage['diferidos'], usage['prioridad_diferidos'] = cursor.fetchone()
+        return usage
+    
+    def get_gemini_queue_counts(self) -> Dict[str, int]:
+        """
+        Trabajos de la cola de Gemini por estado
+        
+        Returns:
+            Diccionario {'pendiente', 'procesando', 'completado', 'error'}
+        """
+        counts = {'pendiente': 0, 'procesando': 0, 'completado': 0, 'error': 0}
+        cursor = self.conn.execute("SELECT estado, COUNT(*) FROM cola_gemini GROUP BY estado")
+        counts.update({row[0]: row[1] for row in cursor.fetchall()})
+        return counts
+    
+    def get_gemini_review(self, source_file: str, page_number: int = 1) -> Optional[Dict[str, Any]]:
+        """
+        Último trabajo de revisión con Gemini de un archivo
+        
+        Args:
+            source_file: Ruta del archivo procesado
+            page_number: Página del documento
+            
+        Returns:
+            Diccionario con 'estado', 'intentos', 'ultimo_error' y 'resultado'
+            (decodificado, solo si está completado), o None si no se encoló
+        """
+        cursor = self.conn.execute("""
+            SELECT estado, intentos, ultimo_error, resultado, fecha_actualizacion
+            FROM cola_gemini
+            WHERE ruta_archivo = ? AND pagina = ?
+            ORDER BY id DESC
+            LIMIT 1
+        """, (source_file, page_number))
+        row = cursor.fetchone()
+        
+        if row is None:
+            return None
+        review = dict(row)
+        review['resultado'] = json.loads(review['resultado']) if review['resultado'] else None
+        return review
     
     def get_statistics(self) -> Dict[str, Any]:
         """
@@ -275,19 +1150,18 @@ class PODDatabase:
         cursor.execute("SELECT COUNT(*) FROM pods")
         stats['total_pods'] = cursor.fetchone()[0]
         
-        # Por clasificación
+        # Por clasificación (agregados diarios)
         cursor.execute("""
-            SELECT codigo_clasificacion, COUNT(*) as count
-            FROM resultados
+            SELECT codigo_clasificacion, SUM(total) as count
+            FROM resumen_diario
             GROUP BY codigo_clasificacion
+            HAVING SUM(total) > 0
         """)
         stats['por_clasificacion'] = {row[0]: row[1] for row in cursor.fetchall()}
         
         # Válidos vs inválidos
-        cursor.execute("SELECT es_valido, COUNT(*) FROM resultados GROUP BY es_valido")
-        validos_data = {row[0]: row[1] for row in cursor.fetchall()}
-        stats['validos'] = validos_data.get(1, 0)
-        stats['invalidos'] = validos_data.get(0, 0)
+        cursor.execute("SELECT COALESCE(SUM(validos), 0), COALESCE(SUM(total - validos), 0) FROM resumen_diario")
+        stats['validos'], stats['invalidos'] = cursor.fetchone()
         
         # Último procesamiento
         cursor.execute("SELECT MAX(fecha_procesamiento) FROM pods")
@@ -299,6 +1173,87 @@ class PODDatabase:
         
         return stats
     
+    def get_daily_summary(self, fecha_desde: str, fecha_hasta: str = None,
+                          group_by: List[str] = None) -> List[Dict]:
+        """
+        Totales de resumen_diario en un rango de días
+        
+        Args:
+            fecha_desde: Primer día (YYYY-MM-DD)
+            fecha_hasta: Último día (por defecto, sin límite)
+            group_by: Columnas de agrupación ('fecha', 'codigo_clasificacion',
+                      'cliente', 'fuente'); sin columnas, un solo total
+            
+        Returns:
+            Filas con las columnas de agrupación, 'total', 'validos',
+            'invalidos' y 'confianza_media'
+        """
+        group_by = group_by or []
+        invalid = [column for column in group_by if column not in ROLLUP_DIMENSIONS]
+        if invalid:
+            raise ValueError(f"Columnas de agrupación no válidas: {invalid}")
+        
+        query = f"""
+            SELECT {''.join(column + ', ' for column in group_by)}
+                   COALESCE(SUM(total), 0) AS total,
+                   COALESCE(SUM(validos), 0) AS validos,
+                   COALESCE(SUM(total - validos), 0) AS invalidos,
+                   SUM(suma_confianza) / NULLIF(SUM(total), 0) AS confianza_media
+            FROM resumen_diario
+            WHERE fecha >= ?
+        """
+        params = [fecha_desde]
+        if fecha_hasta:
+            query += " AND fecha <= ?"
+            params.append(fecha_hasta)
+        if group_by:
+            query += f" GROUP BY {', '.join(group_by)} HAVING SUM(total) > 0 ORDER BY {', '.join(group_by)}"
+        
+        cursor = self.conn.execute(query, params)
+        return [dict(row) for row in cursor.fetchall()]
+    
+    def rebuild_rollups(self) -> Dict[str, int]:
+        """
+        Recalcula resumen_diario y resumen_sentimiento_diario desde el detalle
+        (resultados, gemini_analisis), p. ej. tras editar tablas a mano
+        
+        Returns:
+            Diccionario con las filas de cada tabla de agregados
+        """
+        counts = self.connections.write(self._rebuild_rollups)
+        logger.info(f"Agregados diarios recalculados: {counts}")
+        return counts
+    
+    @staticmethod
+    def _rebuild_rollups(cursor: sqlite3.Cursor) -> Dict[str, int]:
+        """Recalcula los agregados dentro de la transacción del hilo escritor"""
+        cursor.execute("DELETE FROM resumen_diario")
+        cursor.execute("""
+            INSERT INTO resumen_diario (fecha, codigo_clasificacion, cliente, fuente, total, validos, suma_confianza)
+            SELECT substr(r.fecha_analisis, 1, 10), r.codigo_clasificacion, COALESCE(b.cliente, ''),
+                   COALESCE(p.fuente, ''), COUNT(*), SUM(r.es_valido != 0), SUM(r.confianza)
+            FROM resultados r
+            JOIN pods p ON p.id = r.pod_id
+            LEFT JOIN busqueda_pods b ON b.rowid = r.id
+            GROUP BY 1, 2, 3, 4
+        """)
+        
+        cursor.execute("DELETE FROM resumen_sentimiento_diario")
+        cursor.execute("""
+            INSERT INTO resumen_sentimiento_diario (fecha, cliente, fuente, sentimiento, analisis)
+            SELECT substr(g.fecha_analisis, 1, 10), COALESCE(g.cliente, ''), COALESCE(p.fuente, ''),
+                   COALESCE(g.manuscritos_sentimiento, 'neutral'), COUNT(*)
+            FROM gemini_analisis g
+            JOIN pods p ON p.id = g.pod_id
+            GROUP BY 1, 2, 3, 4
+        """)
+        
+        counts = {}
+        for table in ('resumen_diario', 'resumen_sentimiento_diario'):
+            cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            counts[table] = cursor.fetchone()[0]
+        return counts
+    
     def search_pods(self, clasificacion: str = None, fecha_desde: str = None,
                    fecha_hasta: str = None, es_valido: bool = None,
                    limit: int = 100) -> List[Dict]:
@@ -340,6 +1295,39 @@ class PODDatabase:
         
         return results
     
+    def search_text(self, query: str, limit: int = 100) -> List[Dict]:
+        """
+        Busca PODs por texto en el índice de texto completo: nombre de archivo,
+        texto OCR de la página, anotaciones, cliente y transcripción de
+        manuscritos (sin distinguir mayúsculas ni acentos: 'danado' encuentra
+        'Dañado')
+        
+        Args:
+            query: Palabras buscadas (todas deben aparecer; la última como prefijo)
+            limit: Máximo de resultados
+            
+        Returns:
+            Resultados por relevancia con pod_id, resultado_id, pagina,
+            nombre_archivo, ruta_original, clasificación, cliente y 'fragmento'
+            (texto alrededor de la coincidencia, marcada con [ ])
+        """
+        match = fts_query(query)
+        if not match:
+            return []
+        
+        cursor = self.conn.execute("""
+            SELECT b.pod_id, b.rowid AS resultado_id, b.pagina, p.nombre_archivo, p.ruta_original,
+                   r.clasificacion, r.codigo_clasificacion, r.es_valido, r.fecha_analisis, b.cliente,
+                   snippet(busqueda_pods, -1, '[', ']', '…', 12) AS fragmento
+            FROM busqueda_pods b
+            JOIN resultados r ON r.id = b.rowid
+            JOIN pods p ON p.id = b.pod_id
+            WHERE busqueda_pods MATCH ?
+            ORDER BY b.rank
+            LIMIT ?
+        """, (match, limit))
+        return [dict(row) for row in cursor.fetchall()]
+    
     def pod_exists(self, nombre_archivo: str) -> bool:
         """
         Verifica si un POD ya fue procesado
@@ -365,12 +1353,262 @@ class PODDatabase:
         
         return [dict(row) for row in cursor.fetchall()]
     
+    def batch_writer(self, batch_size: int = None, flush_interval_ms: int = None) -> 'PODBatchWriter':
+        """
+        Escritor por lotes sobre esta base de datos
+        
+        Args:
+            batch_size: Resultados por transacción (por defecto database.batch_size)
+            flush_interval_ms: Espera máxima de un resultado (por defecto database.flush_interval_ms)
+            
+        Returns:
+            PODBatchWriter (usar con 'with' o llamar a close())
+        """
+        return PODBatchWriter(
+            self,
+            batch_size or self.config.get('batch_size', 100),
+            flush_interval_ms or self.config.get('flush_interval_ms', 500)
+        )
+    
     def close(self):
         """
-        Cierra la conexión a la base de datos
+        Cierra las conexiones a la base de datos (espera las escrituras en cola)
         """
-        if self.conn:
-            self.conn.close()
-            logger.info("Conexión a BD cerrada")
+        self.connections.close()
+        logger.info("Conexión a BD cerrada")
+
+
+
+
+class PODBatchWriter:
+    """
+    Acumula resultados y los guarda con PODDatabase.save_pod_results
+
+    Se escribe un lote cada batch_size resultados o, si llegan despacio, cuando
+    el más antiguo lleva flush_interval_ms esperando (un hilo de fondo lo
+    revisa). close() escribe lo pendiente.
+    """
+
+    def __init__(self, db: PODDatabase, batch_size: int = 100, flush_interval_ms: int = 500):
+        """
+        Args:
+            db: Base de datos destino
+            batch_size: Resultados por transacción
+            flush_interval_ms: Espera máxima de un resultado antes de escribirse
+        """
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.stats = {'results': 0, 'batches': 0, 'failed': 0}
+
+        self._pending: List[Dict[str, Any]] = []
+        self._oldest = 0.0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._timer_loop, daemon=True, name='pod-batch-writer')
+        self._thread.start()
+
+    def add(self, result: Dict[str, Any]) -> None:
+        """
+        Agrega un resultado al lote (se escribe al completarse el lote)
+
+        Args:
+            result: Resultado de clasificación
+        """
+        with self._lock:
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending.append(result)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self) -> List[int]:
+        """
+        Escribe los resultados pendientes en una transacción
+
+        Si la transacción falla, save_pod_results reintenta cada resultado por
+        separado; solo los que vuelven a fallar cuentan en stats['failed'].
+
+        Returns:
+            IDs de los PODs escritos (-1 en los que no se pudieron guardar)
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return []
+
+            pod_ids = self.db.save_pod_results(batch)
+            self.stats['batches'] += 1
+            self.stats['results'] += len(batch)
+            self.stats['failed'] += sum(1 for pod_id in pod_ids if pod_id == -1)
+            return pod_ids
+
+    def _timer_loop(self) -> None:
+        """Escribe el lote cuando su resultado más antiguo supera flush_interval"""
+        while not self._stop.wait(self.flush_interval / 4):
+            with self._lock:
+                due = bool(self._pending) and time.monotonic() - self._oldest >= self.flush_interval
+            if due:
+                self.flush()
+
+    def close(self) -> None:
+        """Detiene el hilo y escribe lo pendiente"""
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+
+    def __enter__(self) -> 'PODBatchWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def _benchmark_result(index: int) -> Dict[str, Any]:
+    """Resultado sintético con la forma de PODClassifier.classify_document"""
+    return {
+        'source_file': f"documentos/entrada/bench_{index:07d}.pdf",
+        'page_number': 1,
+        'classification': 'OK',
+        'classification_code': 'OK',
+        'is_valid': True,
+        'confidence': 0.95,
+        'document_info': {'size_mb': 0.4, 'extension': '.pdf'},
+        'details': {
+            'signatures': [{'confidence': 0.8}],
+            'stamps': [],
+            'annotations': {'annotation_count': 0, 'sentiment': 'neutral'},
+            'legibility': {'fields_detected': ['factura', 'cliente'], 'ocr_confidence': 82.0},
+            'cheap_features': {'ink_ratio': 0.04, 'edge_density': 0.11}
+        }
+    }
+
+
+def benchmark_writes(rows: int = 2000, batch_size: int = 100, directory: str = None) -> Dict[str, Any]:
+    """
+    Compara la escritura fila por fila (journal por defecto, commit por
+    resultado) con WAL y lotes
+
+    Args:
+        rows: Resultados a escribir en cada modo
+        batch_size: Resultados por transacción en el modo por lotes
+        directory: Carpeta para las bases temporales (por defecto, una temporal)
+
+    Returns:
+        Diccionario con resultados/s de cada modo y la mejora
+    """
+    import tempfile
+
+    directory = directory or tempfile.mkdtemp(prefix='pods_bench_')
+    report = {'rows': rows, 'batch_size': batch_size}
+
+    modes = {
+        'row_by_row': {'wal': False, 'synchronous': 'FULL'},
+        'wal_batched': {'wal': True, 'synchronous': 'NORMAL'}
+    }
+    for mode, config in modes.items():
+        path = os.path.join(directory, f"{mode}.db")
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+        # Sin WAL el archivo nuevo queda con el journal por defecto (DELETE)
+        db = PODDatabase(path, config={**config, 'batch_size': batch_size})
+        start = time.perf_counter()
+        if mode == 'row_by_row':
+            for index in range(rows):
+                db.save_pod_result(_benchmark_result(index))
+        else:
+            with db.batch_writer() as writer:
+                for index in range(rows):
+                    writer.add(_benchmark_result(index))
+        elapsed = time.perf_counter() - start
+        db.close()
+        report[f"{mode}_rows_per_second"] = round(rows / elapsed, 1)
+
+    report['speedup'] = round(report['wal_batched_rows_per_second'] / report['row_by_row_rows_per_second'], 1)
+    return report
+
+
+def benchmark_concurrent_reads(rows: int = 2000, readers: int = 4, batch_size: int = 100,
+                               directory: str = None) -> Dict[str, Any]:
+    """
+    Escribe resultados por lotes mientras varios hilos consultan estadísticas
+    y búsquedas (como la interfaz web y las analíticas durante un proceso)
+
+    Args:
+        rows: Resultados a escribir
+        readers: Hilos lectores simultáneos
+        batch_size: Resultados por transacción
+        directory: Carpeta para la base temporal (por defecto, una temporal)
+
+    Returns:
+        Diccionario con resultados escritos/s y consultas/s durante la escritura
+    """
+    import tempfile
+
+    directory = directory or tempfile.mkdtemp(prefix='pods_bench_')
+    path = os.path.join(directory, 'concurrent.db')
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    db = PODDatabase(path, config={'batch_size': batch_size})
+    done = threading.Event()
+    reads = [0] * readers
+
+    def read_loop(slot: int) -> None:
+        while not done.is_set():
+            db.get_statistics()
+            db.search_pods(clasificacion='OK', limit=20)
+            reads[slot] += 1
+
+    threads = [threading.Thread(target=read_loop, args=(slot,), daemon=True) for slot in range(readers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    with db.batch_writer() as writer:
+        for index in range(rows):
+            writer.add(_benchmark_result(index))
+    elapsed = time.perf_counter() - start
+    done.set()
+    for thread in threads:
+        thread.join()
+    db.close()
+
+    return {
+        'rows': rows,
+        'readers': readers,
+        'rows_per_second': round(rows / elapsed, 1),
+        'reads_per_second': round(sum(reads) / elapsed, 1)
+    }
+
+
+def main():
+    """Prueba de rendimiento de escritura y mantenimiento de los agregados"""
+    parser = argparse.ArgumentParser(description='Rendimiento de escritura de PODDatabase')
+    parser.add_argument('--rows', type=int, default=2000, help='Resultados a escribir en cada modo')
+    parser.add_argument('--batch-size', type=int, default=100, help='Resultados por transacción')
+    parser.add_argument('--readers', type=int, default=0,
+                        help='Hilos que consultan mientras se escribe (0 = comparar modos de escritura)')
+    parser.add_argument('--dir', type=str, help='Carpeta para las bases temporales')
+    parser.add_argument('--rebuild-rollups', metavar='DB', nargs='?', const='database/pods.db',
+                        help='Recalcular los agregados diarios de la base indicada y salir')
+    args = parser.parse_args()
+
+    if args.rebuild_rollups:
+        db = PODDatabase(args.rebuild_rollups)
+        report = db.rebuild_rollups()
+        db.close()
+    elif args.readers:
+        report = benchmark_concurrent_reads(args.rows, args.readers, args.batch_size, args.dir)
+    else:
+        report = benchmark_writes(args.rows, args.batch_size, args.dir)
+    print(json.dumps(report, indent=2))
 
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Planificador de Detectores
+Ejecuta los detectores de una página en paralelo respetando sus dependencias
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, List, Callable, Tuple
+from loguru import logger
+
+
+class DetectorTask:
+    """
+    Tarea del grafo de detectores
+
+    Cada tarea declara las entradas que necesita (planos de la página o
+    resultados de otras tareas) y se ejecuta en cuanto todas están listas.
+    """
+
+    def __init__(self, name: str, func: Callable[..., Any], inputs: List[str] = None):
+        """
+        Args:
+            name: Nombre de la tarea (clave de su resultado)
+            func: Función que recibe las entradas en el orden declarado
+            inputs: Nombres de las entradas requeridas
+        """
+        self.name = name
+        self.func = func
+        self.inputs = inputs or []
+
+
+class DetectorScheduler:
+    """
+    Planificador de tareas con dependencias sobre un pool de hilos
+
+    La mayor parte del tiempo de los detectores está en llamadas a OpenCV y
+    Tesseract que liberan el GIL, por lo que los hilos se solapan de verdad.
+    """
+
+    def __init__(self, max_workers: int = 4, parallel: bool = True):
+        """
+        Args:
+            max_workers: Hilos del pool
+            parallel: Si es False, las tareas se ejecutan en orden topológico en el hilo actual
+        """
+        self.max_workers = max_workers
+        self.parallel = parallel and max_workers > 1
+        self._executor = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Crea el pool de hilos una sola vez y lo reutiliza entre páginas"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix='detector')
+        return self._executor
+
+    def _validate(self, tasks: List[DetectorTask], inputs: Dict[str, Any]) -> None:
+        """
+        Verifica que todas las entradas existan y que no haya ciclos
+
+        Raises:
+            ValueError: Si una entrada no existe o el grafo tiene ciclos
+        """
+        names = {task.name for task in tasks}
+        for task in tasks:
+            for required in task.inputs:
+                if required not in inputs and required not in names:
+                    raise ValueError(f"Entrada desconocida '{required}' en tarea '{task.name}'")
+
+        available = set(inputs)
+        pending = list(tasks)
+        while pending:
+            ready = [t for t in pending if all(i in available for i in t.inputs)]
+            if not ready:
+                raise ValueError(f"Dependencias circulares: {[t.name for t in pending]}")
+            available.update(t.name for t in ready)
+            pending = [t for t in pending if t not in ready]
+
+    @staticmethod
+    def _run_task(task: DetectorTask, values: Dict[str, Any], timings: Dict[str, float]) -> Any:
+        """Ejecuta una tarea midiendo su duración (en los tiempos de su ejecución)"""
+        start = time.perf_counter()
+        try:
+            return task.func(*[values[name] for name in task.inputs])
+        finally:
+            timings[task.name] = round(time.perf_counter() - start, 4)
+
+    def run(self, tasks: List[DetectorTask], inputs: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, float]]:
+        """
+        Ejecuta el grafo de tareas
+
+        El planificador se comparte entre páginas que se clasifican a la vez
+        (cola de Gemini, servicio), así que los tiempos se devuelven con los
+        resultados de cada ejecución en lugar de guardarse en la instancia.
+
+        Args:
+            tasks: Tareas a ejecutar
+            inputs: Entradas iniciales disponibles (planos de la página, zonas, etc.)
+
+        Returns:
+            Tupla ({nombre_tarea: resultado}, {nombre_tarea: segundos})
+        """
+        self._validate(tasks, inputs)
+        timings: Dict[str, float] = {}
+
+        values = dict(inputs)
+        results = {}
+        pending = list(tasks)
+
+        if not self.parallel:
+            while pending:
+                task = next(t for t in pending if all(i in values for i in t.inputs))
+                values[task.name] = results[task.name] = self._run_task(task, values, timings)
+                pending.remove(task)
+            return results, timings
+
+        executor = self._get_executor()
+        running = {}
+
+        while pending or running:
+            # Lanzar todas las tareas cuyas entradas ya están listas
+            for task in [t for t in pending if all(i in values for i in t.inputs)]:
+                running[executor.submit(self._run_task, task, values, timings)] = task
+                pending.remove(task)
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                try:
+                    values[task.name] = results[task.name] = future.result()
+                except Exception:
+                    for other in running:
+                        other.cancel()
+                    logger.error(f"Error en detector '{task.name}'")
+                    raise
+
+        logger.debug(f"Tiempos de detectores: {timings}")
+        return results, timings
+
+    def shutdown(self) -> None:
+        """Libera el pool de hilos"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
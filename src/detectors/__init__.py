@@ -7,11 +7,17 @@ from .signature_detector import SignatureDetector
 from .stamp_detector import StampDetector
 from .legibility_analyzer import LegibilityAnalyzer
 from .annotation_detector import AnnotationDetector
+from .keyword_matcher import KeywordMatcher, get_keyword_matcher
+from .ocr_cache import OCRCache, get_ocr_cache
 
 __all__ = [
     'SignatureDetector',
     'StampDetector',
     'LegibilityAnalyzer',
-    'AnnotationDetector'
+    'AnnotationDetector',
+    'KeywordMatcher',
+    'get_keyword_matcher',
+    'OCRCache',
+    'get_ocr_cache'
 ]
 
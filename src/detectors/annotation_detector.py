@@ -7,10 +7,13 @@ Identifica anotaciones manuscritas y determina si son positivas o negativas
 import cv2
 import numpy as np
 import pytesseract
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple, Union
 from loguru import logger
 import os
 
+from .page_ocr import LazyPageOCR, resolve_ocr_data, printed_word_boxes
+from .keyword_matcher import get_keyword_matcher
+
 # Configurar ruta de Tesseract si está en la ubicación estándar
 if os.path.exists(r"C:\Program Files\Tesseract-OCR\tesseract.exe"):
     pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
@@ -31,16 +34,22 @@ class AnnotationDetector:
         self.config = config
         self.positive_keywords = [k.lower() for k in config['annotation_keywords']['positive']]
         self.negative_keywords = [k.lower() for k in config['annotation_keywords']['negative']]
+        self.keyword_matcher = get_keyword_matcher(config)
         self.handwriting_confidence = config['thresholds']['handwriting_confidence']
+        self.exclude_printed_text = config['thresholds'].get('exclude_printed_text', True)
+        self.printed_word_confidence = config['thresholds'].get('printed_word_confidence', 80)
         
         logger.info("Detector de anotaciones inicializado")
     
-    def detect_annotations(self, image: np.ndarray) -> Dict[str, Any]:
+    def detect_annotations(self, image: np.ndarray,
+                           ocr_data: Union[Dict[str, List], LazyPageOCR, None] = None) -> Dict[str, Any]:
         """
         Detecta anotaciones manuscritas en el documento
         
         Args:
             image: Imagen del documento
+            ocr_data: Resultado opcional de OCR por palabra de la página o un
+                      LazyPageOCR compartido (se calcula aquí si no se proporciona)
             
         Returns:
             Diccionario con información sobre las anotaciones
@@ -50,11 +59,19 @@ class AnnotationDetector:
             'annotation_count': 0,
             'annotations': [],
             'sentiment': 'neutral',  # 'positive', 'negative', 'neutral'
-            'text_content': []
+            'text_content': [],
+            'printed_words_excluded': 0
         }
         
-        # 1. Detectar áreas con escritura manuscrita
-        handwriting_regions = self._detect_handwriting_regions(image)
+        # 1. Localizar texto impreso ya reconocido para excluirlo de las propuestas
+        printed_boxes = []
+        if self.exclude_printed_text:
+            ocr_data = resolve_ocr_data(ocr_data, image, self.config)
+            printed_boxes = printed_word_boxes(ocr_data, self.printed_word_confidence)
+            results['printed_words_excluded'] = len(printed_boxes)
+        
+        # 2. Detectar áreas con escritura manuscrita
+        handwriting_regions = self._detect_handwriting_regions(image, printed_boxes)
         
         if not handwriting_regions:
             logger.info("No se detectaron anotaciones manuscritas")
@@ -63,7 +80,7 @@ class AnnotationDetector:
         results['has_annotations'] = True
         results['annotation_count'] = len(handwriting_regions)
         
-        # 2. Analizar cada región para extraer texto
+        # 3. Analizar cada región para extraer texto
         for idx, region in enumerate(handwriting_regions):
             x, y, w, h = region['bbox']
             roi = image[y:y+h, x:x+w]
@@ -75,18 +92,23 @@ class AnnotationDetector:
                 'id': idx,
                 'bbox': region['bbox'],
                 'text': text,
-                'sentiment': 'neutral'
+                'sentiment': 'neutral',
+                'keywords': []
             }
             
             # Analizar sentimiento del texto
             if text:
                 sentiment = self._analyze_sentiment(text)
                 annotation['sentiment'] = sentiment
+                annotation['keywords'] = [
+                    match for match in self.keyword_matcher.find_all(text)
+                    if match['category'].startswith('annotation.')
+                ]
                 results['text_content'].append(text)
             
             results['annotations'].append(annotation)
         
-        # 3. Determinar sentimiento general
+        # 4. Determinar sentimiento general
         results['sentiment'] = self._determine_overall_sentiment(results['annotations'])
         
         logger.info(f"Detectadas {results['annotation_count']} anotación(es) - "
@@ -94,12 +116,15 @@ class AnnotationDetector:
         
         return results
     
-    def _detect_handwriting_regions(self, image: np.ndarray) -> List[Dict[str, Any]]:
+    def _detect_handwriting_regions(self, image: np.ndarray,
+                                    printed_boxes: List[Tuple[int, int, int, int]] = None
+                                    ) -> List[Dict[str, Any]]:
         """
         Detecta regiones con escritura manuscrita
         
         Args:
             image: Imagen del documento
+            printed_boxes: Cajas (x, y, w, h) de palabras impresas a excluir
             
         Returns:
             Lista de regiones con escritura manuscrita
@@ -118,6 +143,11 @@ class AnnotationDetector:
             cv2.THRESH_BINARY_INV, 15, 10
         )
         
+        # Eliminar la tinta de palabras impresas reconocidas con alta confianza,
+        # así solo la tinta no reconocida llega a proponerse como manuscrita
+        if printed_boxes:
+            binary = self._subtract_printed_words(binary, printed_boxes)
+        
         # Operaciones morfológicas para conectar trazos de escritura
         kernel_horizontal = cv2.getStructuringElement(cv2.MORPH_RECT, (20, 1))
         kernel_vertical = cv2.getStructuringElement(cv2.MORPH_RECT, (1, 20))
@@ -163,6 +193,31 @@ class AnnotationDetector:
         
         return regions
     
+    def _subtract_printed_words(self, binary: np.ndarray,
+                                printed_boxes: List[Tuple[int, int, int, int]]) -> np.ndarray:
+        """
+        Borra de la imagen binaria la tinta cubierta por palabras impresas
+        
+        Args:
+            binary: Imagen binaria (tinta = 255)
+            printed_boxes: Cajas (x, y, w, h) de palabras impresas
+            
+        Returns:
+            Imagen binaria sin el texto impreso
+        """
+        mask = np.zeros_like(binary)
+        padding = 2  # Cubrir el antialiasing alrededor de cada palabra
+        h_img, w_img = binary.shape[:2]
+        
+        for x, y, w, h in printed_boxes:
+            x1 = max(0, x - padding)
+            y1 = max(0, y - padding)
+            x2 = min(w_img, x + w + padding)
+            y2 = min(h_img, y + h + padding)
+            mask[y1:y2, x1:x2] = 255
+        
+        return cv2.bitwise_and(binary, cv2.bitwise_not(mask))
+    
     def _extract_handwritten_text(self, roi: np.ndarray) -> str:
         """
         Extrae texto de una región con escritura manuscrita
@@ -186,11 +241,9 @@ class AnnotationDetector:
             
             # OCR con configuración para escritura manuscrita
             config = '--psm 6 --oem 3'
-            text = pytesseract.image_to_string(
-                binary,
-                lang=self.config['ocr']['language'],
-                config=config
-            )
+            language = self.config['ocr']['language']
+            # Sin caché: el texto manuscrito cambia de un POD a otro
+            text = pytesseract.image_to_string(binary, lang=language, config=config)
             
             return text.strip().lower()
             
@@ -208,13 +261,10 @@ class AnnotationDetector:
         Returns:
             'positive', 'negative', o 'neutral'
         """
-        text_lower = text.lower()
-        
-        # Buscar palabras clave positivas
-        positive_count = sum(1 for keyword in self.positive_keywords if keyword in text_lower)
-        
-        # Buscar palabras clave negativas
-        negative_count = sum(1 for keyword in self.negative_keywords if keyword in text_lower)
+        # Buscar palabras clave (exactas y con errores de OCR) en una sola pasada
+        found = self.keyword_matcher.categories_found(text)
+        positive_count = len(found.get('annotation.positive', []))
+        negative_count = len(found.get('annotation.negative', []))
         
         if positive_count > negative_count:
             return 'positive'
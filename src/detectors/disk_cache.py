@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+Caché en Disco
+Almacén clave-valor persistente (SQLite) con desalojo LRU y métricas de aciertos
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Dict, Any, Optional, Tuple
+from loguru import logger
+
+
+def _json_default(value: Any) -> Any:
+    """Convierte tipos de numpy (y otros no serializables) a tipos de Python"""
+    if hasattr(value, 'item'):
+        return value.item()
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return str(value)
+
+
+class DiskLRUCache:
+    """
+    Caché persistente con desalojo por uso menos reciente
+
+    Los valores se guardan como JSON. Una sola conexión por instancia,
+    protegida por un candado, de modo que puede compartirse entre hilos.
+    Opcionalmente las entradas caducan ttl_seconds después de guardarse.
+
+    Los accesos (ultimo_acceso, aciertos) se acumulan en memoria y se escriben
+    en lote: un acierto no hace una escritura a disco.
+    """
+
+    def __init__(self, path: str, max_entries: int = 50000, table: str = 'cache',
+                 ttl_seconds: Optional[float] = None, access_flush_size: int = 100,
+                 access_flush_interval: float = 30.0):
+        """
+        Abre (o crea) la caché
+
+        Args:
+            path: Ruta del archivo SQLite
+            max_entries: Entradas máximas antes de desalojar las menos usadas
+            table: Nombre de la tabla (permite varias cachés en un mismo archivo)
+            ttl_seconds: Vida de cada entrada (None = sin caducidad)
+            access_flush_size: Accesos pendientes que fuerzan su escritura
+            access_flush_interval: Segundos máximos entre escrituras de accesos
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.access_flush_size = access_flush_size
+        self.access_flush_interval = access_flush_interval
+        self._lock = threading.Lock()
+
+        # Accesos pendientes de escribir: clave -> (último acceso, aciertos)
+        self._pending_access: Dict[str, Tuple[float, int]] = {}
+        self._last_access_flush = time.monotonic()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                clave TEXT PRIMARY KEY,
+                valor TEXT NOT NULL,
+                creado REAL NOT NULL,
+                ultimo_acceso REAL NOT NULL,
+                aciertos INTEGER DEFAULT 0
+            )
+        """)
+        self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_acceso ON {table}(ultimo_acceso)")
+        self.conn.commit()
+        self._entries = self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Obtiene un valor y lo marca como usado recientemente
+
+        Args:
+            key: Clave
+
+        Returns:
+            Valor almacenado o None si no existe
+        """
+        with self._lock:
+            row = self.conn.execute(
+                f"SELECT valor, creado FROM {self.table} WHERE clave = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            now = time.time()
+            if self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                self.conn.execute(f"DELETE FROM {self.table} WHERE clave = ?", (key,))
+                self.conn.commit()
+                self._entries -= 1
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            _, pending_hits = self._pending_access.get(key, (now, 0))
+            self._pending_access[key] = (now, pending_hits + 1)
+            if (len(self._pending_access) >= self.access_flush_size or
+                    time.monotonic() - self._last_access_flush >= self.access_flush_interval):
+                self._flush_access()
+                self.conn.commit()
+
+        return json.loads(row[0])
+
+    def _flush_access(self) -> None:
+        """Escribe los accesos pendientes (sin confirmar la transacción)"""
+        if self._pending_access:
+            self.conn.executemany(
+                f"UPDATE {self.table} SET ultimo_acceso = MAX(ultimo_acceso, ?), "
+                f"aciertos = aciertos + ? WHERE clave = ?",
+                [(accessed, hits, key) for key, (accessed, hits) in self._pending_access.items()]
+            )
+            self._pending_access.clear()
+        self._last_access_flush = time.monotonic()
+
+    def set(self, key: str, value: Any) -> None:
+        """
+        Guarda un valor (reemplaza el existente)
+
+        Args:
+            key: Clave
+            value: Valor serializable a JSON
+        """
+        now = time.time()
+        payload = json.dumps(value, ensure_ascii=False, default=_json_default)
+
+        with self._lock:
+            cursor = self.conn.execute(
+                f"INSERT OR IGNORE INTO {self.table} (clave, valor, creado, ultimo_acceso) VALUES (?, ?, ?, ?)",
+                (key, payload, now, now)
+            )
+            if cursor.rowcount:
+                self._entries += 1
+            else:
+                self.conn.execute(
+                    f"UPDATE {self.table} SET valor = ?, creado = ?, ultimo_acceso = ? WHERE clave = ?",
+                    (payload, now, now, key)
+                )
+
+            # Los accesos pendientes viajan en la misma transacción (y el
+            # desalojo necesita ultimo_acceso al día)
+            self._flush_access()
+            if self._entries > self.max_entries:
+                self._evict()
+
+            self.conn.commit()
+
+    def _evict(self) -> None:
+        """Desaloja las entradas menos usadas hasta quedar al 90% de la capacidad"""
+        excess = self._entries - int(self.max_entries * 0.9)
+        cursor = self.conn.execute(f"""
+            DELETE FROM {self.table} WHERE clave IN (
+                SELECT clave FROM {self.table} ORDER BY ultimo_acceso ASC LIMIT ?
+            )
+        """, (excess,))
+        self._entries -= cursor.rowcount
+        self.evictions += cursor.rowcount
+        logger.debug(f"Caché {self.table}: {cursor.rowcount} entradas desalojadas")
+
+    def clear(self) -> None:
+        """Elimina todas las entradas"""
+        with self._lock:
+            self.conn.execute(f"DELETE FROM {self.table}")
+            self.conn.commit()
+            self._pending_access.clear()
+            self._entries = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Métricas de la caché en este proceso
+
+        Returns:
+            Diccionario con 'entries', 'hits', 'misses', 'hit_rate', 'evictions' y 'expirations'
+        """
+        lookups = self.hits + self.misses
+        return {
+            'entries': self._entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
+
+    def reopen(self) -> None:
+        """
+        Abre una conexión nueva (en un proceso hijo tras fork)
+
+        Las conexiones SQLite no deben usarse a través de fork(); la heredada
+        se abandona sin cerrarla para no tocar los bloqueos del proceso padre.
+        """
+        self._lock = threading.Lock()
+        self._pending_access = {}
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+
+    def close(self) -> None:
+        """Escribe los accesos pendientes y cierra la conexión"""
+        with self._lock:
+            self._flush_access()
+            self.conn.commit()
+            self.conn.close()
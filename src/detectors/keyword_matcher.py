@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+"""
+Motor de Palabras Clave
+Búsqueda multi-patrón (Aho-Corasick) en una sola pasada, tolerante a errores de OCR
+"""
+
+import re
+import unicodedata
+from collections import deque
+from typing import Dict, Any, List, Iterable, Tuple
+from loguru import logger
+
+
+# Palabras clave alternativas para cada campo requerido
+FIELD_KEYWORDS = {
+    'factura': ['factura', 'fact', 'invoice', 'no.', 'núm', 'numero'],
+    'cliente': ['cliente', 'client', 'razón social', 'razon social'],
+    'pedido': ['pedido', 'orden', 'order', 'o.c.', 'oc'],
+    'producto': ['producto', 'material', 'descripción', 'articulo', 'artículo'],
+    'firma': ['firma', 'recibí', 'recibi', 'nombre', 'autoriza']
+}
+
+# Confusiones típicas de OCR (dígito/símbolo leído en lugar de letra)
+OCR_CONFUSIONS = str.maketrans({
+    '0': 'o',
+    '1': 'i',
+    '3': 'e',
+    '4': 'a',
+    '5': 's',
+    '7': 't',
+    '8': 'b',
+    '@': 'a',
+    '$': 's',
+    '|': 'l',
+})
+
+# Letras que el OCR confunde entre sí (se comparan como la misma)
+OCR_LETTER_CONFUSIONS = str.maketrans({
+    'l': 'i',
+})
+
+# Categorías cuyas coincidencias aproximadas solo admiten confusiones de OCR
+# ('f1rma', 'recib1'), no ediciones libres: 'forma' o 'firme' no son 'firma'
+# y un campo falso inflaría el conteo de campos de legibilidad
+OCR_ONLY_PREFIXES = ('field.',)
+
+_TOKEN_PATTERN = re.compile(r'[\w@$|]+')
+
+# Cache de motores compilados por configuración
+_MATCHER_CACHE: Dict[Tuple, 'KeywordMatcher'] = {}
+
+
+def _fold_char(char: str) -> str:
+    """Convierte un carácter a minúscula sin acento, conservando la longitud"""
+    folded = unicodedata.normalize('NFD', char.lower())[:1]
+    return folded if folded else char
+
+
+def fold_text(text: str) -> str:
+    """
+    Normaliza un texto a minúsculas y sin acentos carácter por carácter,
+    de modo que las posiciones coinciden con las del texto original
+
+    Args:
+        text: Texto original
+
+    Returns:
+        Texto normalizado de la misma longitud
+    """
+    return ''.join(_fold_char(c) for c in text)
+
+
+def ocr_equivalent(candidate: str, keyword: str) -> bool:
+    """
+    Indica si dos textos normalizados solo difieren en confusiones de OCR
+
+    Args:
+        candidate: Texto leído (ya normalizado con fold_text)
+        keyword: Palabra clave normalizada
+
+    Returns:
+        True si coinciden al unificar dígitos/símbolos y letras confundibles
+    """
+    if len(candidate) != len(keyword):
+        return False
+    unify = lambda value: value.translate(OCR_CONFUSIONS).translate(OCR_LETTER_CONFUSIONS)
+    return unify(candidate) == unify(keyword)
+
+
+def bounded_edit_distance(a: str, b: str, max_distance: int) -> int:
+    """
+    Distancia de Levenshtein acotada
+
+    Args:
+        a: Primer texto
+        b: Segundo texto
+        max_distance: Distancia máxima de interés
+
+    Returns:
+        Distancia de edición, o max_distance + 1 si la supera
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j, char_b in enumerate(b, 1):
+            cost = 0 if char_a == char_b else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            row_min = min(row_min, current[j])
+        if row_min > max_distance:
+            return max_distance + 1
+        previous = current
+
+    return previous[-1] if previous[-1] <= max_distance else max_distance + 1
+
+
+class KeywordMatcher:
+    """
+    Buscador compilado de múltiples palabras clave agrupadas por categoría
+
+    Las coincidencias exactas se encuentran con un autómata Aho-Corasick en una
+    sola pasada sobre el texto; las palabras con errores de OCR ("rec1bido",
+    "DEAC3RO") se recuperan comparando cada token con distancia de edición acotada;
+    en los alias de campos ('field.*') solo se aceptan confusiones de OCR.
+    """
+
+    def __init__(self, patterns: Dict[str, Iterable[str]], max_distance: int = 1,
+                 min_fuzzy_length: int = 5):
+        """
+        Compila el autómata de búsqueda
+
+        Args:
+            patterns: Diccionario categoría -> lista de palabras clave
+            max_distance: Distancia de edición máxima para coincidencias aproximadas
+            min_fuzzy_length: Longitud mínima de palabra clave para buscarla de forma aproximada
+        """
+        self.max_distance = max_distance
+        self.min_fuzzy_length = min_fuzzy_length
+
+        # keyword normalizada -> lista de (categoría, keyword original)
+        self._keywords: Dict[str, List[Tuple[str, str]]] = {}
+        for category, keywords in patterns.items():
+            for keyword in keywords:
+                normalized = fold_text(keyword.strip())
+                if not normalized:
+                    continue
+                entries = self._keywords.setdefault(normalized, [])
+                # Variantes que se normalizan igual ('razón'/'razon') se registran una vez
+                if category not in [c for c, _ in entries]:
+                    entries.append((category, keyword))
+
+        self._build_automaton()
+
+        # Palabras clave candidatas a coincidencia aproximada, agrupadas por nº de palabras
+        self._fuzzy_keywords: Dict[int, List[str]] = {}
+        for normalized in self._keywords:
+            if len(normalized.replace(' ', '')) >= self.min_fuzzy_length:
+                self._fuzzy_keywords.setdefault(len(normalized.split()), []).append(normalized)
+
+        logger.debug(f"Motor de palabras clave compilado: {len(self._keywords)} patrones")
+
+    def _build_automaton(self):
+        """Construye el trie con enlaces de fallo (Aho-Corasick)"""
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[str]] = [[]]
+
+        for keyword in self._keywords:
+            state = 0
+            for char in keyword:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._output[state].append(keyword)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find_all(self, text: str, fuzzy: bool = True) -> List[Dict[str, Any]]:
+        """
+        Busca todas las palabras clave en el texto
+
+        Args:
+            text: Texto donde buscar
+            fuzzy: Si se deben incluir coincidencias aproximadas (errores de OCR)
+
+        Returns:
+            Lista de coincidencias con 'category', 'keyword', 'start', 'end',
+            'text' (fragmento original) y 'distance' (0 = exacta)
+        """
+        if not text:
+            return []
+
+        folded = fold_text(text)
+        matches = []
+        covered = set()
+
+        # 1. Coincidencias exactas en una sola pasada
+        state = 0
+        for pos, char in enumerate(folded):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for keyword in self._output[state]:
+                start = pos - len(keyword) + 1
+                covered.add((keyword, start))
+                for category, original in self._keywords[keyword]:
+                    matches.append({
+                        'category': category,
+                        'keyword': original,
+                        'start': start,
+                        'end': pos + 1,
+                        'text': text[start:pos + 1],
+                        'distance': 0
+                    })
+
+        # 2. Coincidencias aproximadas por token (errores de OCR)
+        if fuzzy and self.max_distance > 0 and self._fuzzy_keywords:
+            matches.extend(self._find_fuzzy(text, folded, covered))
+
+        matches.sort(key=lambda m: (m['start'], m['end']))
+        return matches
+
+    def _find_fuzzy(self, text: str, folded: str,
+                    covered: set) -> List[Dict[str, Any]]:
+        """
+        Compara ventanas de tokens contra las palabras clave con distancia acotada
+
+        Args:
+            text: Texto original
+            folded: Texto normalizado
+            covered: Coincidencias exactas ya encontradas (keyword, inicio)
+
+        Returns:
+            Lista de coincidencias aproximadas
+        """
+        matches = []
+        tokens = [(m.start(), m.end()) for m in _TOKEN_PATTERN.finditer(folded)]
+
+        for word_count, keywords in self._fuzzy_keywords.items():
+            for idx in range(len(tokens) - word_count + 1):
+                start = tokens[idx][0]
+                end = tokens[idx + word_count - 1][1]
+                candidate = ' '.join(
+                    folded[s:e] for s, e in tokens[idx:idx + word_count]
+                ).translate(OCR_CONFUSIONS)
+
+                for keyword in keywords:
+                    if (keyword, start) in covered:
+                        continue
+                    distance = bounded_edit_distance(candidate, keyword, self.max_distance)
+                    if distance > self.max_distance:
+                        continue
+                    # Una coincidencia exacta dentro del token ya se reportó
+                    if distance == 0 and folded[start:end] == keyword:
+                        continue
+                    ocr_only_match = None
+                    for category, original in self._keywords[keyword]:
+                        if category.startswith(OCR_ONLY_PREFIXES):
+                            if ocr_only_match is None:
+                                ocr_only_match = ocr_equivalent(candidate, keyword)
+                            if not ocr_only_match:
+                                continue
+                        matches.append({
+                            'category': category,
+                            'keyword': original,
+                            'start': start,
+                            'end': end,
+                            'text': text[start:end],
+                            'distance': distance
+                        })
+
+        return matches
+
+    def categories_found(self, text: str, fuzzy: bool = True) -> Dict[str, List[str]]:
+        """
+        Agrupa las palabras clave encontradas por categoría
+
+        Args:
+            text: Texto donde buscar
+            fuzzy: Si se deben incluir coincidencias aproximadas
+
+        Returns:
+            Diccionario categoría -> lista de palabras clave distintas encontradas
+        """
+        found: Dict[str, List[str]] = {}
+        for match in self.find_all(text, fuzzy):
+            keywords = found.setdefault(match['category'], [])
+            if match['keyword'] not in keywords:
+                keywords.append(match['keyword'])
+        return found
+
+
+def get_keyword_matcher(config: Dict[str, Any]) -> KeywordMatcher:
+    """
+    Obtiene el motor compartido de palabras clave para la configuración dada
+
+    Incluye las categorías 'annotation.positive', 'annotation.negative',
+    'field.<campo>' (con sus alias) e 'invalid_stamp'. El motor se compila una
+    sola vez por configuración y se reutiliza entre detectores.
+
+    Args:
+        config: Diccionario de configuración
+
+    Returns:
+        Motor de palabras clave compilado
+    """
+    patterns = {
+        'annotation.positive': config['annotation_keywords']['positive'],
+        'annotation.negative': config['annotation_keywords']['negative'],
+        'invalid_stamp': config['invalid_stamps'],
+    }
+    for field in config['required_fields']:
+        patterns[f'field.{field}'] = FIELD_KEYWORDS.get(field, [field])
+
+    matching = config.get('keyword_matching', {})
+    max_distance = matching.get('max_edit_distance', 1)
+    min_fuzzy_length = matching.get('min_fuzzy_length', 5)
+
+    key = (
+        tuple((category, tuple(k.lower() for k in keywords))
+              for category, keywords in sorted(patterns.items())),
+        max_distance,
+        min_fuzzy_length
+    )
+    if key not in _MATCHER_CACHE:
+        _MATCHER_CACHE[key] = KeywordMatcher(patterns, max_distance, min_fuzzy_length)
+
+    return _MATCHER_CACHE[key]
@@ -7,10 +7,13 @@ Determina si un documento POD es legible analizando campos clave
 import cv2
 import numpy as np
 import pytesseract
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Optional, Tuple, Union
 from loguru import logger
 import os
 
+from .keyword_matcher import get_keyword_matcher
+from .page_ocr import LazyPageOCR, resolve_ocr_data, text_from_ocr_data, words_in_box
+
 # Configurar ruta de Tesseract si está en la ubicación estándar
 if os.path.exists(r"C:\Program Files\Tesseract-OCR\tesseract.exe"):
     pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
@@ -34,15 +37,24 @@ class LegibilityAnalyzer:
         self.min_fields_detected = config['thresholds']['min_fields_detected']
         self.blur_threshold = config['thresholds']['blur_threshold']
         self.min_confidence = config['ocr']['min_confidence']
+        self.keyword_matcher = get_keyword_matcher(config)
+        
+        # Modo por regiones: leer primero encabezado/campos y detenerse si bastan
+        legibility_config = config.get('legibility', {})
+        self.region_first = legibility_config.get('region_first', False)
+        self.field_regions = legibility_config.get('field_regions', {})
         
         logger.info("Analizador de legibilidad inicializado")
     
-    def analyze_legibility(self, page_data: Dict[str, Any]) -> Dict[str, Any]:
+    def analyze_legibility(self, page_data: Dict[str, Any],
+                          ocr_data: Union[Dict[str, List], LazyPageOCR, None] = None) -> Dict[str, Any]:
         """
         Analiza la legibilidad de un documento
         
         Args:
             page_data: Datos de la página procesada
+            ocr_data: Resultado opcional de OCR por palabra de la página completa,
+                      o un LazyPageOCR compartido con otros detectores
             
         Returns:
             Diccionario con resultados del análisis de legibilidad
@@ -55,6 +67,10 @@ class LegibilityAnalyzer:
             'fields_missing': [],
             'text_quality': 0.0,
             'ocr_confidence': 0.0,
+            'text': '',
+            'template': None,
+            'ocr_mode': 'full_page',
+            'regions_read': [],
             'issues': []
         }
         
@@ -64,11 +80,62 @@ class LegibilityAnalyzer:
             results['issues'].append(f"Imagen borrosa (score: {page_data['blur_score']:.1f})")
         
         # 2. Extraer y analizar texto
-        text_data = self._extract_text_with_confidence(page_data['processed_image'])
-        results['ocr_confidence'] = text_data['mean_confidence']
+        # Con un layout conocido solo se leen las cajas de los campos;
+        # los layouts desconocidos usan OCR de página completa
+        template_match = page_data.get('template_match')
+        
+        # OCR de página ya disponible o que calculará otro detector (anotaciones)
+        page_ocr_ready = isinstance(ocr_data, dict) or (
+            isinstance(ocr_data, LazyPageOCR) and (ocr_data.ready or ocr_data.required)
+        )
+        
+        if template_match and template_match.get('fields'):
+            # Si la página completa se va a leer de todas formas, las cajas se
+            # arman con sus palabras en lugar de hacer OCR de cada caja
+            page_words = (
+                resolve_ocr_data(ocr_data, page_data['processed_image'], self.config)
+                if page_ocr_ready else None
+            )
+            text_data = self._extract_fields_text(
+                page_data['processed_image'], template_match['fields'], page_words
+            )
+            detected_fields, missing_fields = self._detect_template_fields(text_data)
+            
+            # Campos requeridos sin caja en la plantilla (p. ej. 'firma'): buscarlos
+            # en el texto de la página completa, no solo en el de las cajas
+            unboxed = [field for field in missing_fields if field not in template_match['fields']]
+            if unboxed:
+                page_text = self._extract_text_with_confidence(page_data['processed_image'], ocr_data)['text']
+                page_detected, _ = self._detect_required_fields(page_text)
+                detected_fields = [field for field in self.required_fields
+                                   if field in detected_fields or (field in unboxed and field in page_detected)]
+                missing_fields = [field for field in self.required_fields if field not in detected_fields]
+            results['template'] = template_match['template']
+            results['ocr_mode'] = 'template_fields'
+            expected_words = 5 * len(template_match['fields'])
+        else:
+            text_data = None
+            
+            # Las regiones prioritarias solo se leen si el OCR de página completa
+            # no está ya disponible ni lo va a calcular otro detector
+            if self.region_first and self.field_regions and not page_ocr_ready:
+                region_data = self._extract_regions_first(page_data['processed_image'])
+                results['regions_read'] = region_data['regions_read']
+                if region_data['sufficient']:
+                    text_data = region_data
+                    results['ocr_mode'] = 'field_regions'
+            
+            if text_data is None:
+                text_data = self._extract_text_with_confidence(page_data['processed_image'], ocr_data)
+                expected_words = 50
+            else:
+                expected_words = text_data['expected_words']
+            
+            # 3. Detectar campos requeridos
+            detected_fields, missing_fields = self._detect_required_fields(text_data['text'])
         
-        # 3. Detectar campos requeridos
-        detected_fields, missing_fields = self._detect_required_fields(text_data['text'])
+        results['ocr_confidence'] = text_data['mean_confidence']
+        results['text'] = text_data['text']
         results['fields_detected'] = detected_fields
         results['fields_missing'] = missing_fields
         
@@ -76,7 +143,8 @@ class LegibilityAnalyzer:
         text_quality = self._calculate_text_quality(
             text_data['text'],
             text_data['mean_confidence'],
-            len(detected_fields)
+            len(detected_fields),
+            expected_words
         )
         results['text_quality'] = text_quality
         
@@ -104,27 +172,23 @@ class LegibilityAnalyzer:
         
         return results
     
-    def _extract_text_with_confidence(self, image: np.ndarray) -> Dict[str, Any]:
+    def _extract_text_with_confidence(self, image: np.ndarray,
+                                      ocr_data: Union[Dict[str, List], LazyPageOCR, None] = None
+                                      ) -> Dict[str, Any]:
         """
         Extrae texto de la imagen con información de confianza
         
         Args:
             image: Imagen del documento
+            ocr_data: Resultado de OCR por palabra ya calculado para esta imagen
+                      (o LazyPageOCR compartido)
             
         Returns:
             Diccionario con texto y confianza
         """
         try:
-            # Configurar OCR para español
-            config = f"--psm {self.config['ocr']['psm']} --oem {self.config['ocr']['oem']}"
-            
-            # Extraer texto con detalles
-            data = pytesseract.image_to_data(
-                image, 
-                lang=self.config['ocr']['language'],
-                config=config,
-                output_type=pytesseract.Output.DICT
-            )
+            # Una sola pasada de OCR: el texto se reconstruye desde los datos por palabra
+            data = resolve_ocr_data(ocr_data, image, self.config)
             
             # Filtrar palabras con confianza suficiente
             valid_confidences = [
@@ -135,11 +199,7 @@ class LegibilityAnalyzer:
             mean_conf = np.mean(valid_confidences) if valid_confidences else 0
             
             # Extraer todo el texto
-            full_text = pytesseract.image_to_string(
-                image,
-                lang=self.config['ocr']['language'],
-                config=config
-            )
+            full_text = text_from_ocr_data(data)
             
             return {
                 'text': full_text.lower(),
@@ -155,6 +215,134 @@ class LegibilityAnalyzer:
                 'word_count': 0
             }
     
+    def _extract_regions_first(self, image: np.ndarray) -> Dict[str, Any]:
+        """
+        Lee las regiones de campos en orden de prioridad y se detiene en cuanto
+        se alcanzan los campos mínimos con confianza suficiente
+        
+        Args:
+            image: Imagen del documento
+            
+        Returns:
+            Diccionario con texto, confianza, regiones leídas y si bastaron ('sufficient')
+        """
+        h, w = image.shape[:2]
+        texts = []
+        weighted_confidence = 0.0
+        word_count = 0
+        area_read = 0.0
+        regions_read = []
+        mean_confidence = 0.0
+        sufficient = False
+        
+        for name, region in self.field_regions.items():
+            x1, x2 = int(region['x_start'] * w), int(region['x_end'] * w)
+            y1, y2 = int(region['y_start'] * h), int(region['y_end'] * h)
+            if x2 <= x1 or y2 <= y1:
+                continue
+            
+            region_data = self._extract_text_with_confidence(image[y1:y2, x1:x2])
+            regions_read.append(name)
+            area_read += (region['x_end'] - region['x_start']) * (region['y_end'] - region['y_start'])
+            texts.append(region_data['text'])
+            weighted_confidence += region_data['mean_confidence'] * region_data['word_count']
+            word_count += region_data['word_count']
+            
+            mean_confidence = weighted_confidence / word_count if word_count else 0.0
+            detected, _ = self._detect_required_fields('\n'.join(texts))
+            
+            if len(detected) >= self.min_fields_detected and mean_confidence >= self.min_confidence:
+                sufficient = True
+                break
+        
+        logger.debug(f"Legibilidad por regiones: {regions_read} - "
+                     f"{'suficiente' if sufficient else 'se continúa con página completa'}")
+        
+        return {
+            'text': '\n'.join(texts),
+            'mean_confidence': mean_confidence,
+            'word_count': word_count,
+            'expected_words': max(10, int(50 * min(1.0, area_read))),
+            'regions_read': regions_read,
+            'sufficient': sufficient
+        }
+    
+    def _extract_fields_text(self, image: np.ndarray,
+                             field_boxes: Dict[str, Tuple[int, int, int, int]],
+                             page_words: Optional[Dict[str, List]] = None) -> Dict[str, Any]:
+        """
+        Extrae texto solo de las cajas de campos localizadas por la plantilla
+        
+        Args:
+            image: Imagen del documento
+            field_boxes: Cajas absolutas {campo: (x, y, w, h)}
+            page_words: OCR por palabra de la página completa; si se indica, el
+                        texto de cada caja sale de sus palabras sin OCR adicional
+            
+        Returns:
+            Diccionario con texto, confianza y texto por campo
+        """
+        field_texts = {}
+        all_confidences = []
+        
+        for field, (x, y, w, h) in field_boxes.items():
+            if w <= 0 or h <= 0:
+                field_texts[field] = {'text': '', 'mean_confidence': 0}
+                continue
+            
+            if page_words is not None:
+                roi_data = self._extract_text_with_confidence(
+                    image, words_in_box(page_words, (x, y, w, h))
+                )
+            else:
+                roi_data = self._extract_text_with_confidence(image[y:y+h, x:x+w])
+            field_texts[field] = roi_data
+            if roi_data['word_count'] > 0:
+                all_confidences.append(roi_data['mean_confidence'])
+        
+        return {
+            'text': '\n'.join(data['text'] for data in field_texts.values()),
+            'mean_confidence': np.mean(all_confidences) if all_confidences else 0,
+            'word_count': sum(data.get('word_count', 0) for data in field_texts.values()),
+            'fields': field_texts
+        }
+    
+    def _detect_template_fields(self, text_data: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+        """
+        Determina qué campos requeridos son legibles dentro de sus cajas
+        
+        Un campo con caja en la plantilla se considera detectado si su contenido
+        tiene texto alfanumérico con confianza suficiente; los campos sin caja
+        se buscan por palabra clave en el texto de las cajas (analyze_legibility
+        busca en la página completa los que sigan faltando).
+        
+        Args:
+            text_data: Resultado de _extract_fields_text
+            
+        Returns:
+            Tupla (campos_detectados, campos_faltantes)
+        """
+        detected = []
+        missing = []
+        keyword_detected, _ = self._detect_required_fields(text_data['text'])
+        
+        for field in self.required_fields:
+            field_data = text_data['fields'].get(field)
+            if field_data is not None:
+                readable = (
+                    any(c.isalnum() for c in field_data['text']) and
+                    field_data['mean_confidence'] >= self.min_confidence
+                )
+            else:
+                readable = field in keyword_detected
+            
+            if readable:
+                detected.append(field)
+            else:
+                missing.append(field)
+        
+        return detected, missing
+    
     def _detect_required_fields(self, text: str) -> Tuple[List[str], List[str]]:
         """
         Detecta qué campos requeridos están presentes en el texto
@@ -168,32 +356,19 @@ class LegibilityAnalyzer:
         detected = []
         missing = []
         
-        # Palabras clave alternativas para cada campo
-        field_keywords = {
-            'factura': ['factura', 'fact', 'invoice', 'no.', 'núm', 'numero'],
-            'cliente': ['cliente', 'client', 'razón social', 'razon social'],
-            'pedido': ['pedido', 'orden', 'order', 'o.c.', 'oc'],
-            'producto': ['producto', 'material', 'descripción', 'articulo', 'artículo'],
-            'firma': ['firma', 'recibí', 'recibi', 'nombre', 'autoriza']
-        }
+        # Buscar alias de todos los campos en una sola pasada (tolerante a errores de OCR)
+        found = self.keyword_matcher.categories_found(text)
         
         for field in self.required_fields:
-            keywords = field_keywords.get(field, [field])
-            found = False
-            
-            for keyword in keywords:
-                if keyword in text:
-                    detected.append(field)
-                    found = True
-                    break
-            
-            if not found:
+            if f'field.{field}' in found:
+                detected.append(field)
+            else:
                 missing.append(field)
         
         return detected, missing
     
     def _calculate_text_quality(self, text: str, ocr_confidence: float, 
-                                fields_count: int) -> float:
+                                fields_count: int, expected_words: int = 50) -> float:
         """
         Calcula una puntuación de calidad del texto
         
@@ -201,6 +376,7 @@ class LegibilityAnalyzer:
             text: Texto extraído
             ocr_confidence: Confianza media del OCR
             fields_count: Número de campos detectados
+            expected_words: Palabras esperadas para considerar texto suficiente
             
         Returns:
             Puntuación de calidad (0-1)
@@ -217,7 +393,7 @@ class LegibilityAnalyzer:
         
         # Factor 3: Cantidad de texto (más texto suele ser mejor)
         word_count = len(text.split())
-        text_amount_factor = min(1.0, word_count / 50)  # 50 palabras = 1.0
+        text_amount_factor = min(1.0, word_count / expected_words)  # 50 palabras = 1.0 en página completa
         factors.append(text_amount_factor)
         
         # Factor 4: Proporción de caracteres alfanuméricos
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Caché de OCR por Hash Perceptual
+Evita repetir OCR sobre regiones de contenido fijo que se repiten entre PODs
+(encabezados impresos, sellos de empresa, etiquetas de formulario)
+"""
+
+from typing import Dict, Any, Callable, Optional
+import cv2
+import numpy as np
+from loguru import logger
+
+from .disk_cache import DiskLRUCache
+
+# Instancias compartidas por ruta de archivo
+_CACHE_INSTANCES: Dict[str, 'OCRCache'] = {}
+
+
+def perceptual_hash(image: np.ndarray, hash_size: int = 16) -> str:
+    """
+    Hash perceptual (DCT) de una región normalizada
+
+    La región se lleva a escala de grises, se estira su contraste y se reduce a
+    (4 * hash_size)²; el hash son los bits de las frecuencias bajas de la DCT
+    comparados con su mediana. Escaneos de la misma región impresa suelen
+    producir el mismo hash.
+
+    Args:
+        image: Región de interés
+        hash_size: Lado del bloque de frecuencias (hash de hash_size² bits)
+
+    Returns:
+        Hash en hexadecimal
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+    normalized = cv2.normalize(gray, None, 0, 255, cv2.NORM_MINMAX)
+    side = hash_size * 4
+    small = cv2.resize(normalized, (side, side), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+    low_freq = cv2.dct(small)[:hash_size, :hash_size].flatten()
+    bits = low_freq[1:] > np.median(low_freq[1:])
+
+    return np.packbits(bits).tobytes().hex()
+
+
+class OCRCache:
+    """
+    Caché de resultados de OCR indexada por hash perceptual de la región
+
+    Las entradas se agrupan por motor, parámetros (idioma, PSM, modelo) y
+    tamaño aproximado de la región, de modo que un cambio de configuración
+    nunca reutiliza resultados anteriores. Solo se reutiliza una entrada si el
+    hash coincide exactamente: dos folios que difieren en un dígito quedan a
+    muy pocos bits de distancia, así que aceptar hashes cercanos devolvería el
+    texto de otro documento.
+
+    Solo debe usarse para regiones de contenido fijo (sellos, encabezados
+    impresos); nunca para páginas completas ni campos con datos variables.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        """
+        Args:
+            config: Diccionario de configuración
+        """
+        cache_config = config.get('ocr_cache', {})
+        self.enabled = cache_config.get('enabled', False)
+        self.hash_size = cache_config.get('hash_size', 16)
+        self.size_bucket = cache_config.get('size_bucket', 32)
+        self.min_pixels = cache_config.get('min_pixels', 400)
+        self.hits = 0
+        self.misses = 0
+        self.store = None
+
+        if self.enabled:
+            self.store = DiskLRUCache(
+                cache_config.get('path', 'database/ocr_cache.db'),
+                max_entries=cache_config.get('max_entries', 50000),
+                table='ocr_cache'
+            )
+            logger.info(f"Caché de OCR habilitada ({self.store.stats()['entries']} entradas)")
+
+    def _group(self, roi: np.ndarray, engine: str, params: str) -> str:
+        """Grupo de la región: motor, parámetros y tamaño aproximado"""
+        h, w = roi.shape[:2]
+        return f"{engine}|{params}|{w // self.size_bucket}x{h // self.size_bucket}"
+
+    def get_or_compute(self, roi: np.ndarray, engine: str, params: str,
+                       compute: Callable[[], Any],
+                       should_cache: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Devuelve el resultado guardado para la región o lo calcula y lo guarda
+
+        Args:
+            roi: Región de interés (de contenido fijo)
+            engine: Motor de OCR
+            params: Parámetros del motor
+            compute: Función que ejecuta el OCR
+            should_cache: Filtro opcional (p. ej. no guardar resultados fallidos)
+
+        Returns:
+            Resultado del OCR
+        """
+        if self.store is None or roi is None or roi.size < self.min_pixels:
+            return compute()
+
+        key = f"{self._group(roi, engine, params)}|{perceptual_hash(roi, self.hash_size)}"
+
+        cached = self.store.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        result = compute()
+
+        if should_cache is None or should_cache(result):
+            self.store.set(key, result)
+
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Métricas de aciertos de la caché
+
+        Returns:
+            Diccionario con 'enabled', 'entries', 'hits', 'misses', 'hit_rate' y 'evictions'
+        """
+        if self.store is None:
+            return {'enabled': False}
+        lookups = self.hits + self.misses
+        return {
+            'enabled': True,
+            'entries': self.store.stats()['entries'],
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'evictions': self.store.evictions
+        }
+
+
+def get_ocr_cache(config: Dict[str, Any]) -> OCRCache:
+    """
+    Obtiene la caché de OCR compartida por todos los detectores del proceso
+
+    Args:
+        config: Diccionario de configuración
+
+    Returns:
+        Caché de OCR (deshabilitada si así lo indica la configuración)
+    """
+    cache_config = config.get('ocr_cache', {})
+    if not cache_config.get('enabled', False):
+        return OCRCache(config)
+
+    path = cache_config.get('path', 'database/ocr_cache.db')
+    if path not in _CACHE_INSTANCES:
+        _CACHE_INSTANCES[path] = OCRCache(config)
+    return _CACHE_INSTANCES[path]
+
+
+def reopen_ocr_caches() -> None:
+    """
+    Reabre las conexiones de las cachés compartidas en un proceso hijo tras fork
+    """
+    for cache in _CACHE_INSTANCES.values():
+        if cache.store is not None:
+            cache.store.reopen()
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+OCR de Página a Nivel de Palabra
+Funciones compartidas para obtener las palabras impresas reconocidas por Tesseract
+"""
+
+import pytesseract
+import threading
+import numpy as np
+from typing import Dict, Any, List, Tuple, Optional, Union
+from loguru import logger
+import os
+
+# Configurar ruta de Tesseract si está en la ubicación estándar
+if os.path.exists(r"C:\Program Files\Tesseract-OCR\tesseract.exe"):
+    pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+
+
+def ocr_page_words(image: np.ndarray, config: Dict[str, Any]) -> Dict[str, List]:
+    """
+    Ejecuta OCR a nivel de palabra sobre la página completa
+
+    Usa la misma configuración (idioma, PSM, OEM) que el análisis de legibilidad,
+    de modo que el resultado puede compartirse entre detectores.
+
+    Args:
+        image: Imagen del documento
+        config: Diccionario de configuración
+
+    Returns:
+        Diccionario con el formato de pytesseract.Output.DICT
+        (listas 'text', 'conf', 'left', 'top', 'width', 'height', ...)
+    """
+    ocr_config = f"--psm {config['ocr']['psm']} --oem {config['ocr']['oem']}"
+
+    try:
+        return pytesseract.image_to_data(
+            image,
+            lang=config['ocr']['language'],
+            config=ocr_config,
+            output_type=pytesseract.Output.DICT
+        )
+    except Exception as e:
+        logger.error(f"Error en OCR de palabras: {e}")
+        return {'text': [], 'conf': [], 'left': [], 'top': [], 'width': [], 'height': []}
+
+
+class LazyPageOCR:
+    """
+    OCR por palabra de la página calculado solo si algún detector lo pide
+
+    Se comparte entre detectores que corren en paralelo: el primero que lo
+    necesita lo calcula y los demás esperan ese mismo resultado.
+    """
+
+    def __init__(self, image: np.ndarray, config: Dict[str, Any], required: bool = False):
+        """
+        Args:
+            image: Imagen del documento
+            config: Diccionario de configuración
+            required: Si algún detector lo va a pedir de todas formas (los demás
+                      pueden usarlo en lugar de hacer OCR parcial)
+        """
+        self.image = image
+        self.config = config
+        self.required = required
+        self._data: Optional[Dict[str, List]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        """Indica si el OCR ya fue calculado"""
+        return self._data is not None
+
+    def get(self) -> Dict[str, List]:
+        """
+        Obtiene el OCR de la página, calculándolo la primera vez
+
+        Returns:
+            Diccionario con el formato de ocr_page_words
+        """
+        with self._lock:
+            if self._data is None:
+                self._data = ocr_page_words(self.image, self.config)
+            return self._data
+
+
+def resolve_ocr_data(ocr_data: Union[Dict[str, List], LazyPageOCR, None],
+                     image: np.ndarray, config: Dict[str, Any]) -> Dict[str, List]:
+    """
+    Obtiene el OCR por palabra a partir de un resultado ya calculado,
+    un LazyPageOCR o nada (en cuyo caso se calcula)
+
+    Args:
+        ocr_data: Resultado de OCR, proveedor perezoso o None
+        image: Imagen del documento
+        config: Diccionario de configuración
+
+    Returns:
+        Diccionario con el formato de ocr_page_words
+    """
+    if isinstance(ocr_data, LazyPageOCR):
+        return ocr_data.get()
+    if ocr_data is None:
+        return ocr_page_words(image, config)
+    return ocr_data
+
+
+def words_in_box(ocr_data: Dict[str, List],
+                 box: Tuple[int, int, int, int]) -> Dict[str, List]:
+    """
+    Subconjunto del OCR por palabra cuyas palabras caen dentro de una caja
+
+    Una palabra pertenece a la caja si su centro está dentro de ella.
+
+    Args:
+        ocr_data: Resultado de ocr_page_words
+        box: Caja (x, y, w, h) en coordenadas de la página
+
+    Returns:
+        Diccionario con el formato de ocr_page_words (solo esas palabras)
+    """
+    x, y, w, h = box
+    lefts, tops = ocr_data.get('left', []), ocr_data.get('top', [])
+    widths, heights = ocr_data.get('width', []), ocr_data.get('height', [])
+
+    indices = [
+        idx for idx in range(len(ocr_data.get('text', [])))
+        if x <= lefts[idx] + widths[idx] / 2 < x + w
+        and y <= tops[idx] + heights[idx] / 2 < y + h
+    ]
+    return {
+        key: [values[idx] for idx in indices]
+        for key, values in ocr_data.items()
+        if isinstance(values, list) and len(values) == len(ocr_data['text'])
+    }
+
+
+def printed_word_boxes(ocr_data: Dict[str, List],
+                       min_confidence: float) -> List[Tuple[int, int, int, int]]:
+    """
+    Obtiene las cajas de palabras reconocidas con alta confianza (texto impreso)
+
+    Args:
+        ocr_data: Resultado de ocr_page_words
+        min_confidence: Confianza mínima (0-100) para considerar la palabra impresa
+
+    Returns:
+        Lista de cajas (x, y, w, h)
+    """
+    boxes = []
+
+    for idx, word in enumerate(ocr_data.get('text', [])):
+        if not word or not word.strip():
+            continue
+
+        try:
+            conf = float(ocr_data['conf'][idx])
+        except (ValueError, TypeError):
+            continue
+
+        if conf >= min_confidence:
+            boxes.append((
+                int(ocr_data['left'][idx]),
+                int(ocr_data['top'][idx]),
+                int(ocr_data['width'][idx]),
+                int(ocr_data['height'][idx])
+            ))
+
+    return boxes
+
+
+def text_from_ocr_data(ocr_data: Dict[str, List]) -> str:
+    """
+    Reconstruye el texto de la página a partir del OCR por palabra,
+    respetando bloques, párrafos y líneas (equivalente a image_to_string)
+
+    Args:
+        ocr_data: Resultado de ocr_page_words
+
+    Returns:
+        Texto con una línea por cada línea detectada
+    """
+    lines: Dict[Tuple[int, int, int], List[str]] = {}
+    words = ocr_data.get('text', [])
+    default = [0] * len(words)
+    block_nums = ocr_data.get('block_num', default)
+    par_nums = ocr_data.get('par_num', default)
+    line_nums = ocr_data.get('line_num', default)
+
+    for idx, word in enumerate(words):
+        if not word or not word.strip():
+            continue
+        key = (block_nums[idx], par_nums[idx], line_nums[idx])
+        lines.setdefault(key, []).append(word.strip())
+
+    return '\n'.join(' '.join(line_words) for line_words in lines.values())
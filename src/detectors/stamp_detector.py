@@ -11,6 +11,9 @@ from typing import List, Dict, Any
 from loguru import logger
 import os
 
+from .keyword_matcher import get_keyword_matcher
+from .ocr_cache import get_ocr_cache
+
 # Configurar ruta de Tesseract si está en la ubicación estándar
 if os.path.exists(r"C:\Program Files\Tesseract-OCR\tesseract.exe"):
     pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
@@ -33,6 +36,8 @@ class StampDetector:
         self.max_area = config['thresholds']['stamp_max_area']
         self.circularity = config['thresholds']['stamp_circularity']
         self.invalid_stamps = [s.lower() for s in config['invalid_stamps']]
+        self.keyword_matcher = get_keyword_matcher(config)
+        self.ocr_cache = get_ocr_cache(config)
         
         logger.info("Detector de sellos inicializado")
     
@@ -191,7 +196,10 @@ class StampDetector:
         try:
             # Configuración de OCR
             config = '--psm 6 --oem 3'
-            text = pytesseract.image_to_string(roi, lang='spa', config=config)
+            text = self.ocr_cache.get_or_compute(
+                roi, 'tesseract', f"spa {config}",
+                lambda: pytesseract.image_to_string(roi, lang='spa', config=config)
+            )
             text = text.strip().lower()
             return text
         except Exception as e:
@@ -208,13 +216,20 @@ class StampDetector:
         Returns:
             True si el sello es válido
         """
-        text = stamp.get('text', '').lower()
+        text = stamp.get('text', '')
+        
+        # Verificar si contiene palabras de sellos inválidos (incluye errores de OCR)
+        invalid_matches = [
+            match for match in self.keyword_matcher.find_all(text)
+            if match['category'] == 'invalid_stamp'
+        ]
+        stamp['invalid_matches'] = invalid_matches
         
-        # Verificar si contiene palabras de sellos inválidos
-        for invalid in self.invalid_stamps:
-            if invalid in text:
-                logger.debug(f"Sello inválido detectado: {invalid}")
-                return False
+        if invalid_matches:
+            match = invalid_matches[0]
+            logger.debug(f"Sello inválido detectado: {match['keyword']} "
+                         f"(texto: '{match['text']}', posición {match['start']})")
+            return False
         
         return True
     
@@ -5,47 +5,256 @@ Proporciona análisis inteligente y clasificación avanzada
 """
 
 import os
+import re
+import json
 import base64
-from typing import Dict, Any, Optional
+import hashlib
+import threading
+from typing import Dict, Any, Callable, List, Optional, Union
+import numpy as np
 from loguru import logger
 import google.generativeai as genai
 
+from detectors.disk_cache import DiskLRUCache
+from gemini_async_client import AsyncGeminiClient
+from gemini_payload import PayloadPreparer, Region
+
+# Versión de los prompts; cambiarla invalida las respuestas guardadas en caché
+PROMPT_VERSION = 'v2'
+
+# Campos de generación que solo entiende la API REST (el SDK fijado los rechaza)
+REST_ONLY_GENERATION_FIELDS = {'response_mime_type'}
+
+# Revisión completa en una sola llamada (ver GeminiPODAnalyzer.review_pod)
+REVIEW_PROMPT = """
+Analiza este documento POD (Proof of Delivery / Prueba de Entrega).
+
+Responde SOLO con un objeto JSON con esta estructura exacta:
+{
+  "manuscritos": {
+    "hay_manuscritos": true/false,
+    "transcripcion": "texto manuscrito exacto (ignora el texto IMPRESO)",
+    "sentimiento": "POSITIVO" | "NEGATIVO" | "NEUTRAL",
+    "urgencia": "URGENTE" | "NORMAL" | "INFO",
+    "resumen": "descripción de 1 línea"
+  },
+  "firma": {
+    "tipo": "MANUSCRITA" | "SELLO" | "DIGITAL" | "NINGUNA",
+    "confianza": "ALTA" | "MEDIA" | "BAJA",
+    "ubicacion": "dónde está la firma",
+    "explicacion": "breve razón"
+  },
+  "campos": {
+    "factura": "", "cliente": "", "pedido": "", "fecha_entrega": "",
+    "productos": "", "cantidad": "", "direccion": ""
+  },
+  "clasificacion": {
+    "categoria": "OK" | "CON_ANOTACIONES" | "SIN_ACUSE" | "POCO_LEGIBLE" | "INCORRECTO",
+    "confianza": "ALTA" | "MEDIA" | "BAJA",
+    "razon": "breve explicación"
+  }
+}
+
+Reglas de clasificación:
+- OK: firma manuscrita Y/O sello del cliente (los sellos de Deacero o Ingetek NO cuentan)
+- CON_ANOTACIONES: comentarios manuscritos
+- SIN_ACUSE: sin firma, sello ni anotaciones
+- POCO_LEGIBLE: Factura, Cliente o Pedido no se distinguen
+- INCORRECTO: documento cortado o incompleto
+Si un campo no está visible, usa "No visible".
+"""
+
+# Revisión de varios PODs en una sola llamada (ver GeminiPODAnalyzer.review_pods)
+REVIEW_BATCH_PROMPT = """
+Analiza por separado cada una de las {count} imágenes de documentos POD (Proof of Delivery).
+Cada imagen va precedida del texto "Imagen N" (N de 1 a {count}); no mezcles datos entre imágenes.
+
+Responde SOLO con un arreglo JSON de {count} objetos, uno por imagen y en el mismo orden.
+Cada objeto lleva "imagen": N y las claves "manuscritos", "firma", "campos" y
+"clasificacion" con esta estructura y reglas:
+""" + REVIEW_PROMPT[REVIEW_PROMPT.index('{'):]
+
+_SENTIMENTS = {'POSITIVO': 'positive', 'NEGATIVO': 'negative', 'NEUTRAL': 'neutral'}
+_URGENCIES = {'URGENTE': 'urgent', 'NORMAL': 'normal', 'INFO': 'info'}
+_SIGNATURE_TYPES = {'MANUSCRITA': 'handwritten', 'SELLO': 'stamp', 'DIGITAL': 'digital', 'NINGUNA': 'none'}
+_CONFIDENCES = {'ALTA': 'high', 'MEDIA': 'medium', 'BAJA': 'low'}
+
 
 class GeminiPODAnalyzer:
     """
     Analizador de PODs usando Google Gemini
     """
     
-    def __init__(self, api_key: str = None, use_pro: bool = False):
+    def __init__(self, api_key: str = None, use_pro: bool = False, config: Dict[str, Any] = None):
         """
         Inicializa el analizador Gemini
         
         Args:
             api_key: API key de Google Gemini
             use_pro: Usar Gemini Pro en lugar de Flash (más preciso, más caro)
+            config: Diccionario de configuración (sección 'gemini')
         """
         self.api_key = api_key or os.getenv('GEMINI_API_KEY')
+        gemini_config = (config or {}).get('gemini', {})
+        self.prompt_version = gemini_config.get('prompt_version', PROMPT_VERSION)
+        self.cache = None
+        self.async_client = None
+        self.payload = PayloadPreparer(gemini_config.get('payload', {}))
+        
+        # Revisión por lotes: varios PODs por solicitud, limitados por cantidad y bytes
+        batch_config = gemini_config.get('batch', {})
+        self.batch_max_images = batch_config.get('max_images', 8)
+        self.batch_max_bytes = batch_config.get('max_bytes', 4 * 1024 * 1024)
+        self.batch_stats = {'requests': 0, 'pods': 0, 'fallbacks': 0}
+        self._batch_lock = threading.Lock()
+        self._thread_calls = threading.local()
         
         if self.api_key:
             genai.configure(api_key=self.api_key)
             
             # Seleccionar modelo según configuración
             if use_pro:
-                self.model = genai.GenerativeModel('gemini-1.5-pro')
+                self.model_id = 'gemini-1.5-pro'
                 self.model_name = 'Gemini 1.5 Pro'
                 logger.info("Gemini 1.5 PRO inicializado (máxima precisión)")
             else:
-                self.model = genai.GenerativeModel('gemini-1.5-flash')
+                self.model_id = 'gemini-1.5-flash'
                 self.model_name = 'Gemini 1.5 Flash'
                 logger.info("Gemini 1.5 Flash inicializado correctamente")
+            self.model = genai.GenerativeModel(self.model_id)
             
             self.enabled = True
             self.use_pro = use_pro
+            
+            # Cliente REST con límite de tasa, reintentos y cortacircuitos compartidos
+            if gemini_config.get('client', 'sdk') == 'rest':
+                self.async_client = AsyncGeminiClient(self.api_key, self.model_id, gemini_config.get('rest', {}))
+                logger.info(f"Gemini vía REST ({self.async_client.requests_per_second} solicitudes/s, "
+                            f"{self.async_client.max_concurrency} simultáneas)")
+            
+            # Caché de respuestas en disco (reprocesos, cambios de configuración, la web)
+            cache_config = gemini_config.get('cache', {})
+            if cache_config.get('enabled', False):
+                ttl_days = cache_config.get('ttl_days', 30)
+                self.cache = DiskLRUCache(
+                    cache_config.get('path', 'database/gemini_cache.db'),
+                    max_entries=cache_config.get('max_entries', 20000),
+                    table='gemini_cache',
+                    ttl_seconds=ttl_days * 86400 if ttl_days else None
+                )
         else:
             logger.warning("Gemini API key no encontrada - modo deshabilitado")
             self.enabled = False
             self.use_pro = False
     
+    def _cache_key(self, parts: List[Any], generation_config: Optional[Dict[str, Any]]) -> str:
+        """
+        Clave de caché: modelo, versión de prompts, texto del prompt, contenido
+        de las imágenes y configuración de generación
+        """
+        digest = hashlib.sha256(f"{self.model_id}|{self.prompt_version}".encode('utf-8'))
+        for part in parts:
+            if isinstance(part, dict):
+                part = part['data']
+            data = part if isinstance(part, bytes) else str(part).encode('utf-8')
+            digest.update(hashlib.sha256(data).digest())
+        if generation_config:
+            digest.update(json.dumps(generation_config, sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+    
+    def _generate(self, parts: List[Any], generation_config: Dict[str, Any] = None,
+                  parse: Optional[Callable[[str], Any]] = None) -> Any:
+        """
+        Llama a Gemini consultando primero la caché de respuestas
+        
+        Usa el cliente REST con límite de tasa si gemini.client es 'rest';
+        si no, el SDK de google-generativeai. Una respuesta solo se guarda en
+        la caché si no está vacía y, cuando se indica parse, si se pudo
+        interpretar: una respuesta malformada no debe repetirse en cada reproceso.
+        
+        El SDK fijado en requirements.txt (0.3.x) no conoce response_mime_type,
+        así que solo se envía por REST; con el SDK la respuesta JSON depende del
+        prompt y de _load_json_response.
+        
+        Args:
+            parts: Prompt e imágenes ({'mime_type', 'data'} o bytes)
+            generation_config: Configuración de generación (p. ej. respuesta JSON)
+            parse: Función que interpreta el texto (lanza excepción si no es válido)
+            
+        Returns:
+            Resultado de parse, o respuesta con atributo 'text' si no se indica
+            
+        Raises:
+            InvalidResponseError: Si parse no pudo interpretar la respuesta (los
+                errores del SDK, la red o la configuración se propagan tal cual)
+        """
+        parse = parse or _TextResponse
+        key = self._cache_key(parts, generation_config) if self.cache is not None else None
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return _parse_or_raise(parse, cached)
+        
+        self._thread_calls.count = self.api_calls_in_thread() + 1
+        if self.async_client is not None:
+            text = self.async_client.generate_sync(parts, generation_config)
+        else:
+            sdk_config = {name: value for name, value in (generation_config or {}).items()
+                          if name not in REST_ONLY_GENERATION_FIELDS}
+            if sdk_config:
+                text = self.model.generate_content(parts, generation_config=sdk_config).text
+            else:
+                text = self.model.generate_content(parts).text
+        
+        result = _parse_or_raise(parse, text)
+        if key is not None and text and text.strip():
+            self.cache.set(key, text)
+        return result
+    
+    def api_calls_in_thread(self) -> int:
+        """
+        Llamadas a la API hechas desde el hilo actual (sin aciertos de caché)
+        
+        Permite a la cola medir cuántas llamadas costó realmente un trabajo,
+        incluidas las revisiones individuales de respaldo.
+        
+        Returns:
+            Número de llamadas acumuladas en este hilo
+        """
+        return getattr(self._thread_calls, 'count', 0)
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """
+        Aciertos de la caché de respuestas
+        
+        Returns:
+            Diccionario con 'enabled', 'entries', 'hits', 'misses', 'hit_rate', 'evictions' y 'expirations'
+        """
+        if self.cache is None:
+            return {'enabled': False}
+        return {'enabled': True, **self.cache.stats()}
+    
+    def batch_summary(self) -> Dict[str, Any]:
+        """
+        Solicitudes por lote y PODs revisados en ellas
+        
+        Returns:
+            Diccionario con 'requests', 'pods', 'fallbacks' y 'pods_per_request'
+        """
+        with self._batch_lock:
+            stats = dict(self.batch_stats)
+        stats['pods_per_request'] = round(stats['pods'] / stats['requests'], 2) if stats['requests'] else 0.0
+        return stats
+    
+    def payload_stats(self) -> Dict[str, Any]:
+        """
+        Bytes de imagen enviados a Gemini frente a los originales
+        
+        Returns:
+            Diccionario con 'calls', 'original_bytes', 'payload_bytes', 'saved_bytes' y 'saved_ratio'
+        """
+        return self.payload.summary()
+    
     def analyze_pod_image(self, image_path: str) -> Dict[str, Any]:
         """
         Analiza un POD completo con Gemini
@@ -61,8 +270,7 @@ class GeminiPODAnalyzer:
         
         try:
             # Leer imagen
-            with open(image_path, 'rb') as f:
-                image_data = f.read()
+            image_data = self.payload.prepare(image_path)
             
             # Crear prompt específico para PODs
             prompt = """
@@ -109,7 +317,7 @@ Responde en formato claro y estructurado.
             """
             
             # Enviar a Gemini
-            response = self.model.generate_content([prompt, image_data])
+            response = self._generate([prompt, image_data])
             
             analysis = {
                 'enabled': True,
@@ -165,16 +373,17 @@ Responde en formato claro y estructurado.
         else:
             analysis['gemini_sentiment'] = 'neutral'
     
-    def validate_signature(self, image_path: str) -> Dict[str, Any]:
+    def validate_signature(self, image_path: Union[str, np.ndarray],
+                           regions: Optional[List[Region]] = None) -> Dict[str, Any]:
         """
         Valida específicamente si hay firma usando Gemini
+        (con regions solo se envían esas zonas, p. ej. las zonas de firma 6-8)
         """
         if not self.enabled:
             return {'enabled': False}
         
         try:
-            with open(image_path, 'rb') as f:
-                image_data = f.read()
+            image_data = self.payload.prepare(image_path, regions)
             
             prompt = """
 ¿Este documento tiene una firma manuscrita real del cliente?
@@ -187,7 +396,7 @@ Responde SOLO:
 Luego explica brevemente por qué.
             """
             
-            response = self.model.generate_content([prompt, image_data])
+            response = self._generate([prompt, image_data])
             
             result = {
                 'enabled': True,
@@ -202,16 +411,17 @@ Luego explica brevemente por qué.
             logger.error(f"Error validando firma con Gemini: {e}")
             return {'enabled': True, 'error': str(e)}
     
-    def read_handwritten_text(self, image_path: str) -> Dict[str, Any]:
+    def read_handwritten_text(self, image_path: Union[str, np.ndarray],
+                              regions: Optional[List[Region]] = None) -> Dict[str, Any]:
         """
         Lee texto manuscrito usando Gemini
+        (con regions solo se envían esas zonas, p. ej. las anotaciones detectadas)
         """
         if not self.enabled:
             return {'enabled': False}
         
         try:
-            with open(image_path, 'rb') as f:
-                image_data = f.read()
+            image_data = self.payload.prepare(image_path, regions)
             
             prompt = """
 Lee TODAS las anotaciones o texto manuscrito (escrito a mano) en este documento.
@@ -221,7 +431,7 @@ Transcribe exactamente lo que dice cada anotación.
 Si no hay anotaciones manuscritas, responde: "Sin anotaciones manuscritas"
             """
             
-            response = self.model.generate_content([prompt, image_data])
+            response = self._generate([prompt, image_data])
             
             return {
                 'enabled': True,
@@ -241,8 +451,7 @@ Si no hay anotaciones manuscritas, responde: "Sin anotaciones manuscritas"
             return {'enabled': False}
         
         try:
-            with open(image_path, 'rb') as f:
-                image_data = f.read()
+            image_data = self.payload.prepare(image_path)
             
             prompt = """
 Clasifica este POD en UNA categoría:
@@ -259,7 +468,7 @@ CONFIANZA: [ALTA/MEDIA/BAJA]
 RAZÓN: [breve explicación]
             """
             
-            response = self.model.generate_content([prompt, image_data])
+            response = self._generate([prompt, image_data])
             
             return {
                 'enabled': True,
@@ -271,17 +480,18 @@ RAZÓN: [breve explicación]
             logger.error(f"Error clasificando con Gemini: {e}")
             return {'enabled': True, 'error': str(e)}
     
-    def analyze_critical_annotations(self, image_path: str) -> Dict[str, Any]:
+    def analyze_critical_annotations(self, image_path: Union[str, np.ndarray],
+                                     regions: Optional[List[Region]] = None) -> Dict[str, Any]:
         """
         Analiza SOLO anotaciones manuscritas críticas
         Más rápido y económico que análisis completo
+        (con regions solo se envían las cajas de anotaciones detectadas)
         """
         if not self.enabled:
             return {'enabled': False}
         
         try:
-            with open(image_path, 'rb') as f:
-                image_data = f.read()
+            image_data = self.payload.prepare(image_path, regions)
             
             prompt = """
 Ignora todo el texto IMPRESO del documento.
@@ -304,7 +514,7 @@ URGENCIA: [URGENTE/NORMAL/INFO]
 RESUMEN: [descripción breve]
             """
             
-            response = self.model.generate_content([prompt, image_data])
+            response = self._generate([prompt, image_data])
             text_response = response.text.lower()
             
             result = {
@@ -339,16 +549,17 @@ RESUMEN: [descripción breve]
             logger.error(f"Error analizando manuscritos: {e}")
             return {'enabled': True, 'error': str(e)}
     
-    def validate_signature_authenticity(self, image_path: str) -> Dict[str, Any]:
+    def validate_signature_authenticity(self, image_path: Union[str, np.ndarray],
+                                        regions: Optional[List[Region]] = None) -> Dict[str, Any]:
         """
         Valida si la firma es manuscrita real o sello/impresión
+        (con regions solo se envían esas zonas, p. ej. las zonas de firma 6-8)
         """
         if not self.enabled:
             return {'enabled': False}
         
         try:
-            with open(image_path, 'rb') as f:
-                image_data = f.read()
+            image_data = self.payload.prepare(image_path, regions)
             
             prompt = """
 Enfócate SOLO en la FIRMA del documento (usualmente abajo).
@@ -366,7 +577,7 @@ EXPLICACIÓN: [breve razón de por qué]
 UBICACIÓN: [donde está la firma]
             """
             
-            response = self.model.generate_content([prompt, image_data])
+            response = self._generate([prompt, image_data])
             text_response = response.text
             
             result = {
@@ -408,8 +619,7 @@ UBICACIÓN: [donde está la firma]
             return {'enabled': False}
         
         try:
-            with open(image_path, 'rb') as f:
-                image_data = f.read()
+            image_data = self.payload.prepare(image_path)
             
             prompt = """
 Extrae SOLO estos campos del POD:
@@ -427,7 +637,7 @@ Si un campo NO está visible, pon: "No visible"
 Responde en formato de lista numerada exactamente como arriba.
             """
             
-            response = self.model.generate_content([prompt, image_data])
+            response = self._generate([prompt, image_data])
             
             result = {
                 'enabled': True,
@@ -467,6 +677,136 @@ Responde en formato de lista numerada exactamente como arriba.
             logger.error(f"Error extrayendo campos: {e}")
             return {'enabled': True, 'error': str(e)}
     
+    def review_pod(self, image_path: Union[str, np.ndarray]) -> Dict[str, Any]:
+        """
+        Revisión completa del POD en una sola llamada
+        
+        Pide en una respuesta JSON lo que analyze_critical_annotations,
+        validate_signature_authenticity, extract_key_fields y classify_pod
+        piden por separado, y devuelve cada parte con las mismas claves que
+        esos métodos. Si la respuesta no es JSON válido, recurre a las cuatro
+        llamadas individuales.
+        
+        Args:
+            image_path: Ruta a la imagen del POD o la imagen ya cargada
+            
+        Returns:
+            Diccionario con 'manuscripts', 'signature', 'fields', 'classification'
+            y 'consolidated' (False si se usaron las llamadas individuales)
+        """
+        if not self.enabled:
+            return {'enabled': False}
+        
+        try:
+            image_data = self.payload.prepare(image_path)
+            
+            review = self._generate(
+                [REVIEW_PROMPT, image_data],
+                generation_config={'response_mime_type': 'application/json'},
+                parse=_parse_review_response
+            )
+            review['consolidated'] = True
+            return review
+            
+        except InvalidResponseError as e:
+            logger.warning(f"Respuesta consolidada de Gemini no válida ({e}) - usando llamadas individuales")
+        except Exception as e:
+            logger.error(f"Error en revisión consolidada de Gemini: {e}")
+            return {'enabled': True, 'error': str(e)}
+        
+        return {
+            'manuscripts': self.analyze_critical_annotations(image_path),
+            'signature': self.validate_signature_authenticity(image_path),
+            'fields': self.extract_key_fields(image_path),
+            'classification': self.classify_pod(image_path),
+            'consolidated': False
+        }
+    
+    def review_pods(self, image_paths: List[Union[str, np.ndarray]]) -> List[Dict[str, Any]]:
+        """
+        Revisión completa de varios PODs con el menor número de llamadas
+        
+        Las imágenes se agrupan en lotes de hasta batch.max_images y
+        batch.max_bytes de contenido; cada lote es una sola solicitud que pide
+        un arreglo JSON con la revisión de cada imagen. Las imágenes cuya
+        revisión falta o no se puede interpretar se revisan una por una con
+        review_pod.
+        
+        Args:
+            image_paths: Rutas a las imágenes o imágenes ya cargadas
+            
+        Returns:
+            Lista de revisiones en el mismo orden, con el formato de review_pod
+        """
+        if not self.enabled:
+            return [{'enabled': False} for _ in image_paths]
+        if len(image_paths) == 1:
+            return [self.review_pod(image_paths[0])]
+        
+        reviews: List[Optional[Dict[str, Any]]] = [None] * len(image_paths)
+        
+        for batch in self._plan_batches([self.payload.prepare(image) for image in image_paths]):
+            if len(batch) == 1:
+                index = batch[0][0]
+                reviews[index] = self.review_pod(image_paths[index])
+                continue
+            
+            parts = [REVIEW_BATCH_PROMPT.replace('{count}', str(len(batch)))]
+            for position, (_, image_data) in enumerate(batch, 1):
+                parts.extend([f"Imagen {position}", image_data])
+            
+            try:
+                batch_reviews = self._generate(
+                    parts,
+                    generation_config={'response_mime_type': 'application/json'},
+                    parse=lambda text, count=len(batch): _parse_batch_review_response(text, count)
+                )
+            except InvalidResponseError as e:
+                logger.warning(f"Respuesta por lote de Gemini no válida ({e}) - revisando una por una")
+                batch_reviews = [None] * len(batch)
+            except Exception as e:
+                logger.error(f"Error en revisión por lote de Gemini: {e}")
+                for index, _ in batch:
+                    reviews[index] = {'enabled': True, 'error': str(e)}
+                continue
+            
+            missing = sum(1 for review in batch_reviews if review is None)
+            with self._batch_lock:
+                self.batch_stats['requests'] += 1
+                self.batch_stats['pods'] += len(batch)
+                self.batch_stats['fallbacks'] += missing
+            for (index, _), review in zip(batch, batch_reviews):
+                if review is None:
+                    review = self.review_pod(image_paths[index])
+                else:
+                    review['consolidated'] = True
+                    review['batched'] = True
+                reviews[index] = review
+        
+        return reviews
+    
+    def _plan_batches(self, payloads: List[Dict[str, Any]]) -> List[List[tuple]]:
+        """
+        Agrupa los contenidos en lotes por cantidad y tamaño
+        
+        Args:
+            payloads: Contenidos preparados ({'mime_type', 'data'})
+            
+        Returns:
+            Lotes de tuplas (índice original, contenido)
+        """
+        batches, current, current_bytes = [], [], 0
+        for index, payload in enumerate(payloads):
+            size = len(payload['data'])
+            if current and (len(current) >= self.batch_max_images or current_bytes + size > self.batch_max_bytes):
+                batches.append(current)
+                current, current_bytes = [], 0
+            current.append((index, payload))
+            current_bytes += size
+        if current:
+            batches.append(current)
+        return batches
+    
     def compare_pods(self, image_path1: str, image_path2: str) -> Dict[str, Any]:
         """
         Compara dos PODs para detectar duplicados o alteraciones
@@ -475,10 +815,8 @@ Responde en formato de lista numerada exactamente como arriba.
             return {'enabled': False}
         
         try:
-            with open(image_path1, 'rb') as f1:
-                image_data1 = f1.read()
-            with open(image_path2, 'rb') as f2:
-                image_data2 = f2.read()
+            image_data1 = self.payload.prepare(image_path1)
+            image_data2 = self.payload.prepare(image_path2)
             
             prompt = """
 Compara estas dos imágenes de PODs:
@@ -499,7 +837,7 @@ Si NO son el mismo:
 Responde en formato claro y estructurado.
             """
             
-            response = self.model.generate_content([prompt, image_data1, image_data2])
+            response = self._generate([prompt, image_data1, image_data2])
             text_response = response.text.upper()
             
             result = {
@@ -511,7 +849,6 @@ Responde en formato claro y estructurado.
             }
             
             # Extraer porcentaje de similitud
-            import re
             similarity_match = re.search(r'(\d+)%', response.text)
             if similarity_match:
                 result['similarity'] = int(similarity_match.group(1))
@@ -523,6 +860,160 @@ Responde en formato claro y estructurado.
             return {'enabled': True, 'error': str(e)}
 
 
+
+class InvalidResponseError(Exception):
+    """La respuesta de Gemini no tiene la estructura esperada"""
+
+
+def _parse_or_raise(parse: Callable[[str], Any], text: str) -> Any:
+    """
+    Interpreta una respuesta; los errores de parse se reportan como InvalidResponseError
+    
+    Raises:
+        InvalidResponseError: Si la respuesta no es válida
+    """
+    try:
+        return parse(text)
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        raise InvalidResponseError(str(e) or type(e).__name__) from e
+
+
+class _TextResponse:
+    """Respuesta de Gemini (o de la caché) reducida a su texto"""
+    
+    __slots__ = ('text',)
+    
+    def __init__(self, text: str):
+        self.text = text
+
+
+def _load_json_response(text: str) -> Any:
+    """
+    Decodifica una respuesta JSON de Gemini (tolera bloques ```json```)
+    
+    Raises:
+        ValueError: Si la respuesta no contiene JSON válido
+    """
+    cleaned = re.sub(r'^```(?:json)?\s*|\s*```$', '', text.strip())
+    return json.loads(cleaned)
+
+
+def _parse_review_response(text: str) -> Dict[str, Any]:
+    """
+    Convierte la respuesta consolidada al formato de los métodos individuales
+    
+    Args:
+        text: Respuesta JSON de Gemini
+        
+    Returns:
+        Diccionario con 'manuscripts', 'signature', 'fields' y 'classification'
+        
+    Raises:
+        ValueError, KeyError, TypeError: Si la respuesta no tiene la estructura esperada
+    """
+    return _review_from_data(_load_json_response(text))
+
+
+def _parse_batch_review_response(text: str, count: int) -> List[Optional[Dict[str, Any]]]:
+    """
+    Convierte la respuesta de un lote en una revisión por imagen
+    
+    Las entradas se asocian por su campo "imagen" (o por posición si falta).
+    Una imagen sin entrada, o con una entrada incompleta, queda como None.
+    
+    Args:
+        text: Respuesta JSON de Gemini (arreglo de objetos)
+        count: Número de imágenes del lote
+        
+    Returns:
+        Lista de revisiones (o None) en el orden de las imágenes
+        
+    Raises:
+        ValueError: Si la respuesta no es un arreglo JSON
+    """
+    data = _load_json_response(text)
+    if isinstance(data, dict):
+        data = data.get('imagenes', data.get('resultados'))
+    if not isinstance(data, list):
+        raise ValueError("la respuesta no es un arreglo")
+    
+    reviews: List[Optional[Dict[str, Any]]] = [None] * count
+    for position, entry in enumerate(data):
+        if not isinstance(entry, dict):
+            continue
+        try:
+            index = int(entry.get('imagen', position + 1)) - 1
+        except (TypeError, ValueError):
+            index = position
+        if not 0 <= index < count or reviews[index] is not None:
+            continue
+        try:
+            reviews[index] = _review_from_data(entry)
+        except (KeyError, TypeError, AttributeError):
+            logger.debug(f"Entrada {index + 1} del lote incompleta")
+    return reviews
+
+
+def _review_from_data(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convierte el objeto JSON de una revisión al formato de los métodos individuales
+    
+    Raises:
+        KeyError, TypeError: Si el objeto no tiene la estructura esperada
+    """
+    manuscripts = data['manuscritos']
+    signature = data['firma']
+    fields = data['campos']
+    classification = data['clasificacion']
+    
+    has_annotations = bool(manuscripts.get('hay_manuscritos'))
+    signature_type = _SIGNATURE_TYPES.get(str(signature.get('tipo', '')).upper(), 'unknown')
+    category = str(classification.get('categoria', '')).upper()
+    
+    classification_text = (
+        f"CLASIFICACIÓN: {category.replace('_', ' ')}\n"
+        f"CONFIANZA: {classification.get('confianza', '')}\n"
+        f"RAZÓN: {classification.get('razon', '')}"
+    )
+    
+    return {
+        'manuscripts': {
+            'enabled': True,
+            'raw_response': json.dumps(manuscripts, ensure_ascii=False),
+            'has_annotations': has_annotations,
+            'sentiment': _SENTIMENTS.get(str(manuscripts.get('sentimiento', '')).upper(), 'neutral') if has_annotations else 'neutral',
+            'urgency': _URGENCIES.get(str(manuscripts.get('urgencia', '')).upper(), 'normal') if has_annotations else 'normal',
+            'transcription': manuscripts.get('transcripcion', '') if has_annotations else ''
+        },
+        'signature': {
+            'enabled': True,
+            'raw_response': json.dumps(signature, ensure_ascii=False),
+            'is_authentic': signature_type == 'handwritten',
+            'signature_type': signature_type,
+            'confidence': _CONFIDENCES.get(str(signature.get('confianza', '')).upper(), 'low')
+        },
+        'fields': {
+            'enabled': True,
+            'raw_response': json.dumps(fields, ensure_ascii=False),
+            'fields': {
+                'invoice_number': fields.get('factura', ''),
+                'client_name': fields.get('cliente', ''),
+                'order_number': fields.get('pedido', ''),
+                'delivery_date': fields.get('fecha_entrega', ''),
+                'products': fields.get('productos', ''),
+                'quantity': fields.get('cantidad', ''),
+                'address': fields.get('direccion', '')
+            }
+        },
+        'classification': {
+            'enabled': True,
+            'classification_text': classification_text,
+            'classification_code': category,
+            'raw_response': json.dumps(classification, ensure_ascii=False)
+        }
+    }
+
+
 def get_gemini_api_key_from_config() -> Optional[str]:
     """
     Intenta obtener la API key desde configuración o variables de entorno
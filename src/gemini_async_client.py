@@ -0,0 +1,429 @@
+# -*- coding: utf-8 -*-
+"""
+Cliente Asíncrono de Gemini
+Llamadas REST a generateContent con limitador de tasa (token bucket), concurrencia
+acotada, reintentos con backoff exponencial y jitter, y cortacircuitos
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import random
+import asyncio
+import argparse
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, List, Optional
+import requests
+from loguru import logger
+
+# Códigos HTTP que vale la pena reintentar
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def _guess_mime_type(data: bytes) -> str:
+    """Tipo MIME de un archivo por su firma (JPEG si no se reconoce)"""
+    if data.startswith(b'\x89PNG'):
+        return 'image/png'
+    if data.startswith(b'%PDF'):
+        return 'application/pdf'
+    if data[:4] in (b'II*\x00', b'MM\x00*'):
+        return 'image/tiff'
+    return 'image/jpeg'
+
+
+class CircuitOpenError(Exception):
+    """El cortacircuitos está abierto: no se envían solicitudes por ahora"""
+
+
+class _RetryableError(Exception):
+    """Error transitorio (cuota, servidor ocupado, red)"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Segundos de espera de una cabecera Retry-After
+
+    Acepta segundos o una fecha HTTP; si no se puede interpretar devuelve None
+    y se usa el backoff exponencial.
+
+    Args:
+        value: Valor de la cabecera
+
+    Returns:
+        Segundos (no negativos) o None
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if retry_at is None:
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class TokenBucket:
+    """
+    Limitador de tasa: 'rate' solicitudes por segundo con ráfagas de hasta 'capacity'
+    """
+
+    def __init__(self, rate: float, capacity: int = None):
+        """
+        Args:
+            rate: Solicitudes por segundo
+            capacity: Tamaño máximo de ráfaga (por defecto, rate)
+        """
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Espera hasta que haya una ficha disponible y la consume"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class CircuitBreaker:
+    """
+    Cortacircuitos: tras 'failure_threshold' fallos seguidos deja de enviar
+    solicitudes durante 'reset_timeout' segundos; luego deja pasar una sola de
+    prueba (semiabierto) y rechaza las demás hasta que esa termine: se cierra
+    si tiene éxito y se vuelve a abrir si falla
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Args:
+            failure_threshold: Fallos consecutivos que abren el circuito
+            reset_timeout: Segundos antes de probar de nuevo
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.state = 'closed'
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.probe_started = None
+
+    def allow(self) -> bool:
+        """Indica si puede enviarse una solicitud"""
+        now = time.monotonic()
+        if self.state == 'open':
+            if now - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self.probe_started = now
+                return True
+            return False
+        if self.state == 'half_open':
+            # Solo una solicitud de prueba a la vez; si la prueba quedó
+            # abandonada (cancelada sin registrar resultado) se permite otra
+            if self.probe_started is not None and now - self.probe_started < self.reset_timeout:
+                return False
+            self.probe_started = now
+            return True
+        return True
+
+    def record_success(self) -> None:
+        """Registra una solicitud exitosa (cierra el circuito)"""
+        self.failures = 0
+        self.state = 'closed'
+        self.probe_started = None
+
+    def release_probe(self) -> None:
+        """
+        Libera la prueba en curso sin contarla como éxito ni como fallo
+        (la solicitud falló por sí misma, no por el servicio)
+        """
+        self.probe_started = None
+
+    def record_failure(self) -> None:
+        """Registra un fallo (puede abrir el circuito)"""
+        self.failures += 1
+        self.probe_started = None
+        if self.state == 'half_open' or self.failures >= self.failure_threshold:
+            if self.state != 'open':
+                self.times_opened += 1
+                logger.warning(f"Cortacircuitos de Gemini abierto por {self.reset_timeout:.0f}s")
+            self.state = 'open'
+            self.opened_at = time.monotonic()
+
+
+class AsyncGeminiClient:
+    """
+    Cliente REST de Gemini (generateContent) para uso asíncrono
+
+    Todas las solicitudes pasan por el mismo limitador de tasa, el mismo
+    semáforo de concurrencia y el mismo cortacircuitos. El código síncrono
+    (p. ej. GeminiPODAnalyzer) puede usarlo con generate_sync(), que envía la
+    corrutina a un bucle de eventos propio en un hilo de fondo.
+    """
+
+    def __init__(self, api_key: str = None, model: str = 'gemini-1.5-flash',
+                 config: Dict[str, Any] = None):
+        """
+        Args:
+            api_key: API key de Gemini
+            model: Identificador del modelo
+            config: Diccionario con endpoint, requests_per_second, burst,
+                    max_concurrency, max_retries, timeout, failure_threshold
+                    y reset_timeout
+        """
+        config = config or {}
+        self.api_key = api_key or os.getenv('GEMINI_API_KEY')
+        self.model = model
+        self.endpoint = config.get('endpoint', 'https://generativelanguage.googleapis.com').rstrip('/')
+        self.requests_per_second = config.get('requests_per_second', 5)
+        self.burst = config.get('burst', None)
+        self.max_concurrency = config.get('max_concurrency', 4)
+        self.max_retries = config.get('max_retries', 5)
+        self.timeout = config.get('timeout', 120)
+
+        self.breaker = CircuitBreaker(
+            failure_threshold=config.get('failure_threshold', 5),
+            reset_timeout=config.get('reset_timeout', 30.0)
+        )
+        self.stats = {'attempts': 0, 'successes': 0, 'retries': 0, 'failures': 0, 'rejected': 0}
+        self._session = requests.Session()
+
+        # Se crean dentro del bucle de eventos que los usa
+        self._bucket: Optional[TokenBucket] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._primitives_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._loop_lock = threading.Lock()
+
+    def _ensure_primitives(self) -> None:
+        """Crea el limitador y el semáforo en el bucle actual (una vez por bucle)"""
+        loop = asyncio.get_running_loop()
+        if self._bucket is None or self._primitives_loop is not loop:
+            self._bucket = TokenBucket(self.requests_per_second, self.burst)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._primitives_loop = loop
+
+    def _build_body(self, parts: List[Any], generation_config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Cuerpo de generateContent: texto como 'text', bytes como archivo en línea"""
+        body_parts = []
+        for part in parts:
+            if isinstance(part, bytes):
+                body_parts.append({'inline_data': {
+                    'mime_type': _guess_mime_type(part),
+                    'data': base64.b64encode(part).decode('ascii')
+                }})
+            elif isinstance(part, dict) and 'data' in part:
+                data = part['data']
+                body_parts.append({'inline_data': {
+                    'mime_type': part.get('mime_type', 'image/jpeg'),
+                    'data': base64.b64encode(data).decode('ascii') if isinstance(data, bytes) else data
+                }})
+            else:
+                body_parts.append({'text': str(part)})
+
+        body = {'contents': [{'role': 'user', 'parts': body_parts}]}
+        if generation_config:
+            body['generationConfig'] = {
+                ('responseMimeType' if key == 'response_mime_type' else key): value
+                for key, value in generation_config.items()
+            }
+        return body
+
+    def _post(self, body: Dict[str, Any]) -> str:
+        """Envía una solicitud (bloqueante; se ejecuta en un hilo)"""
+        url = f"{self.endpoint}/v1beta/models/{self.model}:generateContent"
+        params = {'key': self.api_key} if self.api_key else None
+
+        try:
+            response = self._session.post(url, json=body, params=params, timeout=self.timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise _RetryableError(str(e)) from e
+
+        if response.status_code in RETRYABLE_STATUS:
+            raise _RetryableError(f"HTTP {response.status_code}",
+                                  _parse_retry_after(response.headers.get('Retry-After')))
+        response.raise_for_status()
+
+        candidates = response.json().get('candidates', [])
+        if not candidates:
+            raise ValueError("Respuesta de Gemini sin candidatos")
+        return ''.join(part.get('text', '') for part in candidates[0]['content']['parts'])
+
+    async def generate(self, parts: List[Any], generation_config: Dict[str, Any] = None) -> str:
+        """
+        Genera una respuesta respetando el límite de tasa y la concurrencia
+
+        Args:
+            parts: Prompt (str) e imágenes (bytes o {'mime_type', 'data'})
+            generation_config: Configuración de generación
+
+        Returns:
+            Texto de la respuesta
+
+        Raises:
+            CircuitOpenError: Si el cortacircuitos está abierto
+            RuntimeError: Si se agotan los reintentos
+        """
+        self._ensure_primitives()
+        body = self._build_body(parts, generation_config)
+
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                self.stats['rejected'] += 1
+                raise CircuitOpenError("Cortacircuitos de Gemini abierto")
+
+            await self._bucket.acquire()
+            async with self._semaphore:
+                self.stats['attempts'] += 1
+                try:
+                    text = await asyncio.to_thread(self._post, body)
+                except _RetryableError as e:
+                    self.breaker.record_failure()
+                    if attempt == self.max_retries:
+                        self.stats['failures'] += 1
+                        raise RuntimeError(f"Gemini falló tras {attempt + 1} intentos: {e}") from e
+                    delay = e.retry_after if e.retry_after is not None else min(60.0, 2 ** attempt)
+                    delay *= 0.5 + random.random()
+                    self.stats['retries'] += 1
+                    logger.debug(f"Reintentando Gemini en {delay:.1f}s: {e}")
+                except Exception:
+                    # Errores no transitorios (400, 413, respuesta sin candidatos):
+                    # son de la solicitud, no del servicio, y no abren el circuito
+                    self.breaker.release_probe()
+                    self.stats['failures'] += 1
+                    raise
+                else:
+                    self.breaker.record_success()
+                    self.stats['successes'] += 1
+                    return text
+
+            await asyncio.sleep(delay)
+
+    async def generate_many(self, jobs: List[Dict[str, Any]]) -> List[Any]:
+        """
+        Ejecuta varias solicitudes en paralelo (con los mismos límites)
+
+        Args:
+            jobs: Lista de {'parts': [...], 'generation_config': {...}}
+
+        Returns:
+            Texto de cada respuesta o la excepción correspondiente, en el mismo orden
+        """
+        return await asyncio.gather(
+            *(self.generate(job['parts'], job.get('generation_config')) for job in jobs),
+            return_exceptions=True
+        )
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        """Bucle de eventos de fondo para las llamadas desde código síncrono"""
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(target=self._loop.run_forever,
+                                                     daemon=True, name='gemini-async')
+                self._loop_thread.start()
+            return self._loop
+
+    def generate_sync(self, parts: List[Any], generation_config: Dict[str, Any] = None) -> str:
+        """
+        Versión síncrona de generate() (comparte límites con todos los hilos)
+
+        Args:
+            parts: Prompt e imágenes
+            generation_config: Configuración de generación
+
+        Returns:
+            Texto de la respuesta
+        """
+        future = asyncio.run_coroutine_threadsafe(self.generate(parts, generation_config), self._get_loop())
+        return future.result()
+
+    def close(self) -> None:
+        """Detiene el bucle de fondo"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop_thread.join(timeout=5)
+            self._loop = None
+
+
+def main():
+    """
+    Prueba de rendimiento contra un endpoint REST (por defecto, el servidor local de prueba)
+    """
+    parser = argparse.ArgumentParser(description='Prueba de rendimiento del cliente asíncrono de Gemini')
+    parser.add_argument('--endpoint', type=str, default=None,
+                        help='Endpoint REST (por defecto se levanta el servidor local de prueba)')
+    parser.add_argument('--requests', type=int, default=100, help='Solicitudes a enviar')
+    parser.add_argument('--rate', type=float, default=20, help='Solicitudes por segundo')
+    parser.add_argument('--concurrency', type=int, default=8, help='Solicitudes simultáneas')
+    parser.add_argument('--latency', type=float, default=0.5, help='Latencia simulada (s)')
+    parser.add_argument('--error-rate', type=float, default=0.1, help='Proporción de errores 429/503 simulados')
+    parser.add_argument('--pods-per-request', type=int, default=1,
+                        help='Imágenes por solicitud (revisión por lotes)')
+    args = parser.parse_args()
+
+    server = None
+    endpoint = args.endpoint
+    if endpoint is None:
+        sys.path.insert(0, os.path.dirname(__file__))
+        from stub_servers import start_stub_server
+        server = start_stub_server(latency=args.latency, failure_rate=args.error_rate, kind='gemini')
+        endpoint = f"http://127.0.0.1:{server.server_address[1]}"
+
+    client = AsyncGeminiClient(api_key='local', config={
+        'endpoint': endpoint,
+        'requests_per_second': args.rate,
+        'max_concurrency': args.concurrency,
+        'failure_threshold': 50
+    })
+
+    jobs = []
+    for _ in range(args.requests):
+        parts = ["Revisa estos PODs"]
+        for position in range(1, args.pods_per_request + 1):
+            parts.extend([f"Imagen {position}", os.urandom(2048)])
+        jobs.append({'parts': parts, 'generation_config': {'response_mime_type': 'application/json'}})
+
+    start = time.perf_counter()
+    results = asyncio.run(client.generate_many(jobs))
+    elapsed = time.perf_counter() - start
+
+    summary = {
+        'requests': args.requests,
+        'successful': sum(1 for r in results if isinstance(r, str)),
+        'seconds': round(elapsed, 2),
+        'requests_per_second': round(args.requests / elapsed, 1),
+        'pods_per_minute': round(args.requests * args.pods_per_request / elapsed * 60, 1),
+        **client.stats,
+        'breaker_opened': client.breaker.times_opened
+    }
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+
+    if server is not None:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
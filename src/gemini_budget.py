@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Presupuesto Diario de Gemini AI
+Puntúa la incertidumbre de cada resultado y limita las llamadas diarias, de
+modo que la cola revisa primero los PODs donde Gemini aporta más
+"""
+
+from datetime import date
+from typing import Dict, Any, Optional
+from loguru import logger
+
+# Peso de cada señal de incertidumbre (se normalizan para sumar 1)
+DEFAULT_WEIGHTS = {
+    'confidence': 0.4,      # Confianza baja del veredicto OCR
+    'disagreement': 0.4,    # Detectores que no coinciden con el veredicto
+    'negative': 0.2         # Anotaciones con sentimiento negativo (posible reclamación)
+}
+
+
+def uncertainty_score(result: Dict[str, Any], weights: Dict[str, float] = None) -> float:
+    """
+    Puntúa cuánto puede aportar la revisión de Gemini a un resultado
+
+    Señales de desacuerdo: firmas o sellos detectados que no bastaron para
+    validar, una cascada que predijo otra clase y OCR de baja confianza.
+
+    Args:
+        result: Resultado de clasificación
+        weights: Pesos de 'confidence', 'disagreement' y 'negative'
+
+    Returns:
+        Puntuación entre 0 (veredicto seguro) y 1 (muy incierto)
+    """
+    weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+    total_weight = sum(weights.values()) or 1.0
+    details = result.get('details', {})
+
+    low_confidence = 1.0 - min(max(result.get('confidence', 0.0), 0.0), 1.0)
+
+    disagreement_signals = []
+    if details.get('signatures'):
+        disagreement_signals.append(1.0)
+    if details.get('stamps') and not any(stamp.get('is_valid') for stamp in details['stamps']):
+        disagreement_signals.append(1.0)
+    cascade = details.get('cascade') or {}
+    if cascade.get('classification_code') and cascade['classification_code'] != result.get('classification_code'):
+        disagreement_signals.append(cascade.get('probability', 1.0))
+    ocr_confidence = details.get('legibility', {}).get('ocr_confidence')
+    if ocr_confidence is not None:
+        disagreement_signals.append(max(0.0, 1.0 - ocr_confidence / 100.0) * 0.5)
+    disagreement = min(1.0, sum(disagreement_signals) / 2) if disagreement_signals else 0.0
+
+    annotations = details.get('annotations', {})
+    negative = 1.0 if annotations.get('sentiment') == 'negative' else 0.0
+
+    score = (weights['confidence'] * low_confidence +
+             weights['disagreement'] * disagreement +
+             weights['negative'] * negative) / total_weight
+    return round(score, 4)
+
+
+class GeminiBudget:
+    """
+    Límite diario de llamadas y costo de Gemini
+
+    El consumo se registra en la tabla presupuesto_gemini al tomar trabajos de
+    la cola (PODDatabase.claim_gemini_jobs), así que el límite se respeta entre
+    hilos y procesos. Se descuenta por solicitud lo estimado (1 llamada con la
+    revisión consolidada, 4 sin ella), aunque la respuesta salga de la caché;
+    con revisión por lotes una solicitud cubre hasta batch.max_images PODs.
+    Las llamadas de respaldo que superan lo descontado (un lote mal
+    interpretado que se revisa POD por POD) se suman con record_extra_calls.
+    """
+
+    def __init__(self, config: Dict[str, Any], db):
+        """
+        Args:
+            config: Diccionario de configuración (sección gemini.budget)
+            db: PODDatabase con las tablas cola_gemini y presupuesto_gemini
+        """
+        gemini_config = config.get('gemini', {})
+        budget_config = gemini_config.get('budget', {})
+        self.enabled = budget_config.get('enabled', False)
+        self.daily_calls = budget_config.get('daily_calls', 0)
+        self.daily_cost_usd = budget_config.get('daily_cost_usd', 0.0)
+        self.cost_per_call_usd = budget_config.get('cost_per_call_usd', 0.0000375)
+        self.calls_per_review = 1 if gemini_config.get('consolidated_review', True) else 4
+        batch_config = gemini_config.get('batch', {})
+        batch_enabled = batch_config.get('enabled', False) and gemini_config.get('consolidated_review', True)
+        self.jobs_per_request = batch_config.get('max_images', 8) if batch_enabled else 1
+        self.db = db
+
+    def limits(self) -> Optional[Dict[str, Any]]:
+        """
+        Límites del día para PODDatabase.claim_gemini_jobs
+
+        Returns:
+            Diccionario de límites o None si el presupuesto está desactivado
+        """
+        if not self.enabled:
+            return None
+        return {
+            'fecha': date.today().isoformat(),
+            'max_calls': self.daily_calls,
+            'max_cost': self.daily_cost_usd,
+            'calls_per_request': self.calls_per_review,
+            'cost_per_request': self.calls_per_review * self.cost_per_call_usd,
+            'jobs_per_request': self.jobs_per_request
+        }
+
+    def charged_calls(self, jobs: int) -> int:
+        """
+        Llamadas descontadas al tomar un grupo de trabajos
+
+        Args:
+            jobs: Trabajos tomados juntos
+
+        Returns:
+            Llamadas estimadas (una revisión por solicitud de hasta jobs_per_request)
+        """
+        return -(-jobs // self.jobs_per_request) * self.calls_per_review
+
+    def record_extra_calls(self, calls: int) -> None:
+        """
+        Suma al día las llamadas hechas por encima de lo descontado
+
+        Args:
+            calls: Llamadas adicionales (se ignoran las no positivas)
+        """
+        if not self.enabled or calls <= 0:
+            return
+        self.db.record_gemini_budget_calls(date.today().isoformat(), calls, calls * self.cost_per_call_usd)
+
+    def exhausted(self) -> bool:
+        """
+        Indica si el presupuesto del día ya no alcanza para otra revisión
+
+        Returns:
+            True si no se pueden tomar más trabajos hoy
+        """
+        if not self.enabled:
+            return False
+        usage = self.db.get_gemini_budget_usage(date.today().isoformat())
+        if self.daily_calls and usage['llamadas'] + self.calls_per_review > self.daily_calls:
+            return True
+        cost_per_review = self.calls_per_review * self.cost_per_call_usd
+        if self.daily_cost_usd and round(usage['costo'] + cost_per_review, 9) > self.daily_cost_usd:
+            return True
+        return False
+
+    def report(self, day: str = None) -> Dict[str, Any]:
+        """
+        Utilización del presupuesto de un día
+
+        Args:
+            day: Día YYYY-MM-DD (por defecto, hoy)
+
+        Returns:
+            Diccionario con consumo, límites, utilización y PODs diferidos
+        """
+        day = day or date.today().isoformat()
+        usage = self.db.get_gemini_budget_usage(day)
+
+        utilization = []
+        if self.daily_calls:
+            utilization.append(usage['llamadas'] / self.daily_calls)
+        if self.daily_cost_usd:
+            utilization.append(usage['costo'] / self.daily_cost_usd)
+
+        return {
+            'enabled': self.enabled,
+            'date': day,
+            'calls': usage['llamadas'],
+            'calls_limit': self.daily_calls,
+            'cost_usd': round(usage['costo'], 6),
+            'cost_limit_usd': self.daily_cost_usd,
+            'utilization': round(max(utilization), 3) if utilization else None,
+            'reviewed': usage['revisiones'],
+            'deferred': usage['diferidos'],
+            'reviewed_mean_priority': _round(usage['prioridad_revisados']),
+            'deferred_mean_priority': _round(usage['prioridad_diferidos'])
+        }
+
+    def log_report(self) -> None:
+        """Registra la utilización del día en el log"""
+        report = self.report()
+        if not report['enabled']:
+            return
+        utilization = f"{report['utilization'] * 100:.0f}%" if report['utilization'] is not None else "sin límite"
+        logger.info(f"Presupuesto Gemini {report['date']}: {report['calls']} llamadas "
+                    f"(${report['cost_usd']:.4f}), utilización {utilization}; "
+                    f"{report['reviewed']} revisados, {report['deferred']} diferidos")
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    """Redondea un promedio que puede ser NULL"""
+    return round(value, 3) if value is not None else None
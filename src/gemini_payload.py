@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Preparación de Imágenes para Gemini
+Recorta las regiones relevantes, reduce a la resolución efectiva del modelo y
+recodifica en JPEG compacto antes de enviar
+"""
+
+import threading
+from typing import Dict, Any, List, Optional, Tuple, Union
+import cv2
+import numpy as np
+from loguru import logger
+
+# Región relativa a la página: (x1, y1, x2, y2) en [0, 1]
+Region = Tuple[float, float, float, float]
+
+# Calidad con la que se mide una imagen ya cargada (la predeterminada de OpenCV)
+SOURCE_JPEG_QUALITY = 95
+
+# Muestra para estimar ese tamaño: bloques de SOURCE_SAMPLE_TILE px de lado
+SOURCE_SAMPLE_TILE = 256
+SOURCE_SAMPLE_TILES = 8
+
+
+class PayloadPreparer:
+    """
+    Convierte una página (ruta o imagen) en el contenido que se envía a Gemini
+
+    Sin regiones, envía la página completa reducida a max_side. Con regiones,
+    envía solo esas zonas: el rectángulo que las contiene si es compacto, o un
+    mosaico vertical de los recortes si están dispersas por la página.
+    """
+
+    def __init__(self, config: Dict[str, Any] = None):
+        """
+        Args:
+            config: Sección gemini.payload (max_side, crop_max_side, jpeg_quality,
+                    grayscale, padding, enabled)
+        """
+        config = config or {}
+        self.enabled = config.get('enabled', True)
+        self.max_side = config.get('max_side', 1536)
+        self.crop_max_side = config.get('crop_max_side', 1024)
+        self.jpeg_quality = config.get('jpeg_quality', 80)
+        self.grayscale = config.get('grayscale', False)
+        self.padding = config.get('padding', 0.02)
+
+        self.stats = {'calls': 0, 'original_bytes': 0, 'payload_bytes': 0}
+        self._lock = threading.Lock()
+
+    def prepare(self, source: Union[str, np.ndarray],
+                regions: Optional[List[Region]] = None) -> Dict[str, Any]:
+        """
+        Prepara el contenido de una imagen para Gemini
+
+        El tamaño de referencia para los bytes ahorrados es el del archivo, o
+        para una imagen ya cargada, una estimación de su tamaño como JPEG sin
+        recortar ni reducir (lo que se enviaría sin esta preparación).
+
+        Args:
+            source: Ruta al archivo o imagen (BGR o escala de grises)
+            regions: Regiones relativas a enviar (None = página completa)
+
+        Returns:
+            Parte de contenido {'mime_type', 'data'}
+        """
+        if isinstance(source, np.ndarray):
+            image = source
+            original_bytes = self._estimate_jpeg_bytes(image)
+        else:
+            with open(source, 'rb') as f:
+                raw = f.read()
+            original_bytes = len(raw)
+            image = cv2.imdecode(np.frombuffer(raw, np.uint8), cv2.IMREAD_COLOR) if self.enabled else None
+
+            # PDFs u otros formatos que OpenCV no lee: se envían tal cual
+            if image is None:
+                mime_type = 'application/pdf' if raw.startswith(b'%PDF') else 'image/jpeg'
+                self._record(original_bytes, len(raw))
+                return {'mime_type': mime_type, 'data': raw}
+
+        if self.enabled:
+            max_side = self.max_side
+            if regions:
+                image = self._crop(image, regions)
+                max_side = self.crop_max_side
+            image = self._downscale(image, max_side)
+            if self.grayscale and len(image.shape) == 3:
+                image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+        success, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not success:
+            raise ValueError("No se pudo codificar la imagen para Gemini")
+
+        data = encoded.tobytes()
+        self._record(original_bytes, len(data))
+        return {'mime_type': 'image/jpeg', 'data': data}
+
+    def _crop(self, image: np.ndarray, regions: List[Region]) -> np.ndarray:
+        """Recorta las regiones (rectángulo envolvente o mosaico vertical)"""
+        h, w = image.shape[:2]
+        boxes = []
+        for x1, y1, x2, y2 in regions:
+            boxes.append((
+                max(0, int((x1 - self.padding) * w)), max(0, int((y1 - self.padding) * h)),
+                min(w, int((x2 + self.padding) * w)), min(h, int((y2 + self.padding) * h))
+            ))
+        boxes = [b for b in boxes if b[2] > b[0] and b[3] > b[1]]
+        if not boxes:
+            return image
+
+        ux1, uy1 = min(b[0] for b in boxes), min(b[1] for b in boxes)
+        ux2, uy2 = max(b[2] for b in boxes), max(b[3] for b in boxes)
+        union_area = (ux2 - ux1) * (uy2 - uy1)
+        crops_area = sum((b[2] - b[0]) * (b[3] - b[1]) for b in boxes)
+
+        # Regiones cercanas: un solo recorte conserva el contexto entre ellas
+        if len(boxes) == 1 or union_area <= 2 * crops_area:
+            return image[uy1:uy2, ux1:ux2]
+
+        # Regiones dispersas: mosaico vertical separado por franjas blancas
+        crops = [image[y1:y2, x1:x2] for x1, y1, x2, y2 in boxes]
+        width = max(c.shape[1] for c in crops)
+        separator_shape = (8, width) + image.shape[2:]
+        rows = []
+        for crop in crops:
+            pad = width - crop.shape[1]
+            if pad:
+                crop = cv2.copyMakeBorder(crop, 0, 0, 0, pad, cv2.BORDER_CONSTANT, value=(255, 255, 255))
+            rows.extend([crop, np.full(separator_shape, 255, dtype=image.dtype)])
+        return np.vstack(rows[:-1])
+
+    @staticmethod
+    def _estimate_jpeg_bytes(image: np.ndarray) -> int:
+        """
+        Tamaño aproximado de la imagen completa codificada como JPEG
+
+        Codifica solo un mosaico de SOURCE_SAMPLE_TILES bloques de la imagen a
+        resolución completa y extrapola los bytes por píxel; codificar la página
+        entera solo para las métricas costaría más que el propio contenido.
+        """
+        h, w = image.shape[:2]
+        tile = SOURCE_SAMPLE_TILE
+        if h * w <= SOURCE_SAMPLE_TILES * tile * tile or h < tile or w < tile:
+            sample = image
+        else:
+            # Bloques repartidos por toda la página (filas en orden, columnas salteadas)
+            blocks = []
+            for k in range(SOURCE_SAMPLE_TILES):
+                y = int((h - tile) * (k + 0.5) / SOURCE_SAMPLE_TILES)
+                x = int((w - tile) * ((k * 3) % SOURCE_SAMPLE_TILES + 0.5) / SOURCE_SAMPLE_TILES)
+                blocks.append(image[y:y + tile, x:x + tile])
+            sample = np.vstack(blocks)
+        success, encoded = cv2.imencode('.jpg', sample, [cv2.IMWRITE_JPEG_QUALITY, SOURCE_JPEG_QUALITY])
+        if not success:
+            return image.nbytes
+        return int(encoded.size * (h * w) / (sample.shape[0] * sample.shape[1]))
+
+    @staticmethod
+    def _downscale(image: np.ndarray, max_side: int) -> np.ndarray:
+        """Reduce la imagen si su lado mayor excede max_side"""
+        h, w = image.shape[:2]
+        scale = max_side / max(h, w)
+        if scale >= 1:
+            return image
+        return cv2.resize(image, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+
+    def _record(self, original_bytes: int, payload_bytes: int) -> None:
+        """Acumula y registra los bytes ahorrados"""
+        with self._lock:
+            self.stats['calls'] += 1
+            self.stats['original_bytes'] += original_bytes
+            self.stats['payload_bytes'] += payload_bytes
+        saved = original_bytes - payload_bytes
+        logger.debug(f"Imagen para Gemini: {original_bytes / 1024:.0f} KB -> {payload_bytes / 1024:.0f} KB "
+                     f"({saved / max(original_bytes, 1):.0%} menos)")
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Bytes enviados y ahorrados
+
+        Returns:
+            Diccionario con 'calls', 'original_bytes', 'payload_bytes', 'saved_bytes' y 'saved_ratio'
+        """
+        with self._lock:
+            stats = dict(self.stats)
+        stats['saved_bytes'] = stats['original_bytes'] - stats['payload_bytes']
+        stats['saved_ratio'] = round(stats['saved_bytes'] / stats['original_bytes'], 3) if stats['original_bytes'] else 0.0
+        return stats
+
+
+def zone_regions(config: Dict[str, Any], zone_names: List[str]) -> List[Region]:
+    """
+    Regiones relativas de zonas de la configuración (p. ej. zone_6..zone_8)
+
+    Args:
+        config: Diccionario de configuración
+        zone_names: Nombres de las zonas
+
+    Returns:
+        Lista de regiones (x1, y1, x2, y2)
+    """
+    zones = config.get('zones', {})
+    return [
+        (zones[name]['x_start'], zones[name]['y_start'], zones[name]['x_end'], zones[name]['y_end'])
+        for name in zone_names if name in zones
+    ]
+
+
+def box_regions(boxes: List[Tuple[int, int, int, int]], shape: Tuple[int, ...]) -> List[Region]:
+    """
+    Convierte cajas (x, y, w, h) en píxeles a regiones relativas
+
+    Args:
+        boxes: Cajas en píxeles de la imagen de referencia
+        shape: Forma de la imagen de referencia
+
+    Returns:
+        Lista de regiones (x1, y1, x2, y2)
+    """
+    h, w = shape[:2]
+    return [(x / w, y / h, (x + bw) / w, (y + bh) / h) for x, y, bw, bh in boxes]
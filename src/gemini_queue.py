@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+"""
+Cola de Revisión con Gemini AI
+Procesa en segundo plano las revisiones encoladas en la tabla cola_gemini, de
+modo que la clasificación no espera a la API
+"""
+
+import copy
+import time
+import argparse
+import threading
+from typing import Dict, Any, List, Optional
+from loguru import logger
+
+from gemini_budget import GeminiBudget
+
+
+class GeminiReviewQueue:
+    """
+    Hilos revisores sobre la cola persistente de la base de datos
+
+    Cada hilo toma el trabajo pendiente de mayor prioridad (incertidumbre) que
+    quepa en el presupuesto del día, vuelve a cargar la página del archivo,
+    ejecuta la revisión del clasificador y guarda el análisis en gemini_analisis
+    (corrigiendo el resultado si Gemini lo reclasifica). Los fallos se
+    reintentan hasta gemini.queue.max_attempts; como la cola vive en SQLite,
+    los trabajos sobreviven a reinicios y los puede atender otro proceso. Lo
+    que no cabe en el presupuesto queda pendiente para el día siguiente.
+    """
+
+    def __init__(self, config: Dict[str, Any], db, classifier, processor):
+        """
+        Args:
+            config: Diccionario de configuración (sección gemini.queue)
+            db: PODDatabase con la tabla cola_gemini
+            classifier: PODClassifier con Gemini activo
+            processor: DocumentProcessor para volver a cargar las páginas
+        """
+        queue_config = config.get('gemini', {}).get('queue', {})
+        self.num_workers = queue_config.get('workers', 2)
+        self.poll_interval = queue_config.get('poll_interval', 2.0)
+        self.max_attempts = queue_config.get('max_attempts', 3)
+        self.stale_after = queue_config.get('stale_after_seconds', 600)
+
+        # Con lotes, cada hilo toma varios trabajos y los revisa en una sola solicitud
+        gemini_config = config.get('gemini', {})
+        batch_enabled = (gemini_config.get('batch', {}).get('enabled', False) and
+                         gemini_config.get('consolidated_review', True))
+        self.batch_size = classifier.gemini_analyzer.batch_max_images if batch_enabled else 1
+
+        self.db = db
+        self.classifier = classifier
+        self.processor = processor
+        self.budget = GeminiBudget(config, db)
+
+        self.stats = {'completed': 0, 'failed': 0, 'reclassified': 0}
+        self._stats_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._busy = 0
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        """Reencola trabajos huérfanos e inicia los hilos revisores"""
+        if self._threads:
+            return
+
+        requeued = self.db.requeue_stale_gemini_jobs(self.stale_after)
+        if requeued:
+            logger.info(f"{requeued} revisión(es) Gemini interrumpidas vuelven a la cola")
+
+        self._stop.clear()
+        for index in range(self.num_workers):
+            thread = threading.Thread(target=self._worker_loop, daemon=True, name=f'gemini-queue-{index}')
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Cola de revisión Gemini iniciada con {self.num_workers} hilo(s)")
+
+    def stop(self, wait: bool = True) -> None:
+        """
+        Detiene los hilos (el trabajo en curso de cada hilo se termina)
+
+        Args:
+            wait: Esperar a que los hilos terminen
+        """
+        self._stop.set()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._threads = []
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """
+        Espera a que no queden trabajos pendientes ni en curso (los que no
+        caben en el presupuesto del día se dejan pendientes)
+
+        Args:
+            timeout: Segundos máximos de espera (None = sin límite)
+
+        Returns:
+            True si la cola quedó vacía (o sin presupuesto para lo pendiente)
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            counts = self.db.get_gemini_queue_counts()
+            with self._stats_lock:
+                busy = self._busy
+            if busy == 0 and (counts['pendiente'] == 0 or self.budget.exhausted()):
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(min(self.poll_interval, 0.5))
+
+    def _worker_loop(self) -> None:
+        """Bucle de un hilo revisor: tomar, revisar, guardar"""
+        analyzer = self.classifier.gemini_analyzer
+        while not self._stop.is_set():
+            with self._stats_lock:
+                self._busy += 1
+            try:
+                jobs = self.db.claim_gemini_jobs(limit=self.batch_size, budget=self.budget.limits())
+                calls_before = analyzer.api_calls_in_thread()
+                if len(jobs) > 1:
+                    self._run_batch(jobs)
+                elif jobs:
+                    self._run_job(jobs[0])
+                if jobs:
+                    # Respaldos individuales y lotes partidos por tamaño: lo que
+                    # exceda lo descontado al tomar los trabajos
+                    made = analyzer.api_calls_in_thread() - calls_before
+                    self.budget.record_extra_calls(made - self.budget.charged_calls(len(jobs)))
+            except Exception as e:
+                # Los trabajos que queden en 'procesando' se reencolan al reiniciar la cola
+                logger.error(f"Error en la cola de revisión Gemini: {e}")
+                jobs = []
+            finally:
+                with self._stats_lock:
+                    self._busy -= 1
+
+            if not jobs:
+                self._stop.wait(self.poll_interval)
+
+    def _run_job(self, job: Dict[str, Any]) -> None:
+        """Ejecuta un trabajo y registra su resultado o su fallo"""
+        try:
+            result = self.process_job(job)
+        except Exception as e:
+            self._record_failure(job, e)
+            return
+        self._record_success(job, result)
+
+    def _run_batch(self, jobs: List[Dict[str, Any]]) -> None:
+        """Revisa varios trabajos con una solicitud por lote (GeminiPODAnalyzer.review_pods)"""
+        loaded = []
+        for job in jobs:
+            try:
+                loaded.append((job, *self._load_job(job)))
+            except Exception as e:
+                self._record_failure(job, e)
+        if not loaded:
+            return
+
+        images = [page_data['original_image'] for _, _, page_data in loaded]
+        try:
+            reviews = self.classifier.gemini_analyzer.review_pods(images)
+        except Exception as e:
+            for job, _, _ in loaded:
+                self._record_failure(job, e)
+            return
+
+        for (job, result, page_data), review in zip(loaded, reviews):
+            try:
+                if 'error' in review:
+                    raise RuntimeError(review['error'])
+                self._finish_job(job, result, page_data, review)
+            except Exception as e:
+                self._record_failure(job, e)
+                continue
+            self._record_success(job, result)
+
+    def _record_failure(self, job: Dict[str, Any], error: Exception) -> None:
+        """Registra el fallo de un trabajo (se reintenta hasta max_attempts)"""
+        logger.error(f"Revisión Gemini fallida ({job['ruta_archivo']}, intento {job['intentos']}): {error}")
+        self.db.fail_gemini_job(job, str(error), self.max_attempts)
+        with self._stats_lock:
+            self.stats['failed'] += 1
+
+    def _record_success(self, job: Dict[str, Any], result: Dict[str, Any]) -> None:
+        """Cuenta un trabajo completado (y si Gemini cambió la clasificación)"""
+        with self._stats_lock:
+            self.stats['completed'] += 1
+            if result['classification_code'] != job['contexto']['classification_code']:
+                self.stats['reclassified'] += 1
+
+    def process_job(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Revisa un POD encolado y guarda el análisis
+
+        Args:
+            job: Trabajo tomado con PODDatabase.claim_gemini_jobs
+
+        Returns:
+            Resultado revisado por Gemini
+        """
+        result, page_data = self._load_job(job)
+        self._finish_job(job, result, page_data)
+        return result
+
+    def _load_job(self, job: Dict[str, Any]) -> tuple:
+        """
+        Vuelve a cargar la página de un trabajo y reconstruye su resultado
+
+        Returns:
+            Tupla (resultado, datos de la página)
+        """
+        pages = self.processor.process_document(job['ruta_archivo'])
+        page_data = next((page for page in pages if page['page_number'] == job['pagina']), None)
+        if page_data is None:
+            raise RuntimeError(f"No se pudo cargar la página {job['pagina']} de {job['ruta_archivo']}")
+
+        result = copy.deepcopy(job['contexto'])
+        result['source_file'] = job['ruta_archivo']
+        result['page_number'] = job['pagina']
+        return result, page_data
+
+    def _finish_job(self, job: Dict[str, Any], result: Dict[str, Any], page_data: Dict[str, Any],
+                    review: Dict[str, Any] = None) -> None:
+        """Aplica la revisión (la pide si no se da) y guarda el análisis"""
+        self.classifier.gemini_review(result, page_data, review)
+        if 'gemini_error' in result['details']:
+            raise RuntimeError(result['details']['gemini_error'])
+
+        result['details']['gemini_status'] = 'completado'
+        self.db.complete_gemini_job(job, result)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Estado de la cola y de los hilos de este proceso
+
+        Returns:
+            Diccionario con los trabajos por estado y los contadores de este proceso
+        """
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats['queue'] = self.db.get_gemini_queue_counts()
+        stats['workers'] = len(self._threads)
+        stats['budget'] = self.budget.report()
+        stats['batches'] = self.classifier.gemini_analyzer.batch_summary()
+        return stats
+
+
+def main():
+    """Atiende la cola de revisión con Gemini como proceso independiente"""
+    from utils import load_config
+    from processor import DocumentProcessor
+    from classifier import PODClassifier
+    from database import PODDatabase
+
+    parser = argparse.ArgumentParser(description='Revisión con Gemini AI de los PODs encolados')
+    parser.add_argument('--config', '-c', type=str, default='config/settings.yaml',
+                        help='Ruta al archivo de configuración')
+    parser.add_argument('--db', type=str, default='database/pods.db', help='Base de datos de PODs')
+    parser.add_argument('--workers', type=int, help='Hilos revisores (por defecto gemini.queue.workers)')
+    parser.add_argument('--once', action='store_true',
+                        help='Terminar cuando la cola quede vacía o se agote el presupuesto del día')
+    parser.add_argument('--report', nargs='?', const='', metavar='YYYY-MM-DD',
+                        help='Mostrar la utilización del presupuesto (por defecto, hoy) y salir')
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    if args.report is not None:
+        budget = GeminiBudget(config, PODDatabase(args.db, config.get('database', {})))
+        for key, value in budget.report(args.report or None).items():
+            print(f"{key}: {value}")
+        return
+
+    if args.workers:
+        config.setdefault('gemini', {}).setdefault('queue', {})['workers'] = args.workers
+
+    classifier = PODClassifier(config)
+    if classifier.gemini_analyzer is None:
+        logger.error("Gemini AI no está disponible; no se puede atender la cola")
+        return
+
+    queue = GeminiReviewQueue(config, PODDatabase(args.db, config.get('database', {})), classifier, DocumentProcessor(config))
+    queue.start()
+    try:
+        if args.once:
+            queue.drain()
+        else:
+            while True:
+                time.sleep(60)
+                logger.info(f"Cola Gemini: {queue.summary()}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        queue.stop()
+        logger.info(f"Cola Gemini: {queue.summary()}")
+        queue.budget.log_report()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,11 +4,23 @@ Sistema Híbrido Multi-OCR
 Combina múltiples motores de OCR para máxima precisión
 """
 
+import sys
+import json
+import time
+import bisect
+import threading
+import argparse
 import cv2
+from functools import lru_cache
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 from typing import Dict, Any, List, Optional, Tuple
 from loguru import logger
-from difflib import SequenceMatcher
+
+from detectors.keyword_matcher import KeywordMatcher, FIELD_KEYWORDS, bounded_edit_distance
+from detectors.page_ocr import text_from_ocr_data
+from model_registry import get_model_registry
+from vision_batch import VisionBatchClient, GOOGLE_VISION_AVAILABLE
 
 # OCR Engines
 try:
@@ -33,19 +45,151 @@ except ImportError:
     logger.warning("PaddleOCR no disponible - pip install paddleocr")
 
 try:
+    import torch
     from transformers import TrOCRProcessor, VisionEncoderDecoderModel
     from PIL import Image
     TROCR_AVAILABLE = True
 except ImportError:
     TROCR_AVAILABLE = False
-    logger.warning("TrOCR no disponible - pip install transformers pillow")
+    logger.warning("TrOCR no disponible - pip install transformers torch pillow")
 
 try:
-    from google.cloud import vision
-    GOOGLE_VISION_AVAILABLE = True
+    from optimum.onnxruntime import ORTModelForVision2Seq
+    ONNX_TROCR_AVAILABLE = True
 except ImportError:
-    GOOGLE_VISION_AVAILABLE = False
-    logger.warning("Google Cloud Vision no disponible")
+    ONNX_TROCR_AVAILABLE = False
+
+try:
+    from rapidfuzz.distance import Levenshtein
+    RAPIDFUZZ_AVAILABLE = True
+except ImportError:
+    RAPIDFUZZ_AVAILABLE = False
+
+
+@lru_cache(maxsize=65536)
+def _word_distance(a: str, b: str) -> float:
+    """Distancia de edición normalizada (0 = iguales, 1 = distintas) entre dos palabras"""
+    if a == b:
+        return 0.0
+    if RAPIDFUZZ_AVAILABLE:
+        return Levenshtein.normalized_distance(a, b)
+    # Sin rapidfuzz: las palabras que difieren en más de la mitad cuentan como distintas
+    longest = max(len(a), len(b))
+    limit = longest // 2
+    distance = bounded_edit_distance(a, b, limit)
+    return distance / longest if distance <= limit else 1.0
+
+
+def _split_line_words(text: str, confidence: float,
+                      box: Optional[Tuple[int, int, int, int]]) -> List[Dict[str, Any]]:
+    """
+    Divide una línea reconocida en palabras, repartiendo la caja de la línea
+    en proporción a la posición de cada palabra dentro del texto
+    
+    Args:
+        text: Texto de la línea
+        confidence: Confianza de la línea (0-1)
+        box: Caja (x, y, w, h) de la línea, o None si el motor no la reporta
+    
+    Returns:
+        Lista de palabras {'text', 'confidence', 'box'}
+    """
+    words = []
+    offset = 0
+    for word in text.split():
+        start = text.index(word, offset)
+        offset = start + len(word)
+        word_box = None
+        if box is not None and text:
+            x, y, w, h = box
+            x1 = x + int(w * start / len(text))
+            x2 = x + int(w * offset / len(text))
+            word_box = (x1, y, max(1, x2 - x1), h)
+        words.append({'text': word, 'confidence': confidence, 'box': word_box})
+    return words
+
+
+def _points_to_box(points) -> Tuple[int, int, int, int]:
+    """Convierte un polígono [(x, y), ...] en caja (x, y, w, h)"""
+    xs = [int(p[0]) for p in points]
+    ys = [int(p[1]) for p in points]
+    return (min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys))
+
+
+def _load_easyocr():
+    """Construye el lector de EasyOCR (español + inglés)"""
+    return easyocr.Reader(['es', 'en'], gpu=False)
+
+
+def _load_paddleocr():
+    """Construye el lector de PaddleOCR (español)"""
+    return PaddleOCR(lang='es', use_angle_cls=True, show_log=False)
+
+
+def _load_trocr(model_name: str = 'microsoft/trocr-base-printed', backend: str = 'torch'):
+    """
+    Carga el procesador y el modelo de TrOCR
+    
+    Args:
+        model_name: Modelo de Hugging Face
+        backend: 'torch' (fp32), 'int8' (cuantización dinámica para CPU)
+                 u 'onnx' (ONNX Runtime vía optimum)
+    
+    Returns:
+        Diccionario con 'processor', 'model' y 'backend' efectivo
+    """
+    processor = TrOCRProcessor.from_pretrained(model_name)
+    
+    if backend == 'onnx':
+        if ONNX_TROCR_AVAILABLE:
+            model = ORTModelForVision2Seq.from_pretrained(model_name, export=True)
+            return {'processor': processor, 'model': model, 'backend': 'onnx'}
+        logger.warning("ONNX Runtime no disponible - pip install optimum[onnxruntime]; se usa PyTorch")
+        backend = 'torch'
+    
+    model = VisionEncoderDecoderModel.from_pretrained(model_name).eval()
+    if backend == 'int8':
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    
+    return {'processor': processor, 'model': model, 'backend': backend}
+
+
+# Los modelos se cargan en el primer uso y se comparten en todo el proceso
+MODEL_REGISTRY = get_model_registry()
+if EASYOCR_AVAILABLE:
+    MODEL_REGISTRY.register('easyocr', _load_easyocr)
+if PADDLEOCR_AVAILABLE:
+    MODEL_REGISTRY.register('paddleocr', _load_paddleocr)
+
+
+# Tiempo máximo por motor (segundos) si no se configura otro
+DEFAULT_ENGINE_TIMEOUTS = {
+    'tesseract': 30,
+    'easyocr': 60,
+    'paddleocr': 30,
+    'trocr': 120,
+    'google_vision': 20
+}
+
+# Cada cuánto se comprueba si un motor encolado ya empezó (segundos)
+ENGINE_START_POLL = 0.05
+
+# Orden de escalamiento del modo 'cascade' (de más barato a más costoso)
+DEFAULT_CASCADE_ENGINES = ['paddleocr', 'easyocr', 'trocr']
+
+# Instancia por proceso para los motores que se ejecutan en un ProcessPoolExecutor
+_PROCESS_OCR = None
+
+
+def _run_engine_in_process(engine: str, image: np.ndarray, config: Dict) -> Dict[str, Any]:
+    """
+    Ejecuta un motor dentro de un proceso del pool (los modelos se cargan
+    una sola vez por proceso y se reutilizan entre llamadas)
+    """
+    global _PROCESS_OCR
+    if _PROCESS_OCR is None:
+        _PROCESS_OCR = HybridOCR({**config, 'parallel_engines': False, 'process_engines': []})
+    return _PROCESS_OCR._run_engine(engine, image)
 
 
 class HybridOCR:
@@ -61,6 +205,45 @@ class HybridOCR:
         self.config = config or {}
         self.ocr_engines = {}
         
+        # Ejecución concurrente de motores
+        self.parallel_engines = self.config.get('parallel_engines', True)
+        self.engine_timeouts = {**DEFAULT_ENGINE_TIMEOUTS, **self.config.get('engine_timeouts', {})}
+        self.process_engines = self.config.get('process_engines', [])
+        self.agreement_k = self.config.get('agreement_k', 0)
+        self.agreement_threshold = self.config.get('agreement_threshold', 0.8)
+        self._thread_pool = None
+        self._process_pool = None
+        self._pool_lock = threading.Lock()
+        self.pool_stats = {'abandoned_threads': 0, 'terminated_processes': 0}
+        
+        # TrOCR: reconocimiento por líneas en lotes
+        self.trocr_model_name = self.config.get('trocr_model', 'microsoft/trocr-base-printed')
+        self.trocr_backend = self.config.get('trocr_backend', 'torch')
+        self.trocr_batch_size = self.config.get('trocr_batch_size', 8)
+        self.trocr_max_new_tokens = self.config.get('trocr_max_new_tokens', 64)
+        self.model_keys = {'easyocr': 'easyocr', 'paddleocr': 'paddleocr'}
+        if TROCR_AVAILABLE:
+            self.model_keys['trocr'] = f"trocr:{self.trocr_model_name}:{self.trocr_backend}"
+            MODEL_REGISTRY.register(
+                self.model_keys['trocr'],
+                lambda name=self.trocr_model_name, backend=self.trocr_backend: _load_trocr(name, backend)
+            )
+        
+        # Modo 'cascade': umbrales de confianza por línea y campos requeridos
+        self.cascade_engines = self.config.get('cascade_engines', DEFAULT_CASCADE_ENGINES)
+        self.cascade_min_confidence = self.config.get('cascade_min_confidence', 0.75)
+        self.cascade_strict_confidence = self.config.get('cascade_strict_confidence', 0.90)
+        self.cascade_padding = self.config.get('cascade_padding', 4)
+        self.required_fields = self.config.get('required_fields', list(FIELD_KEYWORDS))
+        # Mismas categorías 'field.*' que get_keyword_matcher: los alias de campo
+        # solo aceptan confusiones de OCR, no cualquier palabra a distancia 1
+        matching = self.config.get('keyword_matching', {})
+        self.field_matcher = KeywordMatcher(
+            {f'field.{field}': FIELD_KEYWORDS.get(field, [field]) for field in self.required_fields},
+            matching.get('max_edit_distance', 1),
+            matching.get('min_fuzzy_length', 5)
+        )
+        
         # 1. Tesseract (rápido, confiable para texto impreso)
         if TESSERACT_AVAILABLE:
             self.ocr_engines['tesseract'] = {
@@ -72,58 +255,46 @@ class HybridOCR:
             }
             logger.info("✅ Tesseract OCR disponible")
         
+        # Los motores neuronales se registran sin cargar: el modelo se construye
+        # en el primer uso (ver model_registry)
+        
         # 2. EasyOCR (excelente con manuscritos y múltiples idiomas)
         if EASYOCR_AVAILABLE:
-            try:
-                self.easyocr_reader = easyocr.Reader(['es', 'en'], gpu=False)
-                self.ocr_engines['easyocr'] = {
-                    'enabled': True,
-                    'priority': 2,
-                    'best_for': 'handwriting',
-                    'speed': 'medium',
-                    'accuracy': 0.90
-                }
-                logger.info("✅ EasyOCR disponible (español + inglés)")
-            except Exception as e:
-                logger.error(f"Error inicializando EasyOCR: {e}")
+            self.ocr_engines['easyocr'] = {
+                'enabled': True,
+                'priority': 2,
+                'best_for': 'handwriting',
+                'speed': 'medium',
+                'accuracy': 0.90
+            }
+            logger.info("✅ EasyOCR disponible (español + inglés)")
         
         # 3. PaddleOCR (muy rápido, buen balance)
         if PADDLEOCR_AVAILABLE:
-            try:
-                self.paddle_ocr = PaddleOCR(
-                    lang='es',
-                    use_angle_cls=True,
-                    show_log=False
-                )
-                self.ocr_engines['paddleocr'] = {
-                    'enabled': True,
-                    'priority': 3,
-                    'best_for': 'mixed_text',
-                    'speed': 'very_fast',
-                    'accuracy': 0.88
-                }
-                logger.info("✅ PaddleOCR disponible (español)")
-            except Exception as e:
-                logger.error(f"Error inicializando PaddleOCR: {e}")
+            self.ocr_engines['paddleocr'] = {
+                'enabled': True,
+                'priority': 3,
+                'best_for': 'mixed_text',
+                'speed': 'very_fast',
+                'accuracy': 0.88
+            }
+            logger.info("✅ PaddleOCR disponible (español)")
         
         # 4. TrOCR (estado del arte con Transformers)
         if TROCR_AVAILABLE:
-            try:
-                self.trocr_processor = TrOCRProcessor.from_pretrained('microsoft/trocr-base-printed')
-                self.trocr_model = VisionEncoderDecoderModel.from_pretrained('microsoft/trocr-base-printed')
-                self.ocr_engines['trocr'] = {
-                    'enabled': True,
-                    'priority': 4,
-                    'best_for': 'premium_quality',
-                    'speed': 'slow',
-                    'accuracy': 0.95
-                }
-                logger.info("✅ TrOCR (Microsoft) disponible")
-            except Exception as e:
-                logger.error(f"Error inicializando TrOCR: {e}")
+            self.ocr_engines['trocr'] = {
+                'enabled': True,
+                'priority': 4,
+                'best_for': 'premium_quality',
+                'speed': 'slow',
+                'accuracy': 0.95
+            }
+            logger.info("✅ TrOCR (Microsoft) disponible")
         
-        # 5. Google Cloud Vision (cloud, muy preciso)
-        if GOOGLE_VISION_AVAILABLE:
+        # 5. Google Cloud Vision (cloud, muy preciso); el backend REST no requiere la biblioteca
+        vision_config = self.config.get('google_vision', {})
+        self.vision_client = None
+        if GOOGLE_VISION_AVAILABLE or vision_config.get('backend') == 'rest':
             self.ocr_engines['google_vision'] = {
                 'enabled': self.config.get('use_cloud_ocr', False),
                 'priority': 5,
@@ -133,9 +304,41 @@ class HybridOCR:
                 'cost': 'paid'
             }
             if self.ocr_engines['google_vision']['enabled']:
-                logger.info("✅ Google Cloud Vision disponible")
+                self.vision_client = VisionBatchClient(vision_config)
+                logger.info(f"✅ Google Cloud Vision disponible (backend {self.vision_client.backend})")
         
         logger.info(f"Sistema Híbrido OCR: {len(self.ocr_engines)} motores disponibles")
+        
+        # Servicios de larga duración pueden precargar los modelos al iniciar
+        preload = self.config.get('preload_models', False)
+        if preload:
+            self.warmup(preload if isinstance(preload, list) else None)
+    
+    def warmup(self, engines: List[str] = None) -> Dict[str, bool]:
+        """
+        Precarga los modelos de los motores neuronales
+        
+        Args:
+            engines: Motores a precargar (None = todos los habilitados)
+        
+        Returns:
+            Diccionario {motor: cargado_correctamente}
+        """
+        engines = [e for e in engines or self._active_engines()
+                   if MODEL_REGISTRY.is_registered(self.model_keys.get(e, ''))]
+        loaded = MODEL_REGISTRY.warmup([self.model_keys[e] for e in engines])
+        status = {engine: loaded[self.model_keys[engine]] for engine in engines}
+        
+        # Un motor cuyo modelo no carga se deshabilita para no reintentarlo
+        for engine, ok in status.items():
+            if not ok and engine in self.ocr_engines:
+                self.ocr_engines[engine]['enabled'] = False
+        
+        return status
+    
+    def model_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Tiempo de carga y memoria de los modelos del proceso"""
+        return MODEL_REGISTRY.stats()
     
     def extract_text_hybrid(self, image: np.ndarray, method: str = 'voting') -> Dict[str, Any]:
         """
@@ -143,30 +346,24 @@ class HybridOCR:
         
         Args:
             image: Imagen a procesar
-            method: 'voting' (consenso), 'best' (mejor confianza), 'all' (todos)
+            method: 'voting' (consenso), 'best' (mejor confianza), 'all' (todos),
+                    'cascade' (Tesseract primero, escalando solo las regiones dudosas)
         
         Returns:
             Texto extraído + confianza + metadata
         """
         logger.info(f"Extrayendo texto con método: {method}")
         
-        results = {}
-        
-        # Ejecutar todos los OCR disponibles
-        if 'tesseract' in self.ocr_engines:
-            results['tesseract'] = self._ocr_tesseract(image)
-        
-        if 'easyocr' in self.ocr_engines:
-            results['easyocr'] = self._ocr_easyocr(image)
+        if method == 'cascade':
+            return self._extract_text_cascade(image)
         
-        if 'paddleocr' in self.ocr_engines:
-            results['paddleocr'] = self._ocr_paddleocr(image)
+        engines = self._active_engines()
         
-        if 'trocr' in self.ocr_engines and self.ocr_engines['trocr']['enabled']:
-            results['trocr'] = self._ocr_trocr(image)
-        
-        if 'google_vision' in self.ocr_engines and self.ocr_engines['google_vision']['enabled']:
-            results['google_vision'] = self._ocr_google_vision(image)
+        # Ejecutar todos los OCR disponibles (en paralelo si está habilitado)
+        if self.parallel_engines and len(engines) > 1:
+            results = self._run_engines_parallel(image, engines)
+        else:
+            results = {engine: self._run_engine(engine, image) for engine in engines}
         
         # Combinar resultados según método
         if method == 'voting':
@@ -179,6 +376,9 @@ class HybridOCR:
             final_result = self._combine_by_voting(results)
         
         final_result['engines_used'] = list(results.keys())
+        final_result['engines_timed_out'] = [
+            engine for engine, r in results.items() if r.get('error') == 'timeout'
+        ]
         final_result['individual_results'] = results
         
         logger.info(f"Texto extraído: {len(final_result['text'])} caracteres, "
@@ -186,25 +386,369 @@ class HybridOCR:
         
         return final_result
     
+    def _extract_text_cascade(self, image: np.ndarray) -> Dict[str, Any]:
+        """
+        OCR en cascada por confianza
+        
+        Tesseract lee toda la página; solo las líneas con baja confianza se
+        recortan y se escalan a los motores neuronales (PaddleOCR/EasyOCR y
+        finalmente TrOCR). Si faltan campos requeridos en el texto, el umbral
+        se vuelve más estricto para que más líneas se revisen.
+        
+        Args:
+            image: Imagen a procesar
+        
+        Returns:
+            Texto extraído + confianza + regiones con el motor que respondió
+        """
+        regions = self._tesseract_lines(image) if 'tesseract' in self.ocr_engines else []
+        
+        if not regions:
+            # Sin líneas de Tesseract: la página completa es una sola región
+            h, w = image.shape[:2]
+            regions = [{'box': (0, 0, w, h), 'text': '', 'confidence': 0.0, 'engine': None}]
+        
+        page_text = '\n'.join(r['text'] for r in regions)
+        found = self.field_matcher.categories_found(page_text)
+        missing_fields = [f for f in self.required_fields if f'field.{f}' not in found]
+        threshold = self.cascade_strict_confidence if missing_fields else self.cascade_min_confidence
+        
+        engines_run = ['tesseract'] if regions[0]['engine'] else []
+        pending = [r for r in regions if r['confidence'] < threshold]
+        
+        for engine in self.cascade_engines:
+            if not pending:
+                break
+            if engine not in self.ocr_engines or not self.ocr_engines[engine]['enabled']:
+                continue
+            
+            engines_run.append(engine)
+            pad = self.cascade_padding
+            crops = []
+            for region in pending:
+                x, y, w, h = region['box']
+                crops.append(image[max(0, y - pad):y + h + pad, max(0, x - pad):x + w + pad])
+            targets = [(region, crop) for region, crop in zip(pending, crops) if crop.size > 0]
+            
+            if engine == 'google_vision':
+                # Todas las líneas pendientes en lotes de batch_annotate_images
+                engine_results = self.ocr_google_vision_batch([crop for _, crop in targets])
+            else:
+                engine_results = [self._run_engine(engine, crop) for _, crop in targets]
+            
+            for (region, _), result in zip(targets, engine_results):
+                if result.get('success') and result['text'] and result['confidence'] > region['confidence']:
+                    region.setdefault('escalated_from', region['engine'])
+                    region.update({
+                        'text': result['text'],
+                        'confidence': result['confidence'],
+                        'engine': engine
+                    })
+            
+            pending = [r for r in pending if r['confidence'] < threshold]
+        
+        regions = [r for r in regions if r['text']]
+        total_chars = sum(len(r['text']) for r in regions)
+        confidence = (
+            sum(r['confidence'] * len(r['text']) for r in regions) / total_chars
+            if total_chars else 0
+        )
+        
+        engine_counts = {}
+        for region in regions:
+            engine_counts[region['engine']] = engine_counts.get(region['engine'], 0) + 1
+        
+        final_result = {
+            'text': '\n'.join(r['text'] for r in regions),
+            'confidence': confidence,
+            'method': 'cascade',
+            'threshold': threshold,
+            'missing_fields': missing_fields,
+            'regions': regions,
+            'regions_escalated': sum(1 for r in regions if 'escalated_from' in r),
+            'engine_counts': engine_counts,
+            'engines_used': engines_run,
+            'engines_timed_out': [],
+            'individual_results': {}
+        }
+        
+        logger.info(f"Cascada: {len(regions)} regiones, {final_result['regions_escalated']} escaladas, "
+                   f"motores: {engine_counts}")
+        
+        return final_result
+    
+    def _tesseract_lines(self, image: np.ndarray) -> List[Dict[str, Any]]:
+        """
+        Obtiene las líneas de texto de Tesseract con su caja y confianza media
+        
+        Args:
+            image: Imagen a procesar
+        
+        Returns:
+            Lista de regiones {'box', 'text', 'confidence', 'engine'}
+        """
+        try:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+            data = pytesseract.image_to_data(gray, lang='spa', config='--psm 6',
+                                             output_type=pytesseract.Output.DICT)
+        except Exception as e:
+            logger.error(f"Error en Tesseract: {e}")
+            return []
+        
+        lines: Dict[Tuple[int, int, int], Dict[str, Any]] = {}
+        for idx, word in enumerate(data['text']):
+            if not word or not word.strip():
+                continue
+            try:
+                conf = float(data['conf'][idx])
+            except (ValueError, TypeError):
+                continue
+            if conf < 0:
+                continue
+            
+            key = (data['block_num'][idx], data['par_num'][idx], data['line_num'][idx])
+            line = lines.setdefault(key, {'words': [], 'confs': [], 'boxes': []})
+            line['words'].append(word.strip())
+            line['confs'].append(conf / 100)
+            line['boxes'].append((data['left'][idx], data['top'][idx],
+                                  data['left'][idx] + data['width'][idx],
+                                  data['top'][idx] + data['height'][idx]))
+        
+        regions = []
+        for line in lines.values():
+            x1 = min(b[0] for b in line['boxes'])
+            y1 = min(b[1] for b in line['boxes'])
+            x2 = max(b[2] for b in line['boxes'])
+            y2 = max(b[3] for b in line['boxes'])
+            regions.append({
+                'box': (x1, y1, x2 - x1, y2 - y1),
+                'text': ' '.join(line['words']),
+                'confidence': sum(line['confs']) / len(line['confs']),
+                'engine': 'tesseract'
+            })
+        
+        return regions
+    
+    def _active_engines(self) -> List[str]:
+        """Motores habilitados en orden de prioridad"""
+        return [
+            engine for engine, info in sorted(self.ocr_engines.items(),
+                                              key=lambda item: item[1]['priority'])
+            if info['enabled']
+        ]
+    
+    def _run_engine(self, engine: str, image: np.ndarray) -> Dict[str, Any]:
+        """Ejecuta un motor de OCR por nombre"""
+        runners = {
+            'tesseract': self._ocr_tesseract,
+            'easyocr': self._ocr_easyocr,
+            'paddleocr': self._ocr_paddleocr,
+            'trocr': self._ocr_trocr,
+            'google_vision': self._ocr_google_vision
+        }
+        # Sin caché: una página completa contiene folios y datos variables
+        return runners[engine](image)
+    
+    def _get_thread_pool(self) -> ThreadPoolExecutor:
+        """Pool de hilos para motores que liberan el GIL (Tesseract, Torch, gRPC)"""
+        with self._pool_lock:
+            if self._thread_pool is None:
+                self._thread_pool = ThreadPoolExecutor(max_workers=len(self.ocr_engines) or 1,
+                                                       thread_name_prefix='ocr')
+            return self._thread_pool
+    
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        """Pool de procesos para motores que no son seguros en hilos"""
+        with self._pool_lock:
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(max_workers=len(self.process_engines) or 1)
+            return self._process_pool
+    
+    def _abandon_pool(self, engine: str) -> None:
+        """
+        Descarta el pool que tiene ocupado un motor colgado
+        
+        future.cancel() no detiene una tarea que ya está en ejecución, así que
+        el trabajador seguiría ocupado y las llamadas siguientes esperarían en
+        cola detrás de él. Las siguientes llamadas usan un pool nuevo. Los
+        procesos del pool viejo se terminan (liberan el modelo cargado); un
+        hilo no puede detenerse, así que solo se registra y se cuenta.
+        """
+        is_process = engine in self.process_engines
+        with self._pool_lock:
+            if is_process:
+                pool, self._process_pool = self._process_pool, None
+            else:
+                pool, self._thread_pool = self._thread_pool, None
+        if pool is None:
+            return
+        
+        if is_process:
+            # Copia de los procesos antes de shutdown, que limpia la referencia
+            processes = list((getattr(pool, '_processes', None) or {}).values())
+            pool.shutdown(wait=False, cancel_futures=True)
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            self.pool_stats['terminated_processes'] += len(processes)
+            logger.warning(f"{engine} colgado: {len(processes)} proceso(s) de OCR terminados")
+        else:
+            pool.shutdown(wait=False)
+            self.pool_stats['abandoned_threads'] += 1
+            logger.warning(f"{engine} colgado: hilo de OCR abandonado "
+                           f"({self.pool_stats['abandoned_threads']} en total)")
+    
+    def _run_engines_parallel(self, image: np.ndarray, engines: List[str]) -> Dict[str, Dict]:
+        """
+        Lanza todos los motores a la vez, cada uno con su propio tiempo límite
+        
+        El tiempo límite de cada motor cuenta desde que empieza a ejecutarse,
+        no desde que se encola. Un motor que sigue en cola espera como máximo
+        el mayor de los tiempos límite antes de descartarse.
+        
+        Si agreement_k > 0, devuelve en cuanto k motores coinciden en el texto
+        sin esperar al resto.
+        
+        Args:
+            image: Imagen a procesar
+            engines: Motores a ejecutar
+            
+        Returns:
+            Resultados por motor (en el orden de prioridad)
+        """
+        submitted = time.monotonic()
+        queue_limit = submitted + max(self.engine_timeouts.get(e, 60) for e in engines)
+        futures = {}
+        
+        for engine in engines:
+            if engine in self.process_engines:
+                future = self._get_process_pool().submit(
+                    _run_engine_in_process, engine, image, self.config
+                )
+            else:
+                future = self._get_thread_pool().submit(self._run_engine, engine, image)
+            futures[future] = engine
+        
+        started = {}
+        results = {}
+        pending = set(futures)
+        
+        def deadline(future) -> float:
+            if future in started:
+                return started[future] + self.engine_timeouts.get(futures[future], 60)
+            return queue_limit
+        
+        while pending:
+            # Registrar el inicio real de los motores que ya salieron de la cola
+            now = time.monotonic()
+            for future in pending:
+                if future not in started and future.running():
+                    started[future] = now
+            
+            timeout = max(0.0, min(deadline(f) for f in pending) - now)
+            if any(f not in started for f in pending):
+                # Volver a mirar pronto para arrancar el reloj de los encolados
+                timeout = min(timeout, ENGINE_START_POLL)
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            
+            for future in done:
+                engine = futures[future]
+                try:
+                    results[engine] = future.result()
+                except Exception as e:
+                    logger.error(f"Error en {engine}: {e}")
+                    results[engine] = {'engine': engine, 'text': '', 'confidence': 0, 'success': False}
+            
+            # Motores que superaron su tiempo límite (en ejecución o en cola)
+            now = time.monotonic()
+            for future in [f for f in pending if deadline(f) <= now]:
+                engine = futures[future]
+                pending.discard(future)
+                if not future.cancel():
+                    self._abandon_pool(engine)
+                    logger.warning(f"{engine} superó su tiempo límite ({self.engine_timeouts.get(engine, 60)}s)")
+                else:
+                    logger.warning(f"{engine} no llegó a ejecutarse: pool ocupado")
+                results[engine] = {'engine': engine, 'text': '', 'confidence': 0,
+                                   'success': False, 'error': 'timeout'}
+            
+            # Retorno anticipado cuando suficientes motores coinciden
+            if pending and self.agreement_k and self._engines_agree(results):
+                logger.info(f"{self.agreement_k} motores coinciden - "
+                           f"se omiten {len(pending)} motor(es) restantes")
+                for future in pending:
+                    future.cancel()
+                break
+        
+        return {engine: results[engine] for engine in engines if engine in results}
+    
+    def _engines_agree(self, results: Dict[str, Dict]) -> bool:
+        """
+        Indica si al menos agreement_k motores produjeron textos similares
+        (similitud de conjuntos de palabras, barata frente a la alineación completa)
+        """
+        word_sets = [
+            set(r['text'].lower().split())
+            for r in results.values() if r.get('success') and r.get('text')
+        ]
+        if len(word_sets) < self.agreement_k:
+            return False
+        
+        for i, words_i in enumerate(word_sets):
+            agreeing = 1
+            for j, words_j in enumerate(word_sets):
+                if i != j and words_i and words_j:
+                    similarity = len(words_i & words_j) / len(words_i | words_j)
+                    if similarity >= self.agreement_threshold:
+                        agreeing += 1
+            if agreeing >= self.agreement_k:
+                return True
+        
+        return False
+    
+    def shutdown(self) -> None:
+        """Libera los pools de hilos y procesos (y el del cliente de Google Vision)"""
+        with self._pool_lock:
+            pools = (self._thread_pool, self._process_pool)
+            self._thread_pool = None
+            self._process_pool = None
+        for pool in pools:
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+        if self.vision_client is not None:
+            self.vision_client.shutdown()
+    
     def _ocr_tesseract(self, image: np.ndarray) -> Dict[str, Any]:
         """Tesseract OCR"""
         try:
             # Convertir a escala de grises
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
             
-            # Extraer texto
-            text = pytesseract.image_to_string(gray, lang='spa', config='--psm 6')
+            # Una sola pasada a nivel de palabra: texto, confianza y cajas
+            data = pytesseract.image_to_data(gray, lang='spa', config='--psm 6',
+                                             output_type=pytesseract.Output.DICT)
+            text = text_from_ocr_data(data)
+            
+            words = []
+            for idx, word in enumerate(data['text']):
+                conf = float(data['conf'][idx])
+                if word.strip() and conf >= 0:
+                    words.append({
+                        'text': word.strip(),
+                        'confidence': conf / 100,
+                        'box': (data['left'][idx], data['top'][idx],
+                                data['width'][idx], data['height'][idx])
+                    })
             
-            # Obtener confianza
-            data = pytesseract.image_to_data(gray, lang='spa', output_type=pytesseract.Output.DICT)
-            confidences = [int(conf) for conf in data['conf'] if int(conf) > 0]
+            confidences = [w['confidence'] for w in words if w['confidence'] > 0]
             avg_confidence = sum(confidences) / len(confidences) if confidences else 0
             
             return {
                 'engine': 'tesseract',
                 'text': text.strip(),
-                'confidence': avg_confidence / 100,
+                'confidence': avg_confidence,
                 'words_count': len(text.split()),
+                'words': words,
                 'success': True
             }
         except Exception as e:
@@ -221,11 +765,16 @@ class HybridOCR:
                 image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
             
             # Extraer texto
-            results = self.easyocr_reader.readtext(image_rgb)
+            results = MODEL_REGISTRY.get('easyocr').readtext(image_rgb)
             
             # Combinar textos
             texts = [result[1] for result in results]
             confidences = [result[2] for result in results]
+            words = [
+                word
+                for points, text, conf in results
+                for word in _split_line_words(text, conf, _points_to_box(points))
+            ]
             
             full_text = ' '.join(texts)
             avg_confidence = sum(confidences) / len(confidences) if confidences else 0
@@ -235,6 +784,7 @@ class HybridOCR:
                 'text': full_text.strip(),
                 'confidence': avg_confidence,
                 'words_count': len(texts),
+                'words': words,
                 'success': True
             }
         except Exception as e:
@@ -245,7 +795,7 @@ class HybridOCR:
         """PaddleOCR - Muy rápido y preciso"""
         try:
             # PaddleOCR acepta numpy array directamente
-            results = self.paddle_ocr.ocr(image, cls=True)
+            results = MODEL_REGISTRY.get('paddleocr').ocr(image, cls=True)
             
             if not results or not results[0]:
                 return {'engine': 'paddleocr', 'text': '', 'confidence': 0, 'success': False}
@@ -253,11 +803,13 @@ class HybridOCR:
             # Extraer textos y confianzas
             texts = []
             confidences = []
+            words = []
             for line in results[0]:
                 text = line[1][0]
                 conf = line[1][1]
                 texts.append(text)
                 confidences.append(conf)
+                words.extend(_split_line_words(text, conf, _points_to_box(line[0])))
             
             full_text = ' '.join(texts)
             avg_confidence = sum(confidences) / len(confidences) if confidences else 0
@@ -267,6 +819,7 @@ class HybridOCR:
                 'text': full_text.strip(),
                 'confidence': avg_confidence,
                 'words_count': len(texts),
+                'words': words,
                 'success': True
             }
         except Exception as e:
@@ -274,65 +827,214 @@ class HybridOCR:
             return {'engine': 'paddleocr', 'text': '', 'confidence': 0, 'success': False}
     
     def _ocr_trocr(self, image: np.ndarray) -> Dict[str, Any]:
-        """TrOCR - Microsoft Transformer OCR (estado del arte)"""
+        """
+        TrOCR - Microsoft Transformer OCR (estado del arte)
+        
+        TrOCR es un modelo de líneas: la página se segmenta en líneas de texto
+        y estas se reconocen en lotes.
+        """
         try:
-            # Convertir a PIL Image
-            if len(image.shape) == 2:
-                pil_image = Image.fromarray(image).convert('RGB')
-            else:
-                image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-                pil_image = Image.fromarray(image_rgb)
+            boxes = self._segment_text_lines(image)
+            crops = [image[y:y+h, x:x+w] for x, y, w, h in boxes]
+            lines = self._recognize_lines(crops)
             
-            # Procesar con TrOCR
-            pixel_values = self.trocr_processor(pil_image, return_tensors="pt").pixel_values
-            generated_ids = self.trocr_model.generate(pixel_values)
-            generated_text = self.trocr_processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
+            words = []
+            for (text, conf), box in zip(lines, boxes):
+                words.extend(_split_line_words(text, conf, box))
+            
+            texts = [text for text, _ in lines if text]
+            total_chars = sum(len(text) for text, _ in lines)
+            confidence = (
+                sum(conf * len(text) for text, conf in lines) / total_chars
+                if total_chars else 0
+            )
+            generated_text = '\n'.join(texts)
             
             return {
                 'engine': 'trocr',
                 'text': generated_text.strip(),
-                'confidence': 0.95,  # TrOCR es muy preciso
+                'confidence': confidence,
                 'words_count': len(generated_text.split()),
+                'lines_count': len(boxes),
+                'words': words,
                 'success': True
             }
         except Exception as e:
             logger.error(f"Error en TrOCR: {e}")
             return {'engine': 'trocr', 'text': '', 'confidence': 0, 'success': False}
     
+    def _segment_text_lines(self, image: np.ndarray) -> List[Tuple[int, int, int, int]]:
+        """
+        Segmenta la imagen en líneas de texto (morfología, sin OCR)
+        
+        Args:
+            image: Imagen de la página o de una región
+        
+        Returns:
+            Cajas (x, y, w, h) de las líneas, de arriba a abajo y de izquierda a derecha.
+            Si la imagen ya es una sola línea (o no se detecta ninguna), la imagen completa.
+        """
+        h_img, w_img = image.shape[:2]
+        full = [(0, 0, w_img, h_img)]
+        
+        # Recortes del modo 'cascade' ya son líneas individuales
+        if h_img <= self.config.get('trocr_single_line_height', 64):
+            return full
+        
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        
+        # Unir caracteres de una misma línea con un kernel horizontal
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(15, w_img // 40), 3))
+        merged = cv2.dilate(binary, kernel, iterations=1)
+        contours, _ = cv2.findContours(merged, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        
+        boxes = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            # Descartar ruido, líneas de tabla y bloques que no son una línea
+            if h < 8 or w < 10 or h > h_img * 0.2 or w / h < 1.2:
+                continue
+            pad = 2
+            x1, y1 = max(0, x - pad), max(0, y - pad)
+            x2, y2 = min(w_img, x + w + pad), min(h_img, y + h + pad)
+            boxes.append((x1, y1, x2 - x1, y2 - y1))
+        
+        if not boxes:
+            return full
+        
+        median_h = sorted(b[3] for b in boxes)[len(boxes) // 2]
+        return sorted(boxes, key=lambda b: (round(b[1] / median_h), b[0]))
+    
+    def _recognize_lines(self, crops: List[np.ndarray],
+                         batch_size: int = None) -> List[Tuple[str, float]]:
+        """
+        Reconoce líneas con TrOCR en lotes bajo torch.inference_mode
+        
+        Args:
+            crops: Imágenes de líneas (BGR o gris)
+            batch_size: Tamaño de lote (por defecto trocr_batch_size)
+        
+        Returns:
+            Lista de (texto, confianza) en el mismo orden que crops. La confianza
+            es la probabilidad media por token de la secuencia generada.
+        """
+        trocr = MODEL_REGISTRY.get(self.model_keys['trocr'])
+        processor, model = trocr['processor'], trocr['model']
+        batch_size = batch_size or self.trocr_batch_size
+        pad_token_id = processor.tokenizer.pad_token_id
+        
+        results: List[Tuple[str, float]] = []
+        with torch.inference_mode():
+            for start in range(0, len(crops), batch_size):
+                batch = [
+                    Image.fromarray(cv2.cvtColor(crop, cv2.COLOR_BGR2RGB) if len(crop.shape) == 3
+                                    else crop).convert('RGB')
+                    for crop in crops[start:start + batch_size]
+                ]
+                pixel_values = processor(images=batch, return_tensors="pt").pixel_values
+                # Decodificación voraz: con beam search las puntuaciones por paso
+                # no corresponden a la secuencia elegida
+                outputs = model.generate(
+                    pixel_values,
+                    max_new_tokens=self.trocr_max_new_tokens,
+                    num_beams=1,
+                    do_sample=False,
+                    output_scores=True,
+                    return_dict_in_generate=True
+                )
+                texts = processor.batch_decode(outputs.sequences, skip_special_tokens=True)
+                
+                try:
+                    scores = model.compute_transition_scores(
+                        outputs.sequences, outputs.scores, normalize_logits=True
+                    )
+                    # Ignorar relleno y puntuaciones no finitas (-inf daría NaN)
+                    mask = (outputs.sequences[:, 1:] != pad_token_id) & torch.isfinite(scores)
+                    token_counts = mask.sum(dim=1).clamp(min=1)
+                    log_probs = torch.where(mask, scores, torch.zeros_like(scores)).sum(dim=1)
+                    confidences = torch.exp(log_probs / token_counts).tolist()
+                except Exception:
+                    confidences = [0.95] * len(texts)
+                
+                results.extend((text.strip(), float(conf)) for text, conf in zip(texts, confidences))
+        
+        return results
+    
+    def benchmark_trocr(self, image: np.ndarray,
+                        batch_sizes: List[int] = None) -> Dict[str, Any]:
+        """
+        Mide el rendimiento de TrOCR en líneas por segundo
+        
+        Args:
+            image: Página de prueba (se segmenta en líneas una sola vez)
+            batch_sizes: Tamaños de lote a comparar
+        
+        Returns:
+            Diccionario con backend, número de líneas y líneas/seg por tamaño de lote
+        """
+        boxes = self._segment_text_lines(image)
+        crops = [image[y:y+h, x:x+w] for x, y, w, h in boxes]
+        
+        # La primera llamada carga el modelo; no se incluye en la medición
+        self._recognize_lines(crops[:1], batch_size=1)
+        
+        throughput = {}
+        for batch_size in batch_sizes or [1, 4, 8, 16]:
+            start = time.perf_counter()
+            self._recognize_lines(crops, batch_size=batch_size)
+            elapsed = time.perf_counter() - start
+            throughput[batch_size] = round(len(crops) / elapsed, 2) if elapsed > 0 else None
+            logger.info(f"TrOCR lote={batch_size}: {throughput[batch_size]} líneas/seg")
+        
+        return {
+            'backend': MODEL_REGISTRY.get(self.model_keys['trocr'])['backend'],
+            'lines': len(crops),
+            'lines_per_second': throughput
+        }
+    
     def _ocr_google_vision(self, image: np.ndarray) -> Dict[str, Any]:
-        """Google Cloud Vision OCR"""
-        try:
-            client = vision.ImageAnnotatorClient()
-            
-            # Convertir imagen a bytes
-            success, encoded_image = cv2.imencode('.jpg', image)
-            content = encoded_image.tobytes()
-            
-            image_vision = vision.Image(content=content)
-            response = client.text_detection(image=image_vision)
-            texts = response.text_annotations
+        """Google Cloud Vision OCR (una imagen; lote de tamaño 1)"""
+        return self.ocr_google_vision_batch([image])[0]
+    
+    def ocr_google_vision_batch(self, images: List[np.ndarray]) -> List[Dict[str, Any]]:
+        """
+        Google Cloud Vision OCR sobre varias imágenes
+        
+        Las imágenes se envían en lotes de batch_annotate_images (hasta 16 por
+        solicitud) con varios lotes en vuelo; útil para corridas asistidas por
+        la nube sobre muchas PODs o regiones.
+        
+        Args:
+            images: Lista de imágenes
             
-            if texts:
-                full_text = texts[0].description
-                confidence = 0.92  # Google Vision es muy preciso
-                
-                return {
-                    'engine': 'google_vision',
-                    'text': full_text.strip(),
-                    'confidence': confidence,
-                    'words_count': len(full_text.split()),
-                    'success': True
-                }
-            else:
-                return {'engine': 'google_vision', 'text': '', 'confidence': 0, 'success': False}
+        Returns:
+            Un resultado por imagen, en el mismo orden
+        """
+        if self.vision_client is None:
+            return [
+                {'engine': 'google_vision', 'text': '', 'confidence': 0, 'success': False}
+                for _ in images
+            ]
+        
+        try:
+            return self.vision_client.annotate(images)
         except Exception as e:
             logger.error(f"Error en Google Vision: {e}")
-            return {'engine': 'google_vision', 'text': '', 'confidence': 0, 'success': False}
+            return [
+                {'engine': 'google_vision', 'text': '', 'confidence': 0, 'success': False}
+                for _ in images
+            ]
     
     def _combine_by_voting(self, results: Dict[str, Dict]) -> Dict[str, Any]:
         """
-        Combina resultados por consenso/voting
-        El texto que más OCR engines detectan es el elegido
+        Combina resultados por votación a nivel de palabra (estilo ROVER)
+        
+        Las palabras de cada motor se agrupan en las líneas del motor pivote
+        (el de más palabras) usando sus cajas, se alinean palabra por palabra
+        con distancia de edición y en cada posición gana la palabra con más
+        votos ponderados por confianza. El texto final mezcla lo mejor de
+        cada motor en lugar de elegir el texto de uno solo.
         """
         if not results:
             return {'text': '', 'confidence': 0, 'method': 'voting'}
@@ -350,38 +1052,225 @@ class HybridOCR:
                 'text': result['text'],
                 'confidence': result['confidence'],
                 'method': 'voting',
-                'consensus': 1.0
+                'consensus': 1.0,
+                'words': result.get('words', [])
             }
         
-        # Comparar textos entre sí
-        texts = [r['text'] for r in successful_results.values()]
-        confidences = [r['confidence'] for r in successful_results.values()]
+        # Motores sin palabras (p. ej. fallo parcial) votan con su texto completo
+        engine_words = {
+            engine: r.get('words') or _split_line_words(r['text'], r['confidence'], None)
+            for engine, r in successful_results.items()
+        }
+        engine_words = {engine: words for engine, words in engine_words.items() if words}
+        if not engine_words:
+            return {'text': '', 'confidence': 0, 'method': 'voting', 'consensus': 0}
+        
+        pivot = max(engine_words, key=lambda e: len(engine_words[e]))
+        pivot_lines = self._group_lines(engine_words[pivot])
         
-        # Encontrar el texto con mayor similitud con los demás
-        best_text = ''
-        best_score = 0
+        # Red de confusión: por línea, lista de posiciones {motor: palabra}
+        network = [[{pivot: word} for word in line] for line in pivot_lines]
         
-        for i, text1 in enumerate(texts):
-            similarity_sum = 0
-            for j, text2 in enumerate(texts):
-                if i != j:
-                    similarity = SequenceMatcher(None, text1.lower(), text2.lower()).ratio()
-                    similarity_sum += similarity
+        for engine, words in engine_words.items():
+            if engine == pivot:
+                continue
             
-            avg_similarity = similarity_sum / (len(texts) - 1) if len(texts) > 1 else 0
-            weighted_score = avg_similarity * confidences[i]
+            if all(w['box'] is not None for w in words):
+                # Con cajas: cada palabra se asigna a la línea pivote más cercana
+                per_line = self._assign_to_lines(words, pivot_lines)
+                for line_idx, line_words in enumerate(per_line):
+                    network[line_idx] = self._align_into(network[line_idx], line_words, engine, pivot)
+            else:
+                # Sin cajas: se alinea la secuencia completa contra toda la página
+                flat = [slot for line in network for slot in line]
+                lengths = [len(line) for line in network]
+                merged = self._align_into(flat, words, engine, pivot)
+                network = self._resplit(merged, lengths, engine)
+        
+        return self._vote(network, len(engine_words))
+    
+    def _group_lines(self, words: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """
+        Agrupa palabras en líneas por la posición vertical de sus cajas
+        
+        Returns:
+            Lista de líneas (de arriba a abajo), cada una con sus palabras de izquierda a derecha
+        """
+        if any(w['box'] is None for w in words):
+            return [list(words)]
+        
+        heights = sorted(w['box'][3] for w in words)
+        tolerance = max(1, heights[len(heights) // 2] * 0.5)
+        
+        lines: List[List[Dict[str, Any]]] = []
+        centers: List[float] = []
+        for word in sorted(words, key=lambda w: w['box'][1] + w['box'][3] / 2):
+            center = word['box'][1] + word['box'][3] / 2
+            if centers and abs(center - centers[-1]) <= tolerance:
+                lines[-1].append(word)
+                centers[-1] = sum(w['box'][1] + w['box'][3] / 2 for w in lines[-1]) / len(lines[-1])
+            else:
+                lines.append([word])
+                centers.append(center)
+        
+        return [sorted(line, key=lambda w: w['box'][0]) for line in lines]
+    
+    def _assign_to_lines(self, words: List[Dict[str, Any]],
+                         pivot_lines: List[List[Dict[str, Any]]]) -> List[List[Dict[str, Any]]]:
+        """
+        Asigna cada palabra a la línea pivote con el centro vertical más cercano
+        
+        Returns:
+            Una lista de palabras (ordenadas de izquierda a derecha) por línea pivote
+        """
+        if pivot_lines and any(w['box'] is None for line in pivot_lines for w in line):
+            return [list(words)] + [[] for _ in pivot_lines[1:]]
+        
+        # Las líneas pivote ya vienen ordenadas de arriba a abajo
+        centers = [
+            sum(w['box'][1] + w['box'][3] / 2 for w in line) / len(line)
+            for line in pivot_lines
+        ]
+        per_line: List[List[Dict[str, Any]]] = [[] for _ in pivot_lines]
+        for word in words:
+            center = word['box'][1] + word['box'][3] / 2
+            idx = bisect.bisect_left(centers, center)
+            if idx == len(centers) or (idx > 0 and center - centers[idx - 1] < centers[idx] - center):
+                idx -= 1
+            per_line[idx].append(word)
+        
+        return [sorted(line, key=lambda w: w['box'][0]) for line in per_line]
+    
+    def _align_into(self, slots: List[Dict[str, Dict]], words: List[Dict[str, Any]],
+                    engine: str, pivot: str) -> List[Dict[str, Dict]]:
+        """
+        Alinea las palabras de un motor contra las posiciones de la red
+        (programación dinámica con costo de sustitución = distancia de edición normalizada)
+        
+        Args:
+            slots: Posiciones actuales {motor: palabra}
+            words: Palabras del motor a alinear
+            engine: Nombre del motor
+            pivot: Motor pivote (referencia de cada posición)
+        
+        Returns:
+            Nuevas posiciones; las palabras sin pareja se insertan como posiciones propias
+        """
+        if not words:
+            return slots
+        if not slots:
+            return [{engine: word} for word in words]
+        
+        refs = [self._slot_reference(slot, pivot) for slot in slots]
+        hyps = [w['text'].lower() for w in words]
+        n, m = len(refs), len(hyps)
+        
+        distance = [[_word_distance(ref, hyp) for hyp in hyps] for ref in refs]
+        cost = [[float(j) for j in range(m + 1)]] + [[float(i)] + [0.0] * m for i in range(1, n + 1)]
+        for i in range(1, n + 1):
+            previous, current, row_distance = cost[i - 1], cost[i], distance[i - 1]
+            for j in range(1, m + 1):
+                substitution = previous[j - 1] + row_distance[j - 1]
+                gap = min(previous[j], current[j - 1]) + 1
+                current[j] = substitution if substitution < gap else gap
+        
+        # Recorrido inverso
+        aligned: List[Dict[str, Dict]] = []
+        i, j = n, m
+        while i > 0 or j > 0:
+            if i > 0 and j > 0 and cost[i][j] == cost[i - 1][j - 1] + distance[i - 1][j - 1]:
+                aligned.append({**slots[i - 1], engine: words[j - 1]})
+                i, j = i - 1, j - 1
+            elif i > 0 and cost[i][j] == cost[i - 1][j] + 1:
+                aligned.append(slots[i - 1])
+                i -= 1
+            else:
+                aligned.append({engine: words[j - 1]})
+                j -= 1
+        
+        aligned.reverse()
+        return aligned
+    
+    def _slot_reference(self, slot: Dict[str, Dict], pivot: str) -> str:
+        """Palabra de referencia de una posición (la del pivote si existe)"""
+        word = slot.get(pivot) or next(iter(slot.values()))
+        return word['text'].lower()
+    
+    def _resplit(self, slots: List[Dict[str, Dict]], lengths: List[int],
+                 engine: str) -> List[List[Dict[str, Dict]]]:
+        """
+        Vuelve a dividir en líneas una red alineada sobre la página completa
+        
+        Las posiciones que ya existían conservan su línea; las insertadas por
+        el motor recién alineado quedan en la línea de la posición anterior.
+        """
+        lines: List[List[Dict[str, Dict]]] = [[] for _ in lengths]
+        line_idx = 0
+        count = 0
+        for slot in slots:
+            is_existing = bool(slot.keys() - {engine})
+            if is_existing:
+                while line_idx < len(lengths) - 1 and count >= lengths[line_idx]:
+                    line_idx += 1
+                    count = 0
+                count += 1
+            lines[line_idx].append(slot)
+        return lines
+    
+    def _vote(self, network: List[List[Dict[str, Dict]]], engines_count: int) -> Dict[str, Any]:
+        """
+        Elige la palabra ganadora en cada posición de la red
+        
+        Puntaje de cada candidata = suma de las confianzas de los motores que la
+        proponen; los motores que no proponen palabra votan por "vacío" con la
+        confianza configurada (null_confidence).
+        
+        Returns:
+            Texto fusionado + confianza por palabra + consenso
+        """
+        null_confidence = self.config.get('null_confidence', 0.5)
+        lines_text = []
+        fused_words = []
+        
+        for line in network:
+            line_words = []
+            for slot in line:
+                candidates: Dict[str, Dict[str, Any]] = {}
+                for engine, word in slot.items():
+                    key = word['text'].lower()
+                    candidate = candidates.setdefault(key, {'score': 0.0, 'engines': [], 'word': word})
+                    candidate['score'] += word['confidence']
+                    candidate['engines'].append(engine)
+                    if word['confidence'] > candidate['word']['confidence']:
+                        candidate['word'] = word
+                
+                best = max(candidates.values(), key=lambda c: c['score'])
+                empty_score = (engines_count - len(slot)) * null_confidence
+                if best['score'] <= empty_score:
+                    continue
+                
+                fused = {
+                    'text': best['word']['text'],
+                    'confidence': best['score'] / engines_count,
+                    'votes': len(best['engines']),
+                    'engines': best['engines'],
+                    'box': best['word']['box']
+                }
+                fused_words.append(fused)
+                line_words.append(fused['text'])
             
-            if weighted_score > best_score:
-                best_score = weighted_score
-                best_text = text1
+            if line_words:
+                lines_text.append(' '.join(line_words))
         
-        avg_confidence = sum(confidences) / len(confidences)
+        if not fused_words:
+            return {'text': '', 'confidence': 0, 'method': 'voting', 'consensus': 0, 'words': []}
         
         return {
-            'text': best_text,
-            'confidence': avg_confidence,
+            'text': '\n'.join(lines_text),
+            'confidence': sum(w['confidence'] for w in fused_words) / len(fused_words),
             'method': 'voting',
-            'consensus': best_score
+            'consensus': sum(w['votes'] for w in fused_words) / (len(fused_words) * engines_count),
+            'words': fused_words
         }
     
     def _combine_by_best_confidence(self, results: Dict[str, Dict]) -> Dict[str, Any]:
@@ -424,3 +1313,33 @@ class HybridOCR:
             'engines_count': len(all_texts)
         }
 
+
+def main():
+    """
+    Benchmark de TrOCR desde la línea de comandos (líneas/seg por tamaño de lote)
+    """
+    parser = argparse.ArgumentParser(description='Benchmark de rendimiento de TrOCR')
+    parser.add_argument('image', type=str, help='Imagen de una página de prueba')
+    parser.add_argument('--backend', type=str, default='torch', choices=['torch', 'int8', 'onnx'],
+                        help='Backend de inferencia de TrOCR')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8, 16],
+                        help='Tamaños de lote a comparar')
+    args = parser.parse_args()
+    
+    if not TROCR_AVAILABLE:
+        print("TrOCR no disponible - pip install transformers torch pillow")
+        sys.exit(1)
+    
+    image = cv2.imread(args.image)
+    if image is None:
+        print(f"No se pudo leer la imagen: {args.image}")
+        sys.exit(1)
+    
+    hybrid = HybridOCR({'trocr_backend': args.backend})
+    summary = hybrid.benchmark_trocr(image, args.batch_sizes)
+    summary['model'] = hybrid.model_stats().get(hybrid.model_keys['trocr'], {})
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -71,13 +71,63 @@ class PODValidationSystem:
         
         # Inicializar base de datos si está disponible
         if DATABASE_AVAILABLE:
-            self.db = PODDatabase()
+            self.db = PODDatabase(config=self.config.get('database', {}))
             logger.info("Base de datos conectada")
         else:
             self.db = None
         
+        # Cola de revisión con Gemini en segundo plano (se inicia con start_gemini_queue)
+        self.gemini_queue = None
+        
+        # Escritor por lotes de la BD (activo durante process_directory)
+        self.db_writer = None
+        
         logger.info("Sistema inicializado correctamente")
     
+    def start_gemini_queue(self) -> bool:
+        """
+        Inicia los hilos que atienden la cola de revisión con Gemini
+        
+        Solo aplica con gemini.queue.enabled, Gemini disponible y base de datos.
+        
+        Returns:
+            True si la cola quedó en ejecución
+        """
+        if not (self.classifier.gemini_queue_enabled and self.classifier.gemini_analyzer and self.db):
+            return False
+        
+        from gemini_queue import GeminiReviewQueue
+        self.gemini_queue = GeminiReviewQueue(self.config, self.db, self.classifier, self.processor)
+        self.gemini_queue.start()
+        return True
+    
+    def stop_gemini_queue(self, drain: bool = None) -> None:
+        """
+        Detiene la cola de revisión con Gemini
+        
+        Args:
+            drain: Esperar a que la cola se vacíe (por defecto gemini.queue.drain_on_exit)
+        """
+        if self.gemini_queue is None:
+            return
+        
+        if drain is None:
+            drain = self.config.get('gemini', {}).get('queue', {}).get('drain_on_exit', True)
+        if drain:
+            logger.info("Esperando a que termine la revisión con Gemini en segundo plano...")
+            self.gemini_queue.drain()
+        
+        self.gemini_queue.stop()
+        summary = self.gemini_queue.summary()
+        logger.info(f"Revisión Gemini: {summary['completed']} completadas, {summary['failed']} fallidas, "
+                    f"{summary['reclassified']} reclasificadas; en cola: {summary['queue']['pendiente']}")
+        if summary['batches']['requests']:
+            logger.info(f"Lotes Gemini: {summary['batches']['pods']} PODs en {summary['batches']['requests']} "
+                        f"solicitudes ({summary['batches']['pods_per_request']} por solicitud), "
+                        f"{summary['batches']['fallbacks']} revisados uno por uno")
+        self.gemini_queue.budget.log_report()
+        self.gemini_queue = None
+    
     def process_single_file(self, file_path: str, save_annotated: bool = True) -> Dict[str, Any]:
         """
         Procesa un solo archivo POD
@@ -132,8 +182,11 @@ class PODValidationSystem:
             # Guardar en base de datos si está disponible
             if self.db:
                 try:
-                    pod_id = self.db.save_pod_result(result)
-                    logger.debug(f"Resultado guardado en BD (ID: {pod_id})")
+                    if self.db_writer is not None:
+                        self.db_writer.add(result)
+                    else:
+                        pod_id = self.db.save_pod_result(result)
+                        logger.debug(f"Resultado guardado en BD (ID: {pod_id})")
                 except Exception as e:
                     logger.error(f"Error guardando en BD: {e}")
             
@@ -169,19 +222,27 @@ class PODValidationSystem:
         
         logger.info(f"Encontrados {len(files)} archivo(s) para procesar\n")
         
-        # Procesar cada archivo
+        # Procesar cada archivo (los resultados se guardan en la BD por lotes)
         all_results = []
+        if self.db:
+            self.db_writer = self.db.batch_writer()
         
-        for idx, file_path in enumerate(files, 1):
-            logger.info(f"[{idx}/{len(files)}] " + "=" * 60)
-            
-            try:
-                result = self.process_single_file(file_path)
-                if result:
-                    all_results.append(result)
-            except Exception as e:
-                logger.error(f"Error procesando {file_path}: {e}")
-                continue
+        try:
+            for idx, file_path in enumerate(files, 1):
+                logger.info(f"[{idx}/{len(files)}] " + "=" * 60)
+                
+                try:
+                    result = self.process_single_file(file_path)
+                    if result:
+                        all_results.append(result)
+                except Exception as e:
+                    logger.error(f"Error procesando {file_path}: {e}")
+                    continue
+        finally:
+            if self.db_writer is not None:
+                self.db_writer.close()
+                logger.debug(f"Escritura en BD: {self.db_writer.stats}")
+                self.db_writer = None
         
         logger.info("\n" + "=" * 80)
         logger.info("PROCESAMIENTO COMPLETADO")
@@ -379,6 +440,24 @@ class PODValidationSystem:
             for item in summary['issues_summary'][:5]:
                 print(f"  • {item['issue'][:70]}: {item['count']} veces")
         
+        cache_stats = summary.get('ocr_cache', {})
+        if cache_stats.get('enabled'):
+            print(f"\nCaché de OCR: {cache_stats['hits']} aciertos / "
+                  f"{cache_stats['hits'] + cache_stats['misses']} consultas "
+                  f"({cache_stats['hit_rate'] * 100:.1f}%), {cache_stats['entries']} entradas")
+        
+        gemini_cache = summary.get('gemini_cache', {})
+        if gemini_cache.get('enabled'):
+            print(f"Caché de Gemini: {gemini_cache['hits']} aciertos / "
+                  f"{gemini_cache['hits'] + gemini_cache['misses']} consultas "
+                  f"({gemini_cache['hit_rate'] * 100:.1f}%), {gemini_cache['entries']} entradas")
+        
+        gemini_payload = summary.get('gemini_payload', {})
+        if gemini_payload.get('calls'):
+            print(f"Imágenes enviadas a Gemini: {gemini_payload['payload_bytes'] / 1048576:.1f} MB "
+                  f"de {gemini_payload['original_bytes'] / 1048576:.1f} MB "
+                  f"({gemini_payload['saved_ratio'] * 100:.0f}% ahorrado)")
+        
         print("=" * 80)
 
 
@@ -395,6 +474,7 @@ Ejemplos de uso:
   python main.py --input documentos/entrada   # Procesar directorio específico
   python main.py --file documento.pdf         # Procesar un solo archivo
   python main.py --interactive                # Modo interactivo
+  python main.py --daemon --workers 4         # Servicio residente (cliente: pod_client.py)
         """
     )
     
@@ -410,6 +490,12 @@ Ejemplos de uso:
                        help='Modo interactivo con visualización')
     parser.add_argument('--no-annotated', action='store_true',
                        help='No guardar imágenes anotadas')
+    parser.add_argument('--daemon', action='store_true',
+                       help='Servicio residente: precarga el sistema y atiende por socket Unix')
+    parser.add_argument('--socket', type=str,
+                       help='Socket del servicio (por defecto daemon.socket_path)')
+    parser.add_argument('--workers', type=int,
+                       help='Procesos del servicio (por defecto daemon.workers)')
     
     args = parser.parse_args()
     
@@ -417,9 +503,16 @@ Ejemplos de uso:
     system = PODValidationSystem(args.config)
     
     # Procesar según argumentos
-    if args.file:
+    if args.daemon:
+        # Servicio residente (solo Unix)
+        from daemon import run_daemon
+        run_daemon(system, args.socket, args.workers)
+    
+    elif args.file:
         # Procesar un solo archivo
+        system.start_gemini_queue()
         system.process_single_file(args.file, save_annotated=not args.no_annotated)
+        system.stop_gemini_queue()
     
     elif args.interactive:
         # Modo interactivo
@@ -429,7 +522,9 @@ Ejemplos de uso:
     else:
         # Procesar directorio
         input_dir = args.input if args.input else None
+        system.start_gemini_queue()
         system.process_directory(input_dir)
+        system.stop_gemini_queue()
 
 
 if __name__ == "__main__":
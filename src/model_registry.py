@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+Registro de Modelos
+Carga perezosa y compartida (una instancia por proceso) de los modelos de OCR
+"""
+
+import os
+import time
+import threading
+from datetime import datetime
+from typing import Dict, Any, Callable, List, Optional
+from loguru import logger
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    RESOURCE_AVAILABLE = False
+
+
+def _process_memory_mb() -> Optional[float]:
+    """
+    Memoria residente del proceso en MB
+
+    Usa psutil si está instalado; si no, el pico de memoria de resource
+    (solo Unix). Devuelve None si ninguno está disponible.
+    """
+    if PSUTIL_AVAILABLE:
+        return psutil.Process(os.getpid()).memory_info().rss / (1024 * 1024)
+    if RESOURCE_AVAILABLE:
+        # ru_maxrss está en KB en Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return None
+
+
+class ModelRegistry:
+    """
+    Registro de modelos cargados bajo demanda
+
+    Cada modelo se registra con una función de carga y se construye la
+    primera vez que alguien lo pide. La instancia se comparte entre todos
+    los consumidores del proceso, y la carga está protegida por un candado
+    por modelo para que hilos concurrentes no la repitan.
+    """
+
+    def __init__(self):
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._models: Dict[str, Any] = {}
+        self._errors: Dict[str, str] = {}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable[[], Any]) -> None:
+        """
+        Registra la función de carga de un modelo (no lo carga)
+
+        Args:
+            name: Nombre del modelo
+            loader: Función sin argumentos que construye el modelo
+        """
+        with self._lock:
+            if name not in self._loaders:
+                self._loaders[name] = loader
+                self._locks[name] = threading.Lock()
+
+    def is_registered(self, name: str) -> bool:
+        """Indica si el modelo tiene función de carga registrada"""
+        return name in self._loaders
+
+    def is_loaded(self, name: str) -> bool:
+        """Indica si el modelo ya está en memoria"""
+        return name in self._models
+
+    def get(self, name: str) -> Any:
+        """
+        Obtiene el modelo, cargándolo si es la primera vez
+
+        Args:
+            name: Nombre del modelo
+
+        Returns:
+            Instancia compartida del modelo
+
+        Raises:
+            KeyError: Si el modelo no está registrado
+            RuntimeError: Si la carga falló (el error se recuerda hasta unload())
+        """
+        if name in self._models:
+            return self._models[name]
+
+        if name not in self._loaders:
+            raise KeyError(f"Modelo no registrado: {name}")
+
+        with self._locks[name]:
+            if name in self._models:
+                return self._models[name]
+            if name in self._errors:
+                raise RuntimeError(f"Carga previa de {name} falló: {self._errors[name]}")
+
+            logger.info(f"Cargando modelo {name}...")
+            memory_before = _process_memory_mb()
+            start = time.perf_counter()
+
+            try:
+                model = self._loaders[name]()
+            except Exception as e:
+                self._errors[name] = str(e)
+                logger.error(f"Error cargando modelo {name}: {e}")
+                raise RuntimeError(f"Error cargando modelo {name}: {e}") from e
+
+            load_seconds = time.perf_counter() - start
+            memory_after = _process_memory_mb()
+            memory_mb = (
+                round(memory_after - memory_before, 1)
+                if memory_before is not None and memory_after is not None else None
+            )
+
+            self._stats[name] = {
+                'load_seconds': round(load_seconds, 2),
+                'memory_mb': memory_mb,
+                'loaded_at': datetime.now().isoformat()
+            }
+            self._models[name] = model
+
+            logger.info(f"✅ Modelo {name} cargado en {load_seconds:.1f}s"
+                        + (f" (+{memory_mb} MB)" if memory_mb is not None else ""))
+            return model
+
+    def warmup(self, names: List[str] = None) -> Dict[str, bool]:
+        """
+        Precarga modelos (para servicios de larga duración)
+
+        Args:
+            names: Modelos a cargar (None = todos los registrados)
+
+        Returns:
+            Diccionario {modelo: cargado_correctamente}
+        """
+        status = {}
+        for name in (names if names is not None else list(self._loaders)):
+            try:
+                self.get(name)
+                status[name] = True
+            except (KeyError, RuntimeError):
+                status[name] = False
+        return status
+
+    def unload(self, name: str) -> None:
+        """Libera un modelo (y olvida un error de carga previo)"""
+        with self._lock:
+            self._models.pop(name, None)
+            self._errors.pop(name, None)
+            self._stats.pop(name, None)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Estadísticas de los modelos registrados
+
+        Returns:
+            Diccionario {modelo: {'loaded', 'load_seconds', 'memory_mb', 'loaded_at', 'error'}}
+        """
+        return {
+            name: {
+                'loaded': name in self._models,
+                **self._stats.get(name, {}),
+                **({'error': self._errors[name]} if name in self._errors else {})
+            }
+            for name in self._loaders
+        }
+
+
+# Registro único del proceso
+_REGISTRY = ModelRegistry()
+
+
+def get_model_registry() -> ModelRegistry:
+    """
+    Obtiene el registro de modelos del proceso
+
+    Returns:
+        Registro compartido
+    """
+    return _REGISTRY
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Cliente del Servicio Residente de Validación de PODs
+Envía archivos al servicio por su socket Unix; solo usa la biblioteca estándar
+para que cada invocación arranque al instante
+"""
+
+import os
+import sys
+import json
+import socket
+import argparse
+from typing import Dict, Any
+
+DEFAULT_SOCKET_PATH = os.getenv('POD_DAEMON_SOCKET', 'database/pod_daemon.sock')
+
+
+class PODClient:
+    """
+    Cliente del servicio residente (ver daemon.py)
+    """
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET_PATH, timeout: float = 600):
+        """
+        Args:
+            socket_path: Ruta del socket Unix del servicio
+            timeout: Segundos máximos de espera por respuesta
+        """
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def is_available(self) -> bool:
+        """Indica si hay un servicio escuchando en el socket"""
+        if not hasattr(socket, 'AF_UNIX') or not os.path.exists(self.socket_path):
+            return False
+        try:
+            return self.request({'command': 'ping'}, timeout=2).get('ok', False)
+        except OSError:
+            return False
+
+    def request(self, message: Dict[str, Any], timeout: float = None) -> Dict[str, Any]:
+        """
+        Envía una solicitud y espera la respuesta
+
+        Args:
+            message: Solicitud
+            timeout: Tiempo límite (por defecto el del cliente)
+
+        Returns:
+            Respuesta del servicio
+        """
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(timeout or self.timeout)
+            conn.connect(self.socket_path)
+            conn.sendall((json.dumps(message) + '\n').encode('utf-8'))
+
+            chunks = []
+            while True:
+                chunk = conn.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                if chunk.endswith(b'\n'):
+                    break
+
+        if not chunks:
+            return {'ok': False, 'error': 'El servicio cerró la conexión sin responder'}
+        return json.loads(b''.join(chunks).decode('utf-8'))
+
+    def process_file(self, file_path: str, save_annotated: bool = True) -> Dict[str, Any]:
+        """
+        Procesa un archivo en el servicio
+
+        Args:
+            file_path: Ruta al archivo (se envía absoluta)
+            save_annotated: Si se deben guardar imágenes anotadas
+
+        Returns:
+            Respuesta con 'ok', 'result' y 'seconds'
+        """
+        return self.request({
+            'command': 'process',
+            'file': os.path.abspath(file_path),
+            'save_annotated': save_annotated
+        })
+
+    def stats(self) -> Dict[str, Any]:
+        """Estado del proceso que atiende la solicitud"""
+        return self.request({'command': 'stats'}, timeout=10)
+
+
+def _print_result(result: Dict[str, Any]) -> None:
+    """Imprime el resultado de clasificación de forma legible"""
+    print("\n" + "=" * 60)
+    print("RESULTADO DE CLASIFICACIÓN")
+    print("=" * 60)
+    print(f"Archivo: {result['source_file']}")
+    print(f"Página: {result['page_number']}")
+    print(f"\nClasificación: {result['classification']}")
+    print(f"Código: {result['classification_code']}")
+    print(f"Confianza: {result['confidence']:.1%}")
+    print(f"Válido: {'[OK] SI' if result['is_valid'] else '[X] NO'}")
+
+    if result.get('issues'):
+        print(f"\nDetalles:")
+        for issue in result['issues']:
+            print(f"  - {issue}")
+
+    if result.get('recommendations'):
+        print(f"\nRecomendaciones:")
+        for rec in result['recommendations']:
+            print(f"  > {rec}")
+
+    print("=" * 60)
+
+
+def main():
+    """
+    Cliente de línea de comandos
+    """
+    parser = argparse.ArgumentParser(description='Cliente del servicio de validación de PODs')
+    parser.add_argument('files', nargs='*', help='Archivos a procesar')
+    parser.add_argument('--socket', type=str, default=DEFAULT_SOCKET_PATH, help='Socket del servicio')
+    parser.add_argument('--no-annotated', action='store_true', help='No guardar imágenes anotadas')
+    parser.add_argument('--json', action='store_true', help='Imprimir la respuesta completa en JSON')
+    parser.add_argument('--stats', action='store_true', help='Mostrar el estado del servicio')
+    args = parser.parse_args()
+
+    client = PODClient(args.socket)
+    if not client.is_available():
+        print(f"No hay servicio escuchando en {args.socket}. Inícielo con: python src/main.py --daemon",
+              file=sys.stderr)
+        sys.exit(2)
+
+    if args.stats:
+        print(json.dumps(client.stats(), indent=2, ensure_ascii=False))
+
+    exit_code = 0
+    for file_path in args.files:
+        response = client.process_file(file_path, save_annotated=not args.no_annotated)
+
+        if args.json:
+            print(json.dumps(response, indent=2, ensure_ascii=False))
+        elif response.get('ok'):
+            results = response['result']
+            for result in (results if isinstance(results, list) else [results]):
+                _print_result(result)
+            print(f"Tiempo en el servicio: {response['seconds']:.2f}s")
+
+        if not response.get('ok'):
+            print(f"Error: {response.get('error')}", file=sys.stderr)
+            exit_code = 1
+
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,11 +4,13 @@ Generador de Reportes Ejecutivos Automáticos
 Crea reportes en PDF/Excel con dashboards, KPIs y recomendaciones
 """
 
-from datetime import datetime, timedelta
+from datetime import datetime, date, timedelta
 from typing import Dict, Any, List
 from loguru import logger
 import json
 
+from database import fts_query
+
 
 class ExecutiveReportGenerator:
     """Genera reportes ejecutivos automáticos"""
@@ -23,36 +25,37 @@ class ExecutiveReportGenerator:
         """
         cursor = self.conn.cursor()
         
-        # Período: última semana
-        week_ago = (datetime.now() - timedelta(days=7)).isoformat()
+        # Período: últimos 7 días (hoy incluido), sobre los agregados diarios
+        week_ago = (date.today() - timedelta(days=6)).isoformat()
         
         # KPIs principales
         cursor.execute("""
             SELECT 
-                COUNT(*) as total,
-                SUM(CASE WHEN es_valido = 1 THEN 1 ELSE 0 END) as valid,
-                SUM(CASE WHEN es_valido = 0 THEN 1 ELSE 0 END) as invalid
-            FROM resultados
-            WHERE fecha_analisis >= ?
+                COALESCE(SUM(total), 0) as total,
+                COALESCE(SUM(validos), 0) as valid,
+                COALESCE(SUM(total - validos), 0) as invalid
+            FROM resumen_diario
+            WHERE fecha >= ?
         """, (week_ago,))
         
         kpis = cursor.fetchone()
         
         # Por clasificación
         cursor.execute("""
-            SELECT codigo_clasificacion, COUNT(*)
-            FROM resultados
-            WHERE fecha_analisis >= ?
+            SELECT codigo_clasificacion, SUM(total)
+            FROM resumen_diario
+            WHERE fecha >= ?
             GROUP BY codigo_clasificacion
+            HAVING SUM(total) > 0
         """, (week_ago,))
         
         by_class = dict(cursor.fetchall())
         
-        # Alertas críticas
+        # Alertas críticas (índice por prioridad y fecha)
         cursor.execute("""
             SELECT COUNT(*)
             FROM alertas
-            WHERE fecha >= ? AND prioridad = 'HIGH'
+            WHERE prioridad = 'HIGH' AND fecha >= ?
         """, (week_ago,))
         
         critical_alerts = cursor.fetchone()[0]
@@ -110,24 +113,25 @@ class SentimentTrendAnalyzer:
         """
         cursor = self.conn.cursor()
         
-        date_limit = (datetime.now() - timedelta(days=days)).isoformat()
+        date_limit = (date.today() - timedelta(days=days)).isoformat()
         
+        # Agregados diarios de los análisis de Gemini
         query = """
             SELECT 
-                strftime('%W', fecha_analisis) as week,
-                manuscritos_sentimiento,
-                COUNT(*) as count
-            FROM gemini_analisis
-            WHERE fecha_analisis >= ?
+                strftime('%W', fecha) as week,
+                sentimiento,
+                SUM(analisis) as count
+            FROM resumen_sentimiento_diario
+            WHERE fecha >= ?
         """
         
         params = [date_limit]
         
         if client_name:
-            query += " AND cliente LIKE ?"
-            params.append(f'%{client_name}%')
+            query += " AND cliente IN (SELECT cliente FROM busqueda_pods WHERE busqueda_pods MATCH ?)"
+            params.append(fts_query(client_name, column='cliente') or '""')
         
-        query += " GROUP BY week, manuscritos_sentimiento ORDER BY week"
+        query += " GROUP BY week, sentimiento ORDER BY week"
         
         cursor.execute(query, params)
         results = cursor.fetchall()
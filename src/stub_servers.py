@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+Servidores Locales de Prueba
+Imitan la forma de solicitud/respuesta de las APIs en la nube para pruebas de carga sin conexión
+"""
+
+import json
+import time
+import base64
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any
+import cv2
+import numpy as np
+from loguru import logger
+
+
+def _fake_text_annotations(content: bytes) -> Dict[str, Any]:
+    """
+    Respuesta de TEXT_DETECTION para una imagen
+
+    El texto es fijo y las cajas se reparten sobre el ancho de la imagen, de modo
+    que la respuesta es determinista y tiene la misma estructura que la real.
+    """
+    image = cv2.imdecode(np.frombuffer(content, np.uint8), cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        return {'error': {'code': 3, 'message': 'Bad image data.'}}
+
+    h, w = image.shape[:2]
+    words = ['REMISION', '12345', 'RECIBIDO', 'CONFORME']
+    step = w // len(words)
+
+    annotations = [{
+        'locale': 'es',
+        'description': ' '.join(words) + '\n',
+        'boundingPoly': {'vertices': [{'x': 0, 'y': 0}, {'x': w, 'y': 0}, {'x': w, 'y': h}, {'x': 0, 'y': h}]}
+    }]
+    for i, word in enumerate(words):
+        x0, x1 = i * step, (i + 1) * step - 4
+        annotations.append({
+            'description': word,
+            'boundingPoly': {'vertices': [
+                {'x': x0, 'y': h // 3}, {'x': x1, 'y': h // 3},
+                {'x': x1, 'y': h // 2}, {'x': x0, 'y': h // 2}
+            ]}
+        })
+
+    return {'textAnnotations': annotations}
+
+
+class VisionStubHandler(BaseHTTPRequestHandler):
+    """
+    Implementa POST /v1/images:annotate con la forma de la API REST de Google Vision
+
+    La latencia (por lote) y la proporción de errores 503 se leen del servidor.
+    """
+
+    def do_POST(self):
+        if not self.path.split('?')[0].endswith('/v1/images:annotate'):
+            self._send_json(404, {'error': {'code': 404, 'message': 'Not found'}})
+            return
+
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            body = json.loads(self.rfile.read(length))
+            requests_batch = body['requests']
+        except (ValueError, KeyError):
+            self._send_json(400, {'error': {'code': 400, 'message': 'Invalid JSON payload'}})
+            return
+
+        if len(requests_batch) > self.server.max_batch_size:
+            self._send_json(400, {'error': {
+                'code': 400,
+                'message': f"At most {self.server.max_batch_size} images per request"
+            }})
+            return
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        if random.random() < self.server.failure_rate:
+            self.server.count('failures')
+            self._send_json(503, {'error': {'code': 503, 'message': 'The service is currently unavailable.'}})
+            return
+
+        responses = []
+        for request in requests_batch:
+            try:
+                content = base64.b64decode(request['image']['content'])
+            except (KeyError, ValueError):
+                responses.append({'error': {'code': 3, 'message': 'Bad image data.'}})
+                continue
+            responses.append(_fake_text_annotations(content))
+
+        self.server.count('batches')
+        self.server.count('images', len(requests_batch))
+        self._send_json(200, {'responses': responses})
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(f"stub {self.address_string()} - {format % args}")
+
+
+# Respuesta fija del servidor de prueba de Gemini para solicitudes JSON
+_GEMINI_JSON_REPLY = {
+    'manuscritos': {'hay_manuscritos': False, 'transcripcion': '', 'sentimiento': 'NEUTRAL',
+                    'urgencia': 'INFO', 'resumen': ''},
+    'firma': {'tipo': 'MANUSCRITA', 'confianza': 'ALTA', 'ubicacion': 'inferior', 'explicacion': 'stub'},
+    'campos': {'factura': 'No visible', 'cliente': 'No visible', 'pedido': 'No visible',
+               'fecha_entrega': 'No visible', 'productos': 'No visible', 'cantidad': 'No visible',
+               'direccion': 'No visible'},
+    'clasificacion': {'categoria': 'OK', 'confianza': 'ALTA', 'razon': 'stub'}
+}
+
+
+class GeminiStubHandler(BaseHTTPRequestHandler):
+    """
+    Implementa POST /v1beta/models/{modelo}:generateContent con la forma de la API REST de Gemini
+
+    Con responseMimeType application/json responde una revisión consolidada
+    fija (un arreglo con una por imagen si la solicitud trae varias); si no,
+    un texto. La latencia se varía ±50% y una proporción de las
+    solicitudes responde 429 (con Retry-After) o 503.
+    """
+
+    def do_POST(self):
+        if not self.path.split('?')[0].endswith(':generateContent'):
+            self._send_json(404, {'error': {'code': 404, 'message': 'Not found'}})
+            return
+
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            body = json.loads(self.rfile.read(length))
+            parts = body['contents'][0]['parts']
+        except (ValueError, KeyError, IndexError):
+            self._send_json(400, {'error': {'code': 400, 'message': 'Invalid JSON payload'}})
+            return
+
+        if self.server.latency:
+            time.sleep(self.server.latency * (0.5 + random.random()))
+
+        if random.random() < self.server.failure_rate:
+            self.server.count('failures')
+            if random.random() < 0.5:
+                self._send_json(429, {'error': {'code': 429, 'message': 'Resource has been exhausted'}},
+                                headers={'Retry-After': '1'})
+            else:
+                self._send_json(503, {'error': {'code': 503, 'message': 'The model is overloaded.'}})
+            return
+
+        images = sum(1 for part in parts if 'inline_data' in part or 'inlineData' in part)
+        generation_config = body.get('generationConfig', {})
+        if generation_config.get('responseMimeType') == 'application/json' and images > 1:
+            reply = [{'imagen': i, **_GEMINI_JSON_REPLY} for i in range(1, images + 1)]
+            text = json.dumps(reply, ensure_ascii=False)
+        elif generation_config.get('responseMimeType') == 'application/json':
+            text = json.dumps(_GEMINI_JSON_REPLY, ensure_ascii=False)
+        else:
+            text = "CLASIFICACIÓN: OK\nCONFIANZA: ALTA\nRAZÓN: respuesta del servidor de prueba"
+
+        self.server.count('batches')
+        self.server.count('images', images)
+        self._send_json(200, {
+            'candidates': [{'content': {'role': 'model', 'parts': [{'text': text}]}, 'finishReason': 'STOP'}],
+            'usageMetadata': {'promptTokenCount': 258 * images, 'candidatesTokenCount': len(text) // 4}
+        })
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Dict[str, str] = None) -> None:
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(f"stub {self.address_string()} - {format % args}")
+
+
+# Manejadores disponibles por tipo de servidor
+STUB_HANDLERS = {
+    'vision': VisionStubHandler,
+    'gemini': GeminiStubHandler
+}
+
+
+class StubServer(ThreadingHTTPServer):
+    """Servidor HTTP multihilo con latencia, errores simulados y contadores"""
+
+    daemon_threads = True
+
+    def __init__(self, address, handler, latency: float = 0.0,
+                 failure_rate: float = 0.0, max_batch_size: int = 16):
+        super().__init__(address, handler)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.max_batch_size = max_batch_size
+        self.counters = {'batches': 0, 'images': 0, 'failures': 0}
+        self._lock = threading.Lock()
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += amount
+
+
+def start_stub_server(host: str = '127.0.0.1', port: int = 0, latency: float = 0.0,
+                      failure_rate: float = 0.0, kind: str = 'vision') -> StubServer:
+    """
+    Levanta un servidor de prueba en un hilo de fondo
+
+    Args:
+        host: Dirección de escucha
+        port: Puerto (0 = cualquiera libre; ver server.server_address)
+        latency: Segundos de espera por solicitud
+        failure_rate: Proporción de solicitudes que responden con error transitorio
+        kind: 'vision' (Google Vision) o 'gemini'
+
+    Returns:
+        Servidor en ejecución (detener con server.shutdown())
+    """
+    server = StubServer((host, port), STUB_HANDLERS[kind], latency=latency, failure_rate=failure_rate)
+    threading.Thread(target=server.serve_forever, daemon=True, name=f'{kind}-stub').start()
+    logger.info(f"Servidor de prueba de {kind} en http://{host}:{server.server_address[1]}")
+    return server
+
+
+def main():
+    """Ejecuta un servidor de prueba en primer plano"""
+    parser = argparse.ArgumentParser(description='Servidores locales de prueba (Google Vision, Gemini)')
+    parser.add_argument('kind', nargs='?', choices=sorted(STUB_HANDLERS), default='vision',
+                        help='API a imitar')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Dirección de escucha')
+    parser.add_argument('--port', type=int, default=8089, help='Puerto')
+    parser.add_argument('--latency', type=float, default=0.3, help='Latencia simulada por solicitud (s)')
+    parser.add_argument('--failure-rate', type=float, default=0.0,
+                        help='Proporción de errores transitorios simulados')
+    args = parser.parse_args()
+
+    server = StubServer((args.host, args.port), STUB_HANDLERS[args.kind],
+                        latency=args.latency, failure_rate=args.failure_rate)
+    logger.info(f"Servidor de prueba de {args.kind} en http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logger.info(f"Contadores: {server.counters}")
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
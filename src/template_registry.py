@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+Registro de Plantillas de Remisión
+Alinea cada página con layouts conocidos (Deacero/Ingetek) para localizar
+los campos sin necesidad de OCR de página completa
+"""
+
+import os
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+import cv2
+import numpy as np
+import yaml
+from loguru import logger
+
+
+class TemplateRegistry:
+    """
+    Registro de layouts de remisión conocidos
+
+    Cada plantilla es un archivo YAML en el directorio de plantillas con una
+    imagen de referencia y las cajas de sus campos en coordenadas relativas
+    (mismo formato que las zonas de settings.yaml).
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        """
+        Inicializa el registro y carga las plantillas disponibles
+
+        Args:
+            config: Diccionario de configuración
+        """
+        template_config = config.get('templates', {})
+        self.enabled = template_config.get('enabled', False)
+        self.templates_dir = template_config.get('dir', 'config/templates')
+        self.thumbnail_size = template_config.get('thumbnail_size', 800)
+        self.max_features = template_config.get('max_features', 1000)
+        self.ratio_test = template_config.get('ratio_test', 0.75)
+        self.min_inliers = template_config.get('min_inliers', 25)
+        self.mask_static = template_config.get('mask_static_regions', False)
+
+        self.templates: Dict[str, Dict[str, Any]] = {}
+
+        if self.enabled:
+            self.load_templates()
+
+        logger.info(f"Registro de plantillas inicializado ({len(self.templates)} plantilla(s))")
+
+    def load_templates(self) -> None:
+        """
+        Carga todas las plantillas (*.yaml) del directorio configurado
+        """
+        if not os.path.isdir(self.templates_dir):
+            logger.debug(f"Directorio de plantillas no encontrado: {self.templates_dir}")
+            return
+
+        for template_file in sorted(Path(self.templates_dir).glob('*.yaml')):
+            try:
+                with open(template_file, 'r', encoding='utf-8') as f:
+                    definition = yaml.safe_load(f)
+
+                image_path = os.path.join(self.templates_dir, definition['reference_image'])
+                reference = cv2.imread(image_path)
+                if reference is None:
+                    logger.warning(f"Imagen de referencia no encontrada: {image_path}")
+                    continue
+
+                self._add_template(
+                    definition.get('name', template_file.stem),
+                    reference,
+                    definition.get('fields', {}),
+                    definition.get('static_regions', [])
+                )
+            except Exception as e:
+                logger.error(f"Error cargando plantilla {template_file}: {e}")
+
+    def register_template(self, name: str, reference_image: np.ndarray,
+                          fields: Dict[str, Dict[str, float]],
+                          static_regions: List[Dict[str, float]] = None,
+                          save: bool = True) -> None:
+        """
+        Registra una nueva plantilla a partir de una página de referencia
+
+        Args:
+            name: Nombre de la plantilla
+            reference_image: Imagen de la remisión de referencia (sin llenar)
+            fields: Cajas de campos {campo: {x_start, x_end, y_start, y_end}}
+            static_regions: Regiones de texto fijo que pueden enmascararse
+            save: Si se debe guardar la plantilla en el directorio de plantillas
+        """
+        static_regions = static_regions or []
+        self._add_template(name, reference_image, fields, static_regions)
+
+        if save:
+            os.makedirs(self.templates_dir, exist_ok=True)
+            image_name = f"{name}.png"
+            cv2.imwrite(os.path.join(self.templates_dir, image_name), reference_image)
+
+            definition = {
+                'name': name,
+                'reference_image': image_name,
+                'fields': fields,
+                'static_regions': static_regions
+            }
+            with open(os.path.join(self.templates_dir, f"{name}.yaml"), 'w', encoding='utf-8') as f:
+                yaml.safe_dump(definition, f, allow_unicode=True, sort_keys=False)
+
+            logger.info(f"Plantilla guardada: {name}")
+
+    def _add_template(self, name: str, reference_image: np.ndarray,
+                      fields: Dict[str, Dict[str, float]],
+                      static_regions: List[Dict[str, float]]) -> None:
+        """
+        Calcula los descriptores de la plantilla y la agrega al registro
+        """
+        thumbnail, _ = self._thumbnail(reference_image)
+        keypoints, descriptors = self._features(thumbnail)
+
+        if descriptors is None or len(keypoints) < self.min_inliers:
+            logger.warning(f"Plantilla {name} sin suficientes características - ignorada")
+            return
+
+        self.templates[name] = {
+            'fields': fields,
+            'static_regions': static_regions,
+            'thumbnail_shape': thumbnail.shape[:2],
+            'points': np.float32([kp.pt for kp in keypoints]),
+            'descriptors': descriptors
+        }
+        logger.debug(f"Plantilla registrada: {name} ({len(keypoints)} puntos clave)")
+
+    def _thumbnail(self, image: np.ndarray) -> Tuple[np.ndarray, float]:
+        """
+        Reduce la imagen a escala de grises con lado mayor = thumbnail_size
+
+        Returns:
+            Tupla (miniatura, escala aplicada)
+        """
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+        h, w = gray.shape[:2]
+        scale = min(1.0, self.thumbnail_size / max(h, w))
+        if scale < 1.0:
+            gray = cv2.resize(gray, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+        return gray, scale
+
+    def _features(self, gray: np.ndarray):
+        """Detecta puntos clave ORB y sus descriptores"""
+        orb = cv2.ORB_create(nfeatures=self.max_features)
+        return orb.detectAndCompute(gray, None)
+
+    def match(self, image: np.ndarray) -> Optional[Dict[str, Any]]:
+        """
+        Alinea la página con la plantilla más parecida
+
+        Args:
+            image: Imagen de la página
+
+        Returns:
+            Diccionario con 'template', 'inliers', 'homography' y las cajas
+            absolutas 'fields' {campo: (x, y, w, h)} y 'static_regions',
+            o None si ninguna plantilla coincide
+        """
+        if not self.templates:
+            return None
+
+        thumbnail, scale = self._thumbnail(image)
+        keypoints, descriptors = self._features(thumbnail)
+        if descriptors is None or len(keypoints) < self.min_inliers:
+            return None
+
+        page_points = np.float32([kp.pt for kp in keypoints])
+        matcher = cv2.BFMatcher(cv2.NORM_HAMMING)
+
+        best = None
+        for name, template in self.templates.items():
+            pairs = matcher.knnMatch(template['descriptors'], descriptors, k=2)
+            good = [m[0] for m in pairs
+                    if len(m) == 2 and m[0].distance < self.ratio_test * m[1].distance]
+            if len(good) < self.min_inliers:
+                continue
+
+            src = template['points'][[m.queryIdx for m in good]].reshape(-1, 1, 2)
+            dst = page_points[[m.trainIdx for m in good]].reshape(-1, 1, 2)
+            homography, inlier_mask = cv2.findHomography(src, dst, cv2.RANSAC, 5.0)
+            if homography is None:
+                continue
+
+            inliers = int(inlier_mask.sum())
+            if inliers >= self.min_inliers and (best is None or inliers > best['inliers']):
+                best = {'template': name, 'inliers': inliers, 'homography': homography}
+
+        if best is None:
+            logger.debug("Layout desconocido - ninguna plantilla coincide")
+            return None
+
+        template = self.templates[best['template']]
+        h_img, w_img = image.shape[:2]
+        best['fields'] = {
+            field: self._project_box(box, template, best['homography'], scale, w_img, h_img)
+            for field, box in template['fields'].items()
+        }
+        best['static_regions'] = [
+            self._project_box(box, template, best['homography'], scale, w_img, h_img)
+            for box in template['static_regions']
+        ]
+
+        logger.info(f"Plantilla detectada: {best['template']} ({best['inliers']} inliers)")
+        return best
+
+    def _project_box(self, box: Dict[str, float], template: Dict[str, Any],
+                     homography: np.ndarray, scale: float,
+                     width: int, height: int) -> Tuple[int, int, int, int]:
+        """
+        Proyecta una caja relativa de la plantilla a coordenadas absolutas de la página
+
+        Returns:
+            Caja (x, y, w, h) recortada a los límites de la página
+        """
+        t_h, t_w = template['thumbnail_shape']
+        corners = np.float32([
+            [box['x_start'] * t_w, box['y_start'] * t_h],
+            [box['x_end'] * t_w, box['y_start'] * t_h],
+            [box['x_end'] * t_w, box['y_end'] * t_h],
+            [box['x_start'] * t_w, box['y_end'] * t_h]
+        ]).reshape(-1, 1, 2)
+
+        projected = cv2.perspectiveTransform(corners, homography).reshape(-1, 2) / scale
+
+        x1 = int(np.clip(projected[:, 0].min(), 0, width))
+        y1 = int(np.clip(projected[:, 1].min(), 0, height))
+        x2 = int(np.clip(projected[:, 0].max(), 0, width))
+        y2 = int(np.clip(projected[:, 1].max(), 0, height))
+        return (x1, y1, x2 - x1, y2 - y1)
+
+    def mask_static_regions(self, image: np.ndarray,
+                            template_match: Dict[str, Any]) -> np.ndarray:
+        """
+        Pinta de blanco las regiones de texto fijo de la plantilla, para que
+        los detectores de sellos y anotaciones no las analicen
+
+        Args:
+            image: Imagen de la página
+            template_match: Resultado de match()
+
+        Returns:
+            Copia de la imagen con las regiones fijas enmascaradas
+        """
+        masked = image.copy()
+        for x, y, w, h in template_match.get('static_regions', []):
+            masked[y:y+h, x:x+w] = 255
+        return masked
@@ -0,0 +1,362 @@
+# -*- coding: utf-8 -*-
+"""
+Cliente por Lotes de Google Cloud Vision
+Envía imágenes en lotes (batch_annotate_images) con varios lotes en vuelo y reintentos
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+import cv2
+import numpy as np
+import requests
+from loguru import logger
+
+try:
+    from google.cloud import vision
+    GOOGLE_VISION_AVAILABLE = True
+except ImportError:
+    GOOGLE_VISION_AVAILABLE = False
+    logger.warning("Google Cloud Vision no disponible")
+
+# Límite de imágenes por solicitud de la API
+MAX_BATCH_SIZE = 16
+
+# Códigos HTTP que vale la pena reintentar
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Confianza reportada para Google Vision (la API no da confianza por documento)
+VISION_CONFIDENCE = 0.92
+
+
+class VisionBatchClient:
+    """
+    Cliente de Google Vision que agrupa imágenes en lotes
+
+    Soporta dos backends con la misma forma de solicitud:
+    - 'grpc': biblioteca google-cloud-vision (credenciales por defecto de la aplicación)
+    - 'rest': POST a {endpoint}/v1/images:annotate (API key o servidor local de prueba)
+    """
+
+    def __init__(self, config: Dict[str, Any] = None):
+        """
+        Inicializa el cliente
+
+        Args:
+            config: Diccionario con backend, endpoint, api_key, batch_size,
+                    max_in_flight, max_retries, timeout y jpeg_quality
+        """
+        config = config or {}
+        self.backend = config.get('backend', 'grpc' if GOOGLE_VISION_AVAILABLE else 'rest')
+        self.endpoint = config.get('endpoint', 'https://vision.googleapis.com').rstrip('/')
+        self.api_key = config.get('api_key') or os.getenv('GOOGLE_VISION_API_KEY')
+        self.batch_size = min(config.get('batch_size', MAX_BATCH_SIZE), MAX_BATCH_SIZE)
+        self.max_in_flight = config.get('max_in_flight', 4)
+        self.max_retries = config.get('max_retries', 3)
+        self.timeout = config.get('timeout', 60)
+        self.jpeg_quality = config.get('jpeg_quality', 90)
+
+        self.stats = {'batches': 0, 'images': 0, 'retries': 0, 'failed_batches': 0}
+        self._stats_lock = threading.Lock()
+        self._executor = None
+        self._grpc_client = None
+        self._session = requests.Session()
+
+        if self.backend == 'grpc' and not GOOGLE_VISION_AVAILABLE:
+            logger.warning("google-cloud-vision no disponible - se usa el backend REST")
+            self.backend = 'rest'
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Pool de hilos para los lotes en vuelo (se crea una vez)"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight,
+                                                thread_name_prefix='vision')
+        return self._executor
+
+    def _encode(self, image: np.ndarray) -> bytes:
+        """Codifica la imagen como JPEG"""
+        success, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not success:
+            raise ValueError("No se pudo codificar la imagen")
+        return encoded.tobytes()
+
+    def annotate(self, images: List[np.ndarray]) -> List[Dict[str, Any]]:
+        """
+        Reconoce texto en varias imágenes
+
+        Args:
+            images: Lista de imágenes
+
+        Returns:
+            Un resultado por imagen (mismo orden) con el formato de HybridOCR:
+            'engine', 'text', 'confidence', 'words_count', 'words', 'success'
+        """
+        if not images:
+            return []
+
+        batches = [
+            list(range(start, min(start + self.batch_size, len(images))))
+            for start in range(0, len(images), self.batch_size)
+        ]
+        contents = [self._encode(image) for image in images]
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(images)
+
+        if len(batches) == 1:
+            batch_results = [self._annotate_batch([contents[i] for i in batches[0]])]
+        else:
+            executor = self._get_executor()
+            futures = [
+                executor.submit(self._annotate_batch, [contents[i] for i in batch])
+                for batch in batches
+            ]
+            batch_results = [future.result() for future in futures]
+
+        for batch, batch_result in zip(batches, batch_results):
+            for idx, result in zip(batch, batch_result):
+                results[idx] = result
+
+        return results
+
+    def _annotate_batch(self, contents: List[bytes]) -> List[Dict[str, Any]]:
+        """
+        Envía un lote con reintentos (backoff exponencial con jitter)
+
+        Args:
+            contents: Imágenes codificadas
+
+        Returns:
+            Resultados del lote; si se agotan los reintentos, resultados fallidos
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                if self.backend == 'grpc':
+                    responses = self._send_grpc(contents)
+                else:
+                    responses = self._send_rest(contents)
+
+                with self._stats_lock:
+                    self.stats['batches'] += 1
+                    self.stats['images'] += len(contents)
+                return responses
+
+            except _RetryableError as e:
+                if attempt == self.max_retries:
+                    logger.error(f"Lote de Google Vision falló tras {attempt + 1} intentos: {e}")
+                    break
+                delay = min(30.0, 0.5 * 2 ** attempt) * (0.5 + random.random())
+                with self._stats_lock:
+                    self.stats['retries'] += 1
+                logger.warning(f"Reintentando lote de Google Vision en {delay:.1f}s: {e}")
+                time.sleep(delay)
+
+            except Exception as e:
+                logger.error(f"Error en lote de Google Vision: {e}")
+                break
+
+        with self._stats_lock:
+            self.stats['failed_batches'] += 1
+        return [_failed_result() for _ in contents]
+
+    def _send_rest(self, contents: List[bytes]) -> List[Dict[str, Any]]:
+        """Envía el lote a la API REST (images:annotate)"""
+        body = {
+            'requests': [
+                {
+                    'image': {'content': base64.b64encode(content).decode('ascii')},
+                    'features': [{'type': 'TEXT_DETECTION'}]
+                }
+                for content in contents
+            ]
+        }
+        params = {'key': self.api_key} if self.api_key else None
+
+        try:
+            response = self._session.post(f"{self.endpoint}/v1/images:annotate",
+                                          json=body, params=params, timeout=self.timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise _RetryableError(str(e)) from e
+
+        if response.status_code in RETRYABLE_STATUS:
+            raise _RetryableError(f"HTTP {response.status_code}")
+        response.raise_for_status()
+
+        responses = response.json().get('responses', [])
+        _check_response_count(responses, contents)
+        return [_parse_rest_response(r) for r in responses]
+
+    def _send_grpc(self, contents: List[bytes]) -> List[Dict[str, Any]]:
+        """Envía el lote con la biblioteca de Google Cloud Vision"""
+        from google.api_core import exceptions as google_exceptions
+
+        if self._grpc_client is None:
+            self._grpc_client = vision.ImageAnnotatorClient()
+
+        requests_batch = [
+            vision.AnnotateImageRequest(
+                image=vision.Image(content=content),
+                features=[vision.Feature(type_=vision.Feature.Type.TEXT_DETECTION)]
+            )
+            for content in contents
+        ]
+
+        try:
+            response = self._grpc_client.batch_annotate_images(requests=requests_batch,
+                                                               timeout=self.timeout)
+        except (google_exceptions.TooManyRequests, google_exceptions.ServiceUnavailable,
+                google_exceptions.InternalServerError, google_exceptions.DeadlineExceeded) as e:
+            raise _RetryableError(str(e)) from e
+
+        _check_response_count(response.responses, contents)
+        return [_parse_grpc_response(r) for r in response.responses]
+
+    def shutdown(self) -> None:
+        """Libera el pool de hilos"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+class _RetryableError(Exception):
+    """Error transitorio (cuota, servidor ocupado, red)"""
+
+
+def _check_response_count(responses: List[Any], contents: List[bytes]) -> None:
+    """
+    Verifica que la API devolvió una respuesta por imagen
+
+    Las respuestas se asignan por posición; si faltan, las imágenes del final
+    quedarían sin resultado. Se trata como error transitorio y se reintenta.
+    """
+    if len(responses) != len(contents):
+        raise _RetryableError(f"{len(responses)} respuestas para {len(contents)} imágenes")
+
+
+def _failed_result(error: str = '') -> Dict[str, Any]:
+    """Resultado vacío de una imagen que no pudo procesarse"""
+    result = {'engine': 'google_vision', 'text': '', 'confidence': 0, 'success': False}
+    if error:
+        result['error'] = error
+    return result
+
+
+def _words_result(full_text: str, words: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Arma el resultado con el formato de HybridOCR"""
+    if not full_text:
+        return _failed_result()
+    return {
+        'engine': 'google_vision',
+        'text': full_text.strip(),
+        'confidence': VISION_CONFIDENCE,
+        'words_count': len(full_text.split()),
+        'words': words,
+        'success': True
+    }
+
+
+def _vertices_box(vertices: List[Dict[str, int]]) -> tuple:
+    """Caja (x, y, w, h) de un polígono de la API"""
+    xs = [v.get('x', 0) for v in vertices] or [0]
+    ys = [v.get('y', 0) for v in vertices] or [0]
+    return (min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys))
+
+
+def _parse_rest_response(response: Dict[str, Any]) -> Dict[str, Any]:
+    """Convierte una respuesta JSON de images:annotate al formato de HybridOCR"""
+    if 'error' in response:
+        return _failed_result(response['error'].get('message', 'error'))
+
+    annotations = response.get('textAnnotations', [])
+    if not annotations:
+        return _failed_result()
+
+    words = [
+        {
+            'text': a.get('description', ''),
+            'confidence': VISION_CONFIDENCE,
+            'box': _vertices_box(a.get('boundingPoly', {}).get('vertices', []))
+        }
+        for a in annotations[1:]
+    ]
+    return _words_result(annotations[0].get('description', ''), words)
+
+
+def _parse_grpc_response(response) -> Dict[str, Any]:
+    """Convierte una respuesta de la biblioteca al formato de HybridOCR"""
+    if response.error.message:
+        return _failed_result(response.error.message)
+
+    annotations = response.text_annotations
+    if not annotations:
+        return _failed_result()
+
+    words = [
+        {
+            'text': a.description,
+            'confidence': VISION_CONFIDENCE,
+            'box': _vertices_box([{'x': v.x, 'y': v.y} for v in a.bounding_poly.vertices])
+        }
+        for a in annotations[1:]
+    ]
+    return _words_result(annotations[0].description, words)
+
+
+def main():
+    """
+    Prueba de carga del envío por lotes contra un endpoint REST (p. ej. el servidor local de prueba)
+    """
+    parser = argparse.ArgumentParser(description='Prueba de carga de Google Vision por lotes')
+    parser.add_argument('--endpoint', type=str, default=None,
+                        help='Endpoint REST (por defecto se levanta el servidor local de prueba)')
+    parser.add_argument('--images', type=int, default=200, help='Número de imágenes a enviar')
+    parser.add_argument('--batch-size', type=int, default=MAX_BATCH_SIZE, help='Imágenes por lote')
+    parser.add_argument('--in-flight', type=int, default=4, help='Lotes simultáneos')
+    parser.add_argument('--latency', type=float, default=0.3, help='Latencia simulada por lote (s)')
+    parser.add_argument('--failure-rate', type=float, default=0.05, help='Proporción de errores 503 simulados')
+    args = parser.parse_args()
+
+    server = None
+    endpoint = args.endpoint
+    if endpoint is None:
+        sys.path.insert(0, os.path.dirname(__file__))
+        from stub_servers import start_stub_server
+        server = start_stub_server(latency=args.latency, failure_rate=args.failure_rate)
+        endpoint = f"http://127.0.0.1:{server.server_address[1]}"
+
+    client = VisionBatchClient({
+        'backend': 'rest',
+        'endpoint': endpoint,
+        'batch_size': args.batch_size,
+        'max_in_flight': args.in_flight
+    })
+
+    image = np.full((400, 600, 3), 255, np.uint8)
+    cv2.putText(image, "REMISION 12345", (30, 200), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 0), 3)
+
+    start = time.perf_counter()
+    results = client.annotate([image] * args.images)
+    elapsed = time.perf_counter() - start
+
+    summary = {
+        'images': args.images,
+        'successful': sum(1 for r in results if r['success']),
+        'seconds': round(elapsed, 2),
+        'images_per_second': round(args.images / elapsed, 1),
+        **client.stats
+    }
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+
+    client.shutdown()
+    if server is not None:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -298,16 +298,31 @@ def create_results_table(results):
         )
     
     with col3:
-        search_term = st.text_input("🔍 Buscar archivo:", "")
-    
+        search_term = st.text_input(
+            "🔍 Buscar:", "",
+            help="Nombre de archivo o texto del POD (OCR, anotaciones, cliente); no distingue acentos"
+        )
+
     # Aplicar filtros
     filtered_df = df[
         (df['Clasificación'].isin(filter_classification)) &
         (df['Estado'].isin(filter_state))
     ]
-    
+
     if search_term:
-        filtered_df = filtered_df[filtered_df['Archivo'].str.contains(search_term, case=False)]
+        # Búsqueda de texto completo en la base de datos (si está disponible)
+        fragments = {}
+        system = st.session_state.system
+        if system is not None and system.db is not None:
+            for match in system.db.search_text(search_term, limit=1000):
+                fragments.setdefault(match['nombre_archivo'], match['fragmento'])
+
+        filtered_df = filtered_df[
+            filtered_df['Archivo'].str.contains(search_term, case=False, regex=False) |
+            filtered_df['Archivo'].isin(fragments)
+        ]
+        if fragments:
+            filtered_df = filtered_df.assign(Coincidencia=filtered_df['Archivo'].map(fragments).fillna(''))
     
     # Mostrar tabla
     st.dataframe(
@@ -327,12 +342,43 @@ def create_results_table(results):
     )
 
 
+def refresh_gemini_status(result):
+    """
+    Incorpora la revisión de Gemini en segundo plano si ya se completó
+    
+    Args:
+        result: Resultado con details['gemini_status'] == 'pendiente' (se modifica)
+        
+    Returns:
+        Trabajo de la cola (estado, intentos, último error) o None
+    """
+    system = st.session_state.system
+    if system is None or system.db is None:
+        return None
+    
+    review = system.db.get_gemini_review(result['source_file'], result.get('page_number', 1))
+    if review is None or review['estado'] != 'completado':
+        return review
+    
+    gemini = review['resultado']
+    for key in ('classification', 'classification_code', 'is_valid', 'issues', 'needs_review', 'review_reason'):
+        result[key] = gemini.pop(key)
+    result['details'].update(gemini)
+    result['details']['gemini_status'] = 'completado'
+    return review
+
+
 def show_pod_details(result):
     """
     Muestra detalles de un POD específico
     """
     filename = os.path.basename(result['source_file'])
     
+    # Revisión de Gemini en segundo plano: traer el resultado si ya terminó
+    gemini_job = None
+    if result.get('details', {}).get('gemini_status') == 'pendiente':
+        gemini_job = refresh_gemini_status(result)
+    
     # Encabezado con color según validez
     if result['is_valid']:
         st.markdown(f"<div class='valid-pod'><h3>📄 {filename}</h3></div>", unsafe_allow_html=True)
@@ -421,6 +467,20 @@ def show_pod_details(result):
             
             details = result.get('details', {})
             
+            # Revisión en segundo plano aún sin terminar
+            if details.get('gemini_status') == 'pendiente':
+                if gemini_job is not None and gemini_job['estado'] == 'error':
+                    st.error(f"❌ La revisión con Gemini falló tras {gemini_job['intentos']} intento(s): "
+                             f"{gemini_job['ultimo_error']}")
+                else:
+                    estado = gemini_job['estado'] if gemini_job else 'pendiente'
+                    st.info(f"⏳ Revisión con Gemini en cola ({estado}). "
+                            "La clasificación mostrada es la del OCR.")
+                if st.button("🔄 Actualizar revisión Gemini"):
+                    st.rerun()
+            elif details.get('gemini_status') == 'completado':
+                st.success("✅ Revisión con Gemini completada en segundo plano")
+            
             # Análisis de Manuscritos
             if 'gemini_manuscripts' in details:
                 manuscripts = details['gemini_manuscripts']
@@ -894,8 +954,11 @@ def main():
             st.session_state.results = []
             st.session_state.processing = True
             
-            # Crear sistema
+            # Crear sistema (la cola de Gemini del anterior se detiene; sus trabajos siguen en la BD)
+            if st.session_state.system is not None:
+                st.session_state.system.stop_gemini_queue(drain=False)
             st.session_state.system = PODValidationSystem()
+            st.session_state.system.start_gemini_queue()
             
             # Barra de progreso
             progress_bar = st.progress(0)
@@ -1022,6 +1085,18 @@ def main():
             st.rerun()
         
         # Botón para limpiar resultados
+        # Estado de la revisión con Gemini en segundo plano
+        system = st.session_state.system
+        if system is not None and system.gemini_queue is not None:
+            counts = system.db.get_gemini_queue_counts()
+            st.caption(f"🤖 Revisión Gemini: {counts['pendiente'] + counts['procesando']} en cola · "
+                       f"{counts['completado']} completadas · {counts['error']} con error")
+            budget = system.gemini_queue.budget.report()
+            if budget['enabled'] and budget['utilization'] is not None:
+                st.progress(min(budget['utilization'], 1.0),
+                            text=f"Presupuesto Gemini hoy: {budget['calls']} llamadas "
+                                 f"(${budget['cost_usd']:.4f}) · {budget['deferred']} diferidos")
+        
         if st.button("🗑️ Limpiar Resultados"):
             st.session_state.results = []
             st.rerun()